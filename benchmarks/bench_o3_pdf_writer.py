@@ -0,0 +1,62 @@
+"""Сравнение fpdf2 и встроенного писателя PDF на синтетической книге o3.
+
+    python -m benchmarks.bench_o3_pdf_writer [pages]
+"""
+import io
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from litres.engines.o3.pdf_engine import A4_HEIGHT, A4_WIDTH, IMG2PDFEngine
+from litres.engines.o3.pdf_writer import EncodedImage, ImagePDFWriter
+from litres.models.book import Author, BookMeta
+
+
+def make_pages(count: int) -> list[EncodedImage]:
+    """Distinct small JPEG pages, so fpdf2 can't deduplicate them"""
+    pages = []
+    for i in range(count):
+        img = Image.new('L', (620, 877), 255)
+        ImageDraw.Draw(img).text((40, 40 + i % 800), f"page {i}", fill=0)
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=65)
+        pages.append(EncodedImage(data=buf.getvalue(), width=img.width, height=img.height,
+                                  color_space='DeviceGray'))
+    return pages
+
+
+def measure(name: str, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<8} {elapsed:8.2f} s  peak {peak / 2**20:8.1f} MiB")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    pages = make_pages(count)
+    meta = BookMeta(authors=[Author(first="Benchmark")], title="Synthetic", version=1.0, uuid="bench")
+    engine = IMG2PDFEngine()
+    image_data = {Path(f"{i}.jpg"): page for i, page in enumerate(pages)}
+
+    def native(output: Path):
+        with ImagePDFWriter(output, (A4_WIDTH, A4_HEIGHT)) as writer:
+            writer.set_metadata(meta.title, "Benchmark", "bench", "bench")
+            for page in pages:
+                writer.add_page(writer.add_image(page))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{count} pages")
+        measure("fpdf2", lambda: engine._create_pdf(meta, image_data, Path(tmp) / "fpdf.pdf"))
+        measure("native", lambda: native(Path(tmp) / "native.pdf"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Обход дерева o4: прежний рекурсивный обход с обёрткой ContentNode на
+каждый узел против обхода сырых словарей со стеком.
+
+    python -m benchmarks.bench_o4_content_nodes [nodes] [depth]
+"""
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from litres.engines.o4.processors.fb2_processor import FB2ContentProcessor
+from litres.engines.o4.processors.pdf_processor import PDFContentProcessor
+
+TAGS = ('div', 'p', 'em', 'strong', 'blockquote', 'span')
+
+
+def make_document(count: int, depth: int) -> list:
+    """`count` nodes, sections nested up to `depth` levels"""
+    rnd = random.Random(1)
+    made = 0
+
+    def node(level: int) -> dict:
+        nonlocal made
+        made += 1
+        if level >= depth or made >= count or rnd.random() < 0.3:
+            return {'t': 'p', 'xp': [level], 'c': ['текст с мягким­ переносом ', {'t': 'em', 'c': ['курсив']}]}
+        return {'t': rnd.choice(TAGS), 'xp': [level], 'c': [node(level + 1) for _ in range(rnd.randint(1, 3))]}
+
+    document = []
+    while made < count:
+        document.append(node(0))
+    return document
+
+
+def make_chain(depth: int) -> list:
+    """A single chain of nested nodes"""
+    node = {'t': 'p', 'c': ['дно']}
+    for _ in range(depth):
+        node = {'t': 'div', 'c': [node]}
+    return [node]
+
+
+class PreviousNode:
+    """ContentNode as it was: four attributes filled for every dict"""
+
+    def __init__(self, data: dict):
+        self.type = data.get('t')
+        self.xpath = data.get('xp')
+        self.content = data.get('c', [])
+        self.data = data
+
+    def is_text_node(self) -> bool:
+        return isinstance(self.content, list) and all(isinstance(x, str) for x in self.content)
+
+    def get_text(self) -> str:
+        if isinstance(self.content, str):
+            return self.content
+        elif self.is_text_node():
+            return ''.join(self.content).replace('­', '')
+        return ''
+
+
+class PreviousFB2Processor(FB2ContentProcessor):
+    """FB2 processor with the recursive traversal as it was"""
+
+    def process_node(self, node: PreviousNode) -> str:
+        if not node.type:
+            return self._escape_text(node.get_text())
+        if node.type == 'img':
+            return self._process_image(node)
+        return self._process_node_type(node.type, self._process_children(node))
+
+    def _process_children(self, node: PreviousNode) -> str:
+        if node.is_text_node():
+            return self._escape_text(node.get_text())
+        parts = []
+        if isinstance(node.content, list):
+            for item in node.content:
+                if isinstance(item, str):
+                    parts.append(self._escape_text(item))
+                elif isinstance(item, dict):
+                    parts.append(self.process_node(PreviousNode(item)))
+        return ''.join(parts)
+
+
+def previous_fb2(document: list) -> str:
+    processor = PreviousFB2Processor(Path('images'))
+    return ''.join(processor.process_node(PreviousNode(item)) for item in document)
+
+
+def current_fb2(document: list) -> str:
+    processor = FB2ContentProcessor(Path('images'))
+    return ''.join(processor._process_data(item) for item in document)
+
+
+def current_pdf(document: list) -> int:
+    return sum(1 for _ in PDFContentProcessor(Path('images')).iter_blocks(document))
+
+
+def bench(name: str, func, document: list):
+    """Time a run, then repeat it under tracemalloc for the peak memory"""
+    start = time.perf_counter()
+    try:
+        result = func(document)
+    except RecursionError:
+        print(f'{name:<24} {"RecursionError":>14}')
+        return None
+    elapsed = (time.perf_counter() - start) * 1000
+    tracemalloc.start()
+    func(document)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    print(f'{name:<24} {elapsed:11.1f} ms  peak {peak:6.1f} MiB')
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    document = make_document(count, depth)
+    print(f'{count} nodes, depth up to {depth}')
+    assert bench('previous FB2 (recursive)', previous_fb2, document) == bench('FB2 (stack)', current_fb2, document)
+    bench('PDF blocks (stack)', current_pdf, document)
+
+    chain = make_chain(5000)
+    print('chain of 5000 nested nodes')
+    bench('previous FB2 (recursive)', previous_fb2, chain)
+    bench('FB2 (stack)', current_fb2, chain)
+    bench('PDF blocks (stack)', current_pdf, chain)
+
+
+if __name__ == '__main__':
+    main()
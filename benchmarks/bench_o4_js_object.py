@@ -0,0 +1,69 @@
+"""Разбор частей o4: прежний путь (json.loads, переписывание регулярками,
+json.loads) против однопроходного разбора litres.js_object.
+
+    python -m benchmarks.bench_o4_js_object [kilobytes] [parts]
+"""
+import json
+import random
+import re
+import sys
+import time
+
+from litres import js_object
+
+WORDS = (
+    'съешь же ещё этих мягких французских булок да выпей чаю — «цитата» '
+    'lorem ipsum dolor sit amet, consectetur adipiscing elit; sed do eiusmod'
+).split()
+
+
+def make_part(size: int, seed: int) -> str:
+    """A part in LitRes syntax: unquoted keys, trailing commas, `size` bytes"""
+    rnd = random.Random(seed)
+    nodes, total, i = [], 0, 0
+    while total < size:
+        text = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(20, 150))) + '­'
+        if rnd.random() < 0.2:
+            node = f'{{t: "p", xp: [1, {i}], c: ["{text[:40]}", {{t: "em", xp: [1, {i}, 1], c: ["{text[40:]}"]}},]}}'
+        else:
+            node = f'{{t: "p", xp: [1, {i}], c: ["{text}"]}}'
+        nodes.append(node)
+        total += len(node.encode())
+        i += 1
+    return '[' + ', '.join(nodes) + ',]'
+
+
+def previous_path(text: str):
+    """JSONFixer fallback as it was, plus the toc.js trailing comma rewrite"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        fixed = re.sub(r"(?<!\\)'", '"', text)
+        fixed = re.sub(r'([{,]\s*)([a-zA-Z_][a-zA-Z0-9_]*)\s*:', r'\1"\2":', fixed)
+        fixed = re.sub(r',\s*([}\]])', r'\1', fixed)
+        fixed = fixed.replace('True', 'true').replace('False', 'false').replace('None', 'null')
+        return json.loads(fixed)
+
+
+def bench(name: str, parse, parts: list[str]) -> list:
+    start = time.perf_counter()
+    result = [parse(part) for part in parts]
+    elapsed = time.perf_counter() - start
+    size = sum(map(len, parts)) / 1024 / 1024
+    print(f'{name:<22} {elapsed * 1000:8.1f} ms  {size / elapsed:6.1f} MiB/s')
+    return result
+
+
+def main():
+    size = int(sys.argv[1]) * 1024 if len(sys.argv) > 1 else 64 * 1024
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    parts = [make_part(size, seed) for seed in range(count)]
+    print(f'{count} parts of {size // 1024} KiB')
+
+    expected = bench('previous (regex)', previous_path, parts)
+    parsed = bench('js_object.loads', js_object.loads, parts)
+    assert parsed == expected
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Вёрстка текста o4: multi_cell fpdf2 против таблицы ширин и своего переноса
+строк, последовательно и по главам в отдельных процессах.
+
+    python -m benchmarks.bench_o4_text_layout [megabytes] [workers]
+"""
+import os
+import random
+import sys
+import time
+
+from litres.engines.o4.pdf_engine import PDFBuilder
+from litres.engines.o4.processors.pdf_processor import Block, BlockType
+from litres.models.book import Author, Book, BookMeta
+
+CHAPTER_PARAGRAPHS = 40
+
+WORDS = (
+    'съешь же ещё этих мягких французских булок да выпей чаю — «цитата» '
+    'lorem ipsum dolor sit amet, consectetur adipiscing elit; sed do eiusmod'
+).split()
+
+
+def make_paragraphs(size: int) -> list[str]:
+    """Paragraphs of random words, `size` characters in total"""
+    rnd = random.Random(1)
+    paragraphs, total = [], 0
+    while total < size:
+        paragraph = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(20, 150)))
+        paragraphs.append(paragraph)
+        total += len(paragraph)
+    return paragraphs
+
+
+def multi_cell(builder: PDFBuilder, text: str):
+    """Previous layout path: fpdf2 breaks and justifies every paragraph itself"""
+    pdf = builder.pdf
+    pdf.set_font(builder.default_font, '', 12)
+    pdf.multi_cell(0, 5, "    " + text, align='J', new_x='LMARGIN', new_y='NEXT',
+                   max_line_height=pdf.font_size * 1.15)
+    pdf.ln(3)
+
+
+def as_blocks(paragraphs: list[str]) -> list[Block]:
+    """Paragraph blocks with a chapter heading every CHAPTER_PARAGRAPHS paragraphs"""
+    blocks = []
+    for i, paragraph in enumerate(paragraphs):
+        if i % CHAPTER_PARAGRAPHS == 0:
+            blocks.append(Block(BlockType.HEADING, f"Глава {i // CHAPTER_PARAGRAPHS + 1}"))
+        blocks.append(Block(BlockType.PARAGRAPH, paragraph))
+    return blocks
+
+
+def measure(name: str, run) -> float:
+    book = Book(meta=BookMeta(authors=[Author(first="Benchmark")], title="Synthetic", version=1.0, uuid="bench"), parts=[])
+    builder = PDFBuilder(book, images=None)
+    start = time.perf_counter()
+    run(builder)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {elapsed:8.2f} s  {builder.pdf.page_no():6d} pages")
+    return elapsed
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    paragraphs = make_paragraphs(int(megabytes * 2**20))
+    blocks = as_blocks(paragraphs)
+    print(f"{sum(map(len, paragraphs)) / 2**20:.1f} MiB of text, {len(paragraphs)} paragraphs")
+
+    def sequential(add):
+        return lambda builder: [add(builder, block) for block in blocks]
+
+    old = measure("multi_cell", sequential(
+        lambda builder, block: multi_cell(builder, block.text) if block.type == BlockType.PARAGRAPH
+        else builder.add_block(block)
+    ))
+    new = measure("breaker", sequential(PDFBuilder.add_block))
+    par = measure(f"parallel/{workers}", lambda builder: builder.add_blocks_parallel(blocks, workers))
+    print(f"speedup      {old / new:8.1f}x  {old / par:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
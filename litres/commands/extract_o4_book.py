@@ -1,9 +1,9 @@
 import json
-import re
 from urllib.parse import parse_qs, urlparse
 
 import requests
 
+from litres import js_object
 from litres.exceptions import BookProcessingError
 from litres.models.book import Author, BookMeta, BookRequest, TextBook
 
@@ -38,11 +38,8 @@ class ExtractO4BookCommand:
     
     def _extract_o4_book_data(self, text: str, base_url: str) -> TextBook:
         try:
-            # The response is not valid JSON, it's a JS object. It needs to be cleaned up.
-            text_data = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', text)
-            text_data = re.sub(r',\s*([}\]])', r'\1', text_data)
-
-            data = json.loads(text_data)
+            # The response is not valid JSON, it's a JS object
+            data = js_object.loads(text)
             meta_data = data.get("Meta", {})
             
             # Extract authors using original capitalized keys
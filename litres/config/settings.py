@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -15,6 +15,24 @@ class AppSettings(BaseSettings):
     delay: float = 1.0
     quality: int = 65
     dpi: int = 300
+    bitonal: bool = False
+    native_pdf_writer: bool = False
+    dedupe_pages: bool = False
+    trim_margins: bool = False
+    skip_blank_pages: bool = False
+    parallel_pdf: bool = False
+    parallel_parse: bool = False
+    export_all_formats: bool = False
+    volume_pages: int = 0
+    incremental_output: bool = False
+    pdf_image_dpi: int = 0
+    fb2_max_image_pixels: int = 0
+    fb2_zip: bool = False
+    fb2_zip_level: int = 6
+    audio_playlist: bool = False
+    audio_direct_download: bool = False
+    audio_frame_merge: bool = False
+    font_cache_dir: Optional[Path] = None
     source_dir: str = 'books-source'
     books_dir: str = 'books'
 
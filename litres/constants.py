@@ -1,5 +1,6 @@
 DOMAIN: str = 'https://www.litres.ru/'
 SOURCE_IMAGE_FOLDER: str = 'images'
+PARSED_CACHE_FOLDER: str = '.parsed'
 SUPPORTED_IMAGE_EXTENSIONS: dict[str, str] = {
     '.jpg': 'image/jpeg',
     '.jpeg': 'image/jpeg',
@@ -1,23 +1,146 @@
+import errno
+import os
+from pathlib import Path
+from typing import List
+
 from litres.config import logger
 from litres.engines.base import Engine, OutFormat
+from litres.engines.mp3_frames import FrameMerger, Mp3FormatError, first_frame
 from litres.models.output_path_handler import OutputPathHandler
+from litres.utils import list_parts
+
+# Запасной путь копирования: крупные блоки фиксированного размера
+COPY_BUFFER = 1024 * 1024
+# Порция одного системного вызова, Linux копирует не больше 2 ГиБ за раз
+MAX_CHUNK = 1024 * 1024 * 1024
+# Ошибки, при которых ядро не умеет копировать между этими файлами
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
 
 
 class AudioMergeEngine(Engine):
+    """Concatenates the downloaded MP3 parts in their numeric order.
+
+    Parts are appended with kernel-side copying (copy_file_range, then
+    sendfile), so the data never passes through Python and memory stays
+    flat for any size. With `playlist` the parts are left as they are and
+    an M3U playlist referencing them is written instead.
+
+    With `frame_accurate` the parts are joined frame by frame instead: their
+    tags and info frames are dropped and the output starts with a single
+    Xing frame holding the duration and a seek table.
+    """
+
     SUPPORTED_OUT_FORMAT = OutFormat.MP3
 
-    # TODO: Use ffmpeg to concatenate
+    def __init__(self, playlist: bool = False, frame_accurate: bool = False):
+        self.playlist = playlist
+        self.frame_accurate = frame_accurate
+
     def execute(self, book, path: OutputPathHandler):
-        mp3_files = sorted(path.source.glob('*.mp3'))
+        mp3_files = list_parts(path.source, '*.mp3')
+        output_file = path.output / (path.filename + '.mp3')
         if not mp3_files:
-            logger.error('No mp3 files found to merge!')
+            if output_file.is_file() and not self.playlist:
+                # Части скачаны сразу в общий файл (audio_direct_download)
+                logger.info(f'Audiobook is already merged: {output_file}')
+            else:
+                logger.error('No mp3 files found to merge!')
             return
-        
-        output_file = path.output / (path.filename + '.mp3')
 
-        with output_file.open('wb') as outfile:
+        if self.playlist:
+            self._write_playlist(book, mp3_files, path.output / (path.filename + '.m3u8'))
+            return
+
+        tmp_file = output_file.with_name(output_file.name + '.part')
+        try:
+            if not (self.frame_accurate and self._merge_frames(mp3_files, tmp_file)):
+                self._merge_bytes(mp3_files, tmp_file)
+            tmp_file.replace(output_file)
+        except OSError as e:
+            logger.error(f'Failed to merge mp3 files: {e}')
+            tmp_file.unlink(missing_ok=True)
+            return
+
+        logger.info(f'Merged {len(mp3_files)} mp3 files into {output_file}')
+
+    @staticmethod
+    def _merge_bytes(mp3_files: List[Path], output_file: Path):
+        with output_file.open('wb', buffering=0) as outfile:
             for f in mp3_files:
                 with f.open('rb') as infile:
-                    outfile.write(infile.read())
+                    copy_file(infile.fileno(), outfile.fileno())
+
+    @staticmethod
+    def _merge_frames(mp3_files: List[Path], output_file: Path) -> bool:
+        """Join the parts into one MP3 stream, False if they can't be joined
+        frame by frame"""
+        try:
+            headers = [first_frame(f) for f in mp3_files]
+            if len({header.stream_format for header in headers}) > 1:
+                raise Mp3FormatError("Parts differ in MPEG version or sample rate")
+            with output_file.open('wb') as outfile:
+                merger = FrameMerger(outfile, headers[0])
+                for f in mp3_files:
+                    merger.add(f)
+                merger.finish()
+        except Mp3FormatError as e:
+            logger.warning(f'{e}, joining parts byte by byte')
+            return False
+        duration = merger.frames * headers[0].samples // headers[0].sample_rate
+        logger.debug(f'Joined {merger.frames} frames ({duration} s), skipped {merger.skipped} bytes')
+        return True
+
+    @staticmethod
+    def _write_playlist(book, mp3_files: List[Path], playlist_file: Path):
+        """Extended M3U with paths relative to the playlist"""
+        title = book.meta.title if book else ''
+        lines = ['#EXTM3U']
+        for num, f in enumerate(mp3_files, 1):
+            lines.append(f'#EXTINF:-1,{title} - {num}' if title else f'#EXTINF:-1,{num}')
+            lines.append(Path(os.path.relpath(f, playlist_file.parent)).as_posix())
+        playlist_file.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        logger.info(f'Playlist of {len(mp3_files)} mp3 files saved to {playlist_file}')
+
+
+def copy_file(src_fd: int, dst_fd: int):
+    """Append the rest of src to dst at its current position.
+
+    copy_file_range keeps the data in the kernel (and can share extents on
+    CoW filesystems), sendfile is the next best thing, a fixed buffer the
+    last resort. Every method advances both offsets, so a fallback goes on
+    from where the previous one stopped. Some filesystems report no data
+    instead of an error, so a method that stops short of the end of src
+    hands over to the next one too.
+    """
+    remaining = os.fstat(src_fd).st_size - os.lseek(src_fd, 0, os.SEEK_CUR)
+    for copy in (_copy_file_range, _sendfile):
+        try:
+            remaining -= copy(src_fd, dst_fd)
+        except OSError as e:
+            if e.errno not in FALLBACK_ERRNOS:
+                raise
+            continue
+        if remaining <= 0:
+            return
+    while chunk := os.read(src_fd, COPY_BUFFER):
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+
+def _copy_file_range(src_fd: int, dst_fd: int) -> int:
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, 'copy_file_range is not available')
+    copied = 0
+    while n := os.copy_file_range(src_fd, dst_fd, MAX_CHUNK):
+        copied += n
+    return copied
+
 
-        logger.info(f'Merged {len(mp3_files)} mp3 files into {output_file}') 
\ No newline at end of file
+def _sendfile(src_fd: int, dst_fd: int) -> int:
+    if not hasattr(os, 'sendfile'):
+        raise OSError(errno.ENOSYS, 'sendfile is not available')
+    copied = 0
+    while n := os.sendfile(dst_fd, src_fd, None, MAX_CHUNK):
+        copied += n
+    return copied
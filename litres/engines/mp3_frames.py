@@ -0,0 +1,265 @@
+import struct
+from array import array
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+READ_SIZE = 1024 * 1024
+# Самый длинный кадр Layer III: 320 кбит/с при 32 кГц, с заполнением
+MAX_FRAME = 1441
+TOC_SIZE = 100
+# Смещений кадров хранится не больше, чем нужно для точной таблицы
+MAX_OFFSETS = 64 * 1024
+XING_FRAMES, XING_BYTES, XING_TOC = 0x1, 0x2, 0x4
+# Тег, флаги, число кадров, размер потока и таблица
+XING_SIZE = 4 + 4 + 4 + 4 + TOC_SIZE
+# Разобранные заголовки: у потока их единицы, а мусор при поиске
+# синхрослова вытесняется и не копится от книги к книге
+HEADER_CACHE_SIZE = 4096
+_unpack_header = struct.Struct('>I').unpack_from
+
+_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Индекс версии в заголовке: 0 - MPEG 2.5, 2 - MPEG 2, 3 - MPEG 1
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+
+
+class Mp3FormatError(ValueError):
+    """A part can't be joined frame by frame"""
+
+
+@dataclass(frozen=True, slots=True)
+class FrameHeader:
+    """Fields of an MPEG-1/2/2.5 Layer III frame header"""
+    value: int
+    version: int
+    bitrate_index: int
+    sample_rate: int
+    mono: bool
+    length: int
+
+    @property
+    def samples(self) -> int:
+        return 1152 if self.version == 3 else 576
+
+    @property
+    def stream_format(self) -> Tuple[int, int]:
+        """Frames of one stream share the version and the sample rate"""
+        return self.version, self.sample_rate
+
+    @property
+    def side_info_size(self) -> int:
+        if self.version == 3:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def parse_header(value: int) -> Optional[FrameHeader]:
+    """Layer III frame header from 4 big-endian bytes, None if it is not one"""
+    version = (value >> 19) & 3
+    bitrate_index = (value >> 12) & 0xF
+    rate_index = (value >> 10) & 3
+    # Синхрослово, Layer III, без свободного битрейта и зарезервированных значений
+    if (value >> 21) == 0x7FF and (value >> 17) & 3 == 1 and version != 1 \
+            and 0 < bitrate_index < 15 and rate_index != 3:
+        return _make_header(value, version, bitrate_index, _SAMPLE_RATES[version][rate_index])
+    return None
+
+
+def _make_header(value: int, version: int, bitrate_index: int, sample_rate: int) -> FrameHeader:
+    bitrate = _BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    coefficient = 144 if version == 3 else 72
+    length = coefficient * bitrate // sample_rate + ((value >> 9) & 1)
+    return FrameHeader(value, version, bitrate_index, sample_rate, (value >> 6) & 3 == 3, length)
+
+
+def audio_range(f: BinaryIO) -> Tuple[int, int]:
+    """Start and end of the audio data: without a leading ID3v2 tag and
+    trailing APEv2 and ID3v1 tags"""
+    f.seek(0, 2)
+    end = f.tell()
+    f.seek(0)
+    head = f.read(10)
+    start = 0
+    if len(head) == 10 and head[:3] == b'ID3':
+        size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        start = 10 + size + (10 if head[5] & 0x10 else 0)
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b'TAG':
+            end -= 128
+    if end - start >= 32:
+        f.seek(end - 32)
+        footer = f.read(32)
+        if footer[:8] == b'APETAGEX':
+            size, flags = struct.unpack_from('<I4xI', footer, 12)
+            end -= size + (32 if flags & 0x80000000 else 0)
+    return start, max(start, end)
+
+
+def is_info_frame(frame: bytes, header: FrameHeader) -> bool:
+    """Xing/Info (LAME) or VBRI header frame, which carries no audio"""
+    offset = 4 + header.side_info_size
+    return frame[offset:offset + 4] in (b'Xing', b'Info') or frame[36:40] == b'VBRI'
+
+
+def first_frame(path: Path) -> FrameHeader:
+    """Header of the first audio frame of a part"""
+    with open(path, 'rb') as f:
+        start, end = audio_range(f)
+        f.seek(start)
+        data = f.read(min(end - start, 64 * 1024))
+    i = _find_frame(data, 0, None)
+    if i is None or i + 4 > len(data):
+        raise Mp3FormatError(f"No MPEG Layer III frames in {path}")
+    return parse_header(_unpack_header(data, i)[0])
+
+
+def _xing_header(first: FrameHeader) -> FrameHeader:
+    """Header of the Xing frame: the format of the first audio frame, no
+    CRC, no padding and a bitrate at which the frame fits the seek table"""
+    base = (first.value | 0x10000) & ~0xF200
+    for bitrate_index in [first.bitrate_index, *range(1, 15)]:
+        header = parse_header(base | bitrate_index << 12)
+        if header.length >= 4 + header.side_info_size + XING_SIZE:
+            return header
+    raise Mp3FormatError("No bitrate fits the Xing frame")
+
+
+def _find_frame(data: bytes, i: int, stream_format: Optional[Tuple[int, int]]) -> Optional[int]:
+    """Position of the next valid frame header at or after `i`"""
+    while True:
+        i = data.find(b'\xff', i)
+        if i < 0 or i + 4 > len(data):
+            return None
+        header = parse_header(_unpack_header(data, i)[0])
+        if header and (stream_format is None or header.stream_format == stream_format):
+            return i
+        i += 1
+
+
+class FrameMerger:
+    """Joins MP3 parts into one stream, frame by frame, in a single pass.
+
+    Tags and Xing/Info/VBRI frames of the parts are dropped along with any
+    data between frames. Room for a leading Xing frame is reserved up
+    front; when all parts are written it is filled in with the frame count,
+    the stream size and a 100-point seek table, so players know the
+    duration and seek without scanning the file.
+    """
+
+    def __init__(self, out: BinaryIO, first: FrameHeader):
+        self.out = out
+        self.stream_format = first.stream_format
+        self.xing = _xing_header(first)
+        self.position = self.xing.length
+        self.frames = 0
+        # Смещения в выходном файле каждого stride-го кадра: при заполнении
+        # остаётся каждое второе, так память не зависит от длины книги
+        self.offsets = array('Q')
+        self.stride = 1
+        self.bitrates = set()
+        self.skipped = 0
+        out.write(bytes(self.xing.length))
+
+    def add(self, path: Path):
+        """Append the audio frames of a part"""
+        with open(path, 'rb') as f:
+            start, end = audio_range(f)
+            f.seek(start)
+            remaining = end - start
+            data = b''
+            i = 0
+            first = True
+            while True:
+                if remaining and len(data) - i < MAX_FRAME:
+                    chunk = f.read(min(READ_SIZE, remaining))
+                    remaining = remaining - len(chunk) if chunk else 0
+                    data = data[i:] + chunk
+                    i = 0
+                i, first = self._copy_frames(data, i, first)
+                if not remaining:
+                    # Обрезанный последний кадр и мусор в конце части
+                    self.skipped += len(data) - i
+                    return
+
+    def _copy_frames(self, data: bytes, i: int, first: bool) -> Tuple[int, bool]:
+        """Write the whole frames of the buffer from `i`, return where the
+        next frame starts. Consecutive frames are written in one call"""
+        run = i
+        size = len(data)
+        offsets = self.offsets
+        while i + 4 <= size:
+            header = parse_header(_unpack_header(data, i)[0])
+            if header is None or header.stream_format != self.stream_format:
+                self._write(data, run, i)
+                found = _find_frame(data, i + 1, self.stream_format)
+                # Без синхрослова в буфере хвост оставляется до следующего чтения
+                next_frame = found if found is not None else max(i + 1, size - 3)
+                self.skipped += next_frame - i
+                i = run = next_frame
+                continue
+            end = i + header.length
+            if end > size:
+                break
+            if first:
+                first = False
+                if is_info_frame(data[i:end], header):
+                    self._write(data, run, i)
+                    i = run = end
+                    continue
+            if self.frames % self.stride == 0:
+                offsets.append(self.position + i - run)
+                if len(offsets) == MAX_OFFSETS:
+                    offsets = self.offsets = offsets[::2]
+                    self.stride *= 2
+            self.frames += 1
+            self.bitrates.add(header.bitrate_index)
+            i = end
+        self._write(data, run, i)
+        return i, first
+
+    def _write(self, data: bytes, start: int, end: int):
+        if end > start:
+            self.out.write(data[start:end])
+            self.position += end - start
+
+    def finish(self):
+        """Fill in the leading Xing frame"""
+        self.out.seek(0)
+        self.out.write(self.xing_frame())
+        self.out.seek(0, 2)
+
+    def xing_frame(self) -> bytes:
+        flags = XING_FRAMES | XING_TOC
+        fields = [struct.pack('>I', self.frames)]
+        if self.position <= 0xFFFFFFFF:
+            flags |= XING_BYTES
+            fields.append(struct.pack('>I', self.position))
+        fields.append(self._toc())
+        # Info - постоянный битрейт, Xing - переменный, как у LAME
+        tag = b'Info' if len(self.bitrates) <= 1 else b'Xing'
+        frame = bytearray(self.xing.length)
+        frame[:4] = self.xing.value.to_bytes(4, 'big')
+        offset = 4 + self.xing.side_info_size
+        payload = tag + struct.pack('>I', flags) + b''.join(fields)
+        frame[offset:offset + len(payload)] = payload
+        return bytes(frame)
+
+    def _toc(self) -> bytes:
+        """Byte position at each percent of the duration, in 1/256 of the
+        stream size. Frames are equally long in time"""
+        if not self.frames:
+            return bytes(TOC_SIZE)
+        return bytes(
+            min(255, self.offsets[percent * self.frames // TOC_SIZE // self.stride] * 256 // self.position)
+            for percent in range(TOC_SIZE)
+        )
@@ -0,0 +1,64 @@
+import hashlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+from litres.engines.o3.pdf_writer import EncodedImage
+
+# Размер эскиза страницы для поиска почти одинаковых страниц
+THUMBNAIL_SIZE = (72, 96)
+# Максимальное расхождение пикселей эскизов (0-255), при котором страницы считаются одинаковыми
+NEAR_DUPLICATE_MAX_DIFF = 12
+
+
+def make_thumbnail(img: Image.Image) -> bytes:
+    """Grayscale thumbnail used as a perceptual fingerprint of a page"""
+    return img.convert('L').resize(THUMBNAIL_SIZE, Image.Resampling.BOX).tobytes()
+
+
+class PageDeduplicator:
+    """Finds pages that are identical or nearly identical to an already seen one.
+
+    Exact copies are matched by a digest of the encoded data. Near copies are
+    grouped by a coarse 8x8 fingerprint and confirmed by comparing thumbnails
+    pixel by pixel, so pages that differ in a page number are kept apart.
+    """
+
+    def __init__(self, max_diff: int = NEAR_DUPLICATE_MAX_DIFF):
+        self.max_diff = max_diff
+        self.duplicates = 0
+        self._exact: Dict[bytes, Any] = {}
+        self._buckets: Dict[bytes, List[Tuple[Image.Image, Any]]] = defaultdict(list)
+
+    def find(self, image: EncodedImage) -> Optional[Any]:
+        """Return the value stored for a matching page or None"""
+        found = self._exact.get(self._digest(image))
+        if found is None and image.thumbnail:
+            thumb = self._thumbnail(image)
+            for other, value in self._buckets[self._bucket(thumb)]:
+                if ImageChops.difference(thumb, other).getextrema()[1] <= self.max_diff:
+                    found = value
+                    break
+        if found is not None:
+            self.duplicates += 1
+        return found
+
+    def add(self, image: EncodedImage, value: Any):
+        """Remember a unique page together with a value (e.g. its PDF object)"""
+        self._exact[self._digest(image)] = value
+        if image.thumbnail:
+            thumb = self._thumbnail(image)
+            self._buckets[self._bucket(thumb)].append((thumb, value))
+
+    @staticmethod
+    def _digest(image: EncodedImage) -> bytes:
+        return hashlib.blake2b(image.data, digest_size=16).digest()
+
+    @staticmethod
+    def _thumbnail(image: EncodedImage) -> Image.Image:
+        return Image.frombytes('L', THUMBNAIL_SIZE, image.thumbnail)
+
+    @staticmethod
+    def _bucket(thumb: Image.Image) -> bytes:
+        return bytes(v // 64 for v in thumb.resize((8, 8), Image.Resampling.BOX).tobytes())
@@ -1,27 +1,99 @@
 import io
+import math
+import os
+import tempfile
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import replace
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from fpdf import FPDF
-from PIL import Image
+from PIL import Image, TiffImagePlugin, features
 from tqdm import tqdm
 
 from litres.config import logger
 from litres.engines.base import Engine, OutFormat
+from litres.engines.o3.dedupe import PageDeduplicator, make_thumbnail
+from litres.engines.o3.pdf_writer import (BLANK_PAGE, EncodedImage,
+                                          ImagePDFWriter, PDFSegment)
 from litres.models.book import BookMeta
 from litres.models.output_path_handler import OutputPathHandler
+from litres.models.parts_manifest import PartsManifest
+from litres.utils import process_pool
 
 A4_WIDTH = 210
 A4_HEIGHT = 297 
 
+# Пороги для определения чисто текстовых (чёрно-белых) страниц
+BITONAL_THRESHOLD = 160
+MAX_MIDTONE_RATIO = 0.05
+MAX_COLOR_RATIO = 0.01
+
+# Сколько страниц обрабатывается наперёд при потоковой записи PDF
+PREFETCH_PAGES = 32
+
+# Анализ полей: пиксели темнее порога считаются содержимым страницы
+CONTENT_THRESHOLD = 200
+ANALYSIS_REDUCE = 4
+BLANK_INK_RATIO = 0.0001
+CROP_PADDING = 0.02
+
+# Параллельная сборка: изображение, поток содержимого и объект страницы
+OBJECTS_PER_PAGE = 3
+SEGMENTS_PER_WORKER = 2
+MIN_SEGMENT_PAGES = 16
+
+MANIFEST_NAME = 'pdf.parts.json'
+
+
+@lru_cache(maxsize=None)
+def fpdf_embeds_g4() -> bool:
+    """Whether fpdf2 embeds a G4 TIFF as is.
+
+    fpdf2 2.8.3 picks CCITTFaxDecode by a Pillow attribute that Pillow 12
+    dropped; it then falls back to FlateDecode and renders the page inverted.
+    """
+    img_bytes = io.BytesIO()
+    Image.new('1', (8, 8), 1).save(img_bytes, format='TIFF', compression='group4')
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.image(img_bytes, x=0, y=0, w=8, h=8)
+    return b'/CCITTFaxDecode' in bytes(pdf.output())
+
 
 class IMG2PDFEngine(Engine):
     SUPPORTED_OUT_FORMAT = OutFormat.PDF
 
-    def __init__(self, quality: int = 65, dpi: int = 150):
+    def __init__(
+        self,
+        quality: int = 65,
+        dpi: int = 150,
+        bitonal: bool = False,
+        native_writer: bool = False,
+        dedupe: bool = False,
+        trim_margins: bool = False,
+        skip_blank: bool = False,
+        parallel: bool = False,
+        volume_pages: int = 0,
+        incremental: bool = False,
+    ):
         self.quality = min(quality, 100)
         self.dpi = dpi
+        self.native_writer = native_writer
+        self.dedupe = dedupe
+        self.trim_margins = trim_margins
+        self.skip_blank = skip_blank
+        self.parallel = parallel
+        self.volume_pages = volume_pages
+        self.incremental = incremental
+        self.bitonal = bitonal and features.check('libtiff')
+        if bitonal and not self.bitonal:
+            logger.warning("Pillow is built without libtiff, bitonal mode is disabled")
+        elif self.bitonal and not native_writer and not fpdf_embeds_g4():
+            self.bitonal = False
+            logger.warning("fpdf2 re-encodes G4 pages with this Pillow, bitonal mode is disabled")
 
         self.a4_width = int(A4_WIDTH * self.dpi / 25.4)  
         self.a4_height = int(A4_HEIGHT * self.dpi / 25.4)  
@@ -32,24 +104,112 @@ class IMG2PDFEngine(Engine):
             if not images:
                 raise ValueError("No images found")
             
-            logger.info(f"Processing {len(images)} images (Q: {self.quality}%, DPI: {self.dpi})")
+            logger.info(
+                f"Processing {len(images)} images "
+                f"(Q: {self.quality}%, DPI: {self.dpi}, bitonal: {self.bitonal}, "
+                f"trim: {self.trim_margins}, skip blank: {self.skip_blank})"
+            )
             
-            # Обработка изображений полностью в памяти
-            image_data = self._process_images(images)
-            self._create_pdf(book.meta, image_data, path.output / (path.filename + '.pdf'))
+            output_path = path.output / (path.filename + '.pdf')
+            manifest = PartsManifest(path.source / MANIFEST_NAME)
+            if self.volume_pages and len(images) > self.volume_pages:
+                self._build_volumes(book.meta, images, path)
+            elif not (self.incremental and self._update_pdf(images, output_path, manifest)):
+                state = self._build(book.meta, images, output_path)
+                if self.incremental and state:
+                    included = [img for img in images if img.name in state['pages']]
+                    manifest.record(output_path, included, self._options(), **state)
         except Exception as e:
             logger.error(f"PDF creation failed: {str(e)}", exc_info=True)
             raise
 
+    def _build(self, meta: BookMeta, images: List[Path], output_path: Path) -> Optional[Dict]:
+        """Сборка одного PDF выбранным способом.
+
+        Returns the structure needed for later incremental updates when the
+        PDF is written by the native writer.
+        """
+        if self.parallel:
+            # Части собираются встроенным писателем: fpdf2 не умеет объединять PDF
+            return self._write_pdf_parallel(meta, images, output_path)
+        if self.native_writer or self.incremental:
+            return self._write_pdf(meta, images, output_path)
+
+        # Обработка изображений полностью в памяти
+        image_data = self._process_images(images)
+        self._create_pdf(meta, image_data, output_path)
+        return None
+
+    def _update_pdf(self, images: List[Path], output_path: Path, manifest: PartsManifest) -> bool:
+        """Дописывание новых и изменённых страниц в готовый PDF (incremental update).
+
+        Returns False when the PDF has to be rebuilt from scratch: it is
+        missing, was changed outside of the application, was built with other
+        settings or some of its pages were removed from the source.
+        """
+        if not manifest.matches(output_path, self._options()) or 'startxref' not in manifest.data:
+            return False
+        new, changed, removed = manifest.diff(images)
+        if removed:
+            return False
+        if not new and not changed:
+            logger.info(f"PDF is up to date: {output_path}")
+            return True
+
+        logger.info(f"Appending {len(new)} new and {len(changed)} changed pages to {output_path}")
+        updated = set(new + changed)
+        pending = [img for img in images if img in updated]
+        page_refs: Dict[str, int] = dict(manifest.data['pages'])
+        with ImagePDFWriter(
+            output_path, (A4_WIDTH, A4_HEIGHT),
+            first_ref=manifest.data['size'], prev_xref=manifest.data['startxref']
+        ) as writer:
+            processed = self._iter_processed(pending)
+            written = self._write_pages(
+                writer,
+                tqdm(processed, total=len(pending), desc="Updating PDF", unit="page", colour='green'),
+                page_refs
+            )
+            page_refs.update(written)
+            writer.set_pages([page_refs[img.name] for img in images if img.name in page_refs])
+
+        # Страницы, которые не удалось обработать, попадут в следующее обновление
+        included = [img for img in images if img.name in written or (img.name in page_refs and img not in updated)]
+        manifest.record(
+            output_path, included, self._options(),
+            pages=page_refs, startxref=writer.xref_offset, size=writer.size
+        )
+        return True
+
+    def _options(self) -> Dict:
+        """Настройки, от которых зависит содержимое страниц"""
+        return {
+            'quality': self.quality,
+            'dpi': self.dpi,
+            'bitonal': self.bitonal,
+            'trim_margins': self.trim_margins,
+            'skip_blank': self.skip_blank,
+        }
+
+    def _build_volumes(self, meta: BookMeta, images: List[Path], path: OutputPathHandler):
+        """Разбиение большой книги на тома по volume_pages страниц"""
+        volumes = [images[i:i + self.volume_pages] for i in range(0, len(images), self.volume_pages)]
+        for number, volume in enumerate(volumes, 1):
+            volume_meta = replace(meta, title=f"{meta.title} ({number}/{len(volumes)})")
+            output_path = path.output / f"{path.filename} - {number}.pdf"
+            logger.info(f"Building volume {number}/{len(volumes)}: {len(volume)} pages")
+            self._build(volume_meta, volume, output_path)
+
     def _get_images(self, input_folder: Path) -> List[Path]:
-        """Get sorted list of image files in the input folder."""
+        """Get list of image files in the input folder sorted by page number."""
         image_files = sorted(
             [f for f in input_folder.glob("*.jpg") if f.is_file()] +
             [f for f in input_folder.glob("*.gif") if f.is_file()],
+            key=lambda f: int(f.stem) if f.stem.isdigit() else -1
         )
         return image_files
     
-    def _process_images(self, images: List[Path]) -> Dict[Path, io.BytesIO]:
+    def _process_images(self, images: List[Path]) -> Dict[Path, EncodedImage]:
         """Обработка изображений с возвратом данных в памяти"""
         processed = {}
         with ThreadPoolExecutor() as executor:
@@ -61,20 +221,47 @@ class IMG2PDFEngine(Engine):
                     processed[img_path] = result
         return processed
 
-    def _process_image(self, img_path: Path) -> Optional[io.BytesIO]:
-        """Обработка одного изображения с возвратом BytesIO"""
+    def _iter_processed(self, images: List[Path]) -> Iterator[Tuple[Path, Optional[EncodedImage]]]:
+        """Обработка изображений в порядке страниц с ограниченным окном в памяти"""
+        with ThreadPoolExecutor() as executor:
+            pending: deque = deque()
+            for img_path in images:
+                pending.append((img_path, executor.submit(self._process_image, img_path)))
+                if len(pending) >= PREFETCH_PAGES:
+                    img_path, future = pending.popleft()
+                    yield img_path, future.result()
+            while pending:
+                img_path, future = pending.popleft()
+                yield img_path, future.result()
+
+    def _process_image(self, img_path: Path) -> Optional[EncodedImage]:
+        """Обработка одного изображения с возвратом закодированных данных"""
         try:
             with Image.open(img_path) as img:
+                scale = self._scale(img)
+                crop = None
+                if self.trim_margins or self.skip_blank:
+                    box = self._content_box(img)
+                    if box is None:
+                        return BLANK_PAGE
+                    if self.trim_margins:
+                        crop = (
+                            box[0] / img.width, box[1] / img.height,
+                            box[2] / img.width, box[3] / img.height
+                        )
+                        img = img.crop(box)
+
+                if self.bitonal and self._is_bitonal(img):
+                    gray = self._resize(img.convert('L'), scale)
+                    encoded = self._encode_g4(gray)
+                    encoded.crop = crop
+                    return self._with_thumbnail(encoded, gray)
+
                 # Конвертация в RGB при необходимости
                 if img.mode != 'RGB':
                     img = img.convert('RGB')
                 
-                # Ресайз при необходимости
-                if self.dpi > 0:
-                    if img.width > self.a4_width or img.height > self.a4_height:
-                        scale = min(self.a4_width / img.width, self.a4_height / img.height)
-                        new_size = (int(img.width * scale), int(img.height * scale))
-                        img = img.resize(new_size, Image.Resampling.LANCZOS)
+                img = self._resize(img, scale)
                 
                 # Сохранение в память вместо файла
                 img_bytes = io.BytesIO()
@@ -84,13 +271,123 @@ class IMG2PDFEngine(Engine):
                     quality=self.quality, 
                     optimize=True
                 )
-                img_bytes.seek(0)  # Сброс указателя в начало
-                return img_bytes
+                encoded = EncodedImage(
+                    data=img_bytes.getvalue(),
+                    width=img.width,
+                    height=img.height,
+                    crop=crop,
+                )
+                return self._with_thumbnail(encoded, img)
         except Exception as e:
             logger.error(f"Error processing {img_path}: {str(e)}")
             return None
 
-    def _create_pdf(self, meta: BookMeta, image_data: Dict[Path, io.BytesIO], output_path: Path):
+    def _scale(self, img: Image.Image) -> float:
+        """Коэффициент уменьшения страницы до размеров A4 при заданном DPI"""
+        if self.dpi > 0:
+            if img.width > self.a4_width or img.height > self.a4_height:
+                return min(self.a4_width / img.width, self.a4_height / img.height)
+        return 1.0
+
+    def _resize(self, img: Image.Image, scale: float) -> Image.Image:
+        """Уменьшение изображения (или его обрезанной части) с масштабом страницы"""
+        if scale < 1.0:
+            new_size = (max(int(img.width * scale), 1), max(int(img.height * scale), 1))
+            img = img.resize(new_size, Image.Resampling.LANCZOS)
+        return img
+
+    def _content_box(self, img: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+        """Find the padded bounding box of the page content.
+
+        Returns None when the page is effectively blank. The analysis runs on
+        a reduced grayscale copy, so isolated scanning specks are averaged out.
+        """
+        small = img.convert('L').reduce(ANALYSIS_REDUCE)
+        mask = small.point(lambda v: 255 if v < CONTENT_THRESHOLD else 0)
+        ink = mask.histogram()[255]
+        bbox = mask.getbbox()
+        if self.skip_blank and (bbox is None or ink < small.width * small.height * BLANK_INK_RATIO):
+            return None
+        if bbox is None:
+            return (0, 0, img.width, img.height)
+
+        pad_x, pad_y = int(img.width * CROP_PADDING), int(img.height * CROP_PADDING)
+        left, top, right, bottom = (v * ANALYSIS_REDUCE for v in bbox)
+        return (
+            max(left - pad_x, 0),
+            max(top - pad_y, 0),
+            min(right + pad_x, img.width),
+            min(bottom + pad_y, img.height),
+        )
+
+    def _placement(self, encoded: EncodedImage) -> Tuple[float, float, float, float]:
+        """Position of the image on the page in mm: (x, y, w, h).
+
+        A trimmed image is put where its content was on the original page,
+        so the page looks the same as without trimming.
+        """
+        if encoded.crop is None:
+            return 0, 0, A4_WIDTH, A4_HEIGHT
+        left, top, right, bottom = encoded.crop
+        return (
+            left * A4_WIDTH,
+            top * A4_HEIGHT,
+            (right - left) * A4_WIDTH,
+            (bottom - top) * A4_HEIGHT,
+        )
+
+    def _with_thumbnail(self, encoded: EncodedImage, img: Image.Image) -> EncodedImage:
+        """Attach a fingerprint for duplicate detection when it is enabled"""
+        if self.dedupe:
+            encoded.thumbnail = make_thumbnail(img)
+        return encoded
+
+    def _is_bitonal(self, img: Image.Image) -> bool:
+        """Check whether a page is plain black-and-white text without pictures.
+
+        Scanned text has almost no mid-tones apart from glyph edges, while
+        illustrations and photos produce either colour or a wide gray range.
+        """
+        total = img.width * img.height
+        if img.mode not in ('1', 'L'):
+            saturation = img.convert('HSV').getchannel('S').histogram()
+            if sum(saturation[64:]) > total * MAX_COLOR_RATIO:
+                return False
+        histogram = img.convert('L').histogram()
+        return sum(histogram[64:192]) <= total * MAX_MIDTONE_RATIO
+
+    def _encode_g4(self, img: Image.Image) -> EncodedImage:
+        """Encode a grayscale page as a single-strip CCITT Group 4 TIFF.
+
+        fpdf2 copies a single-strip G4 payload as is and embeds it with
+        the CCITTFaxDecode filter, so the page is never transcoded again.
+        The native writer embeds the same strip straight from the TIFF bytes.
+        """
+        bitonal = img.point(lambda v: 255 if v >= BITONAL_THRESHOLD else 0, mode='1')
+        img_bytes = io.BytesIO()
+        bitonal.save(
+            img_bytes,
+            format='TIFF',
+            compression='group4',
+            tiffinfo={TiffImagePlugin.ROWSPERSTRIP: bitonal.height}
+        )
+        img_bytes.seek(0)
+        with Image.open(img_bytes) as tiff:
+            offset = tiff.tag_v2[TiffImagePlugin.STRIPOFFSETS][0]
+            length = tiff.tag_v2[TiffImagePlugin.STRIPBYTECOUNTS][0]
+        return EncodedImage(
+            data=img_bytes.getvalue(),
+            width=bitonal.width,
+            height=bitonal.height,
+            filter='CCITTFaxDecode',
+            color_space='DeviceGray',
+            bits=1,
+            decode_parms=f'/K -1 /Columns {bitonal.width} /Rows {bitonal.height} /BlackIs1 true',
+            offset=offset,
+            length=length,
+        )
+
+    def _create_pdf(self, meta: BookMeta, image_data: Dict[Path, EncodedImage], output_path: Path):
         """Создание PDF из данных в памяти"""
         pdf = FPDF()
         pdf.set_auto_page_break(False)
@@ -108,10 +405,120 @@ class IMG2PDFEngine(Engine):
             key=lambda x: int(x[0].stem)  # Сортировка по числу в имени файла
         )
         
-        for img_path, img_bytes in tqdm(sorted_images, desc="Building PDF", unit="page", colour='green'):
+        dedup = PageDeduplicator()
+        for img_path, encoded in tqdm(sorted_images, desc="Building PDF", unit="page", colour='green'):
+            if encoded is BLANK_PAGE:
+                pdf.add_page()
+                continue
+            if self.dedupe:
+                # fpdf2 embeds byte-identical images once, so near duplicates
+                # are replaced with the first matching page
+                canonical = dedup.find(encoded)
+                if canonical is None:
+                    dedup.add(encoded, encoded)
+                else:
+                    encoded = canonical
             pdf.add_page()
             # Передача данных напрямую из памяти
-            pdf.image(img_bytes, x=0, y=0, w=A4_WIDTH, h=A4_HEIGHT)
-            img_bytes.close()  # Важно: закрываем поток после использования
+            x, y, w, h = self._placement(encoded)
+            with io.BytesIO(encoded.data) as img_bytes:
+                pdf.image(img_bytes, x=x, y=y, w=w, h=h)
         
-        pdf.output(str(output_path))
\ No newline at end of file
+        pdf.output(str(output_path))
+        self._log_duplicates(dedup)
+
+    def _write_pdf(self, meta: BookMeta, images: List[Path], output_path: Path) -> Dict:
+        """Потоковая запись PDF без fpdf2: страницы пишутся в файл по мере обработки"""
+        with ImagePDFWriter(output_path, (A4_WIDTH, A4_HEIGHT)) as writer:
+            writer.set_metadata(**self._writer_metadata(meta))
+            processed = self._iter_processed(images)
+            page_refs = self._write_pages(
+                writer,
+                tqdm(processed, total=len(images), desc="Building PDF", unit="page", colour='green')
+            )
+        return {'pages': page_refs, 'startxref': writer.xref_offset, 'size': writer.size}
+
+    def _write_pdf_parallel(self, meta: BookMeta, images: List[Path], output_path: Path) -> Dict:
+        """Сборка PDF по частям в отдельных процессах со слиянием частей по порядку.
+
+        Every range of pages is processed and written by a worker process into
+        a segment file with its own block of object numbers (at most
+        OBJECTS_PER_PAGE per page), so segments are merged by plain copying.
+        """
+        workers = os.cpu_count() or 1
+        chunk_size = max(math.ceil(len(images) / (workers * SEGMENTS_PER_WORKER)), MIN_SEGMENT_PAGES)
+
+        # Обработчики запускаются без fork: у процесса уже есть потоки
+        with tempfile.TemporaryDirectory(dir=output_path.parent) as tmp_dir, \
+                process_pool(workers) as executor:
+            futures = []
+            for start in range(0, len(images), chunk_size):
+                first_ref = ImagePDFWriter.FIRST_FREE_REF + start * OBJECTS_PER_PAGE
+                segment_path = Path(tmp_dir) / f"{start}.seg"
+                pages = images[start:start + chunk_size]
+                futures.append(executor.submit(self._write_segment, pages, segment_path, first_ref))
+
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Building PDF", unit="part", colour='green'):
+                future.result()
+
+            page_refs: Dict[str, int] = {}
+            with ImagePDFWriter(output_path, (A4_WIDTH, A4_HEIGHT)) as writer:
+                writer.set_metadata(**self._writer_metadata(meta))
+                for future in futures:
+                    segment, segment_pages = future.result()
+                    writer.append_segment(segment)
+                    page_refs.update(segment_pages)
+        return {'pages': page_refs, 'startxref': writer.xref_offset, 'size': writer.size}
+
+    def _write_segment(
+        self, images: List[Path], segment_path: Path, first_ref: int
+    ) -> Tuple[PDFSegment, Dict[str, int]]:
+        """Обработка диапазона страниц в процессе-обработчике"""
+        writer = ImagePDFWriter(segment_path, (A4_WIDTH, A4_HEIGHT), first_ref=first_ref)
+        page_refs = self._write_pages(writer, ((img_path, self._process_image(img_path)) for img_path in images))
+        return writer.close_segment(), page_refs
+
+    def _write_pages(
+        self,
+        writer: ImagePDFWriter,
+        processed: Iterable[Tuple[Path, Optional[EncodedImage]]],
+        page_refs: Optional[Dict[str, int]] = None,
+    ) -> Dict[str, int]:
+        """Запись обработанных страниц, повторяющиеся страницы ссылаются на одно изображение.
+
+        Pages listed in `page_refs` replace the existing page objects. Returns
+        the page object number of every written source image.
+        """
+        page_refs = page_refs or {}
+        written: Dict[str, int] = {}
+        dedup = PageDeduplicator()
+        for img_path, encoded in processed:
+            if not encoded:
+                continue
+            page_ref = page_refs.get(img_path.name)
+            if encoded is BLANK_PAGE:
+                written[img_path.name] = writer.add_page(page_ref=page_ref)
+                continue
+            # Повтор ставится туда же, где стоит изображение первой страницы:
+            # при обрезке полей их рамки могут различаться
+            canonical = dedup.find(encoded) if self.dedupe else None
+            if canonical is None:
+                canonical = writer.add_image(encoded), self._placement(encoded)
+                if self.dedupe:
+                    dedup.add(encoded, canonical)
+            image_ref, placement = canonical
+            written[img_path.name] = writer.add_page(image_ref, placement, page_ref)
+        self._log_duplicates(dedup)
+        return written
+
+    def _writer_metadata(self, meta: BookMeta) -> Dict[str, str]:
+        return {
+            'title': meta.title,
+            'author': ", ".join(author.first for author in meta.authors),
+            'creator': f"LitRes Converter v{meta.version}",
+            'subject': f"Book UUID: {meta.uuid}",
+        }
+
+    def _log_duplicates(self, dedup: PageDeduplicator):
+        if dedup.duplicates:
+            logger.info(f"{dedup.duplicates} duplicate pages share already embedded images")
\ No newline at end of file
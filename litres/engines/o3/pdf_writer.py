@@ -0,0 +1,268 @@
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+MM_TO_PT = 72 / 25.4
+
+
+@dataclass
+class EncodedImage:
+    """Encoded page image ready to be embedded into a PDF.
+
+    `data` holds the whole encoded file (JPEG or TIFF). The PDF stream is
+    the `[offset, offset + length)` slice of it: the whole JPEG for
+    DCTDecode, the raw G4 strip for CCITTFaxDecode. `thumbnail` is an
+    optional fingerprint used to detect duplicate pages, `crop` is the
+    (left, top, right, bottom) part of the source page kept after trimming
+    margins, as fractions of the page size.
+    """
+    data: bytes
+    width: int
+    height: int
+    filter: str = 'DCTDecode'
+    color_space: str = 'DeviceRGB'
+    bits: int = 8
+    decode_parms: Optional[str] = None
+    offset: int = 0
+    length: Optional[int] = None
+    thumbnail: Optional[bytes] = None
+    crop: Optional[Tuple[float, float, float, float]] = None
+
+    @property
+    def stream(self) -> memoryview:
+        end = None if self.length is None else self.offset + self.length
+        return memoryview(self.data)[self.offset:end]
+
+
+# Пустая страница без изображения
+BLANK_PAGE = EncodedImage(data=b'', width=0, height=0)
+
+
+@dataclass
+class PDFSegment:
+    """Objects written by a segment writer into a separate file"""
+    path: Path
+    offsets: Dict[int, int]
+    pages: List[int]
+
+
+def pdf_string(value: str) -> bytes:
+    """Encode text as a PDF string (UTF-16BE with BOM for non-ASCII)"""
+    if value.isascii():
+        escaped = value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        return f'({escaped})'.encode('ascii')
+    return b'<FEFF' + value.encode('utf-16-be').hex().upper().encode('ascii') + b'>'
+
+
+class ImagePDFWriter:
+    """Minimal PDF writer for books made of full-page images.
+
+    Objects are written to the file as soon as they are added, only their
+    offsets are kept in memory. The page tree, catalog, info dictionary
+    and the cross-reference table are written by `close()`.
+
+    With `first_ref` the writer produces a segment instead: bare objects
+    numbered from `first_ref`, which another writer merges in with
+    `append_segment()`. With `prev_xref` as well it appends an incremental
+    update to an existing PDF written by this class: new and replaced
+    objects, a new page tree and an xref section pointing to the previous one.
+    """
+
+    CATALOG_REF = 1
+    PAGES_REF = 2
+    INFO_REF = 3
+    FIRST_FREE_REF = 4
+
+    def __init__(
+        self,
+        output_path: Path,
+        page_size: Tuple[float, float],
+        first_ref: Optional[int] = None,
+        prev_xref: Optional[int] = None,
+    ):
+        self.output_path = output_path
+        self.page_width = page_size[0] * MM_TO_PT
+        self.page_height = page_size[1] * MM_TO_PT
+        self.metadata: dict[str, str] = {}
+        self.xref_offset: Optional[int] = None
+
+        self._prev_xref = prev_xref
+        self._segment = first_ref is not None and prev_xref is None
+        self._offsets: dict[int, int] = {}
+        self._next_ref = first_ref or self.FIRST_FREE_REF
+        self._pages: List[int] = []
+        if prev_xref is not None:
+            self._file: BinaryIO = output_path.open('ab', buffering=1024 * 1024)
+        else:
+            self._file = output_path.open('wb', buffering=1024 * 1024)
+        if first_ref is None:
+            self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def __enter__(self) -> 'ImagePDFWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    @property
+    def size(self) -> int:
+        """Number of object numbers in use (the trailer /Size)"""
+        return self._next_ref
+
+    def set_pages(self, page_refs: List[int]):
+        """Set the page order of the page tree"""
+        self._pages = list(page_refs)
+
+    def set_metadata(self, title: str, author: str, creator: str, subject: str):
+        self.metadata = {
+            'Title': title,
+            'Author': author,
+            'Creator': creator,
+            'Subject': subject,
+            'Producer': 'litres-pdf',
+        }
+
+    def add_image(self, image: EncodedImage) -> int:
+        """Write an image XObject and return its object number"""
+        stream = image.stream
+        parms = f' /DecodeParms << {image.decode_parms} >>' if image.decode_parms else ''
+        header = (
+            f'<< /Type /XObject /Subtype /Image /Width {image.width} /Height {image.height}'
+            f' /ColorSpace /{image.color_space} /BitsPerComponent {image.bits}'
+            f' /Filter /{image.filter}{parms} /Length {len(stream)} >>'
+        )
+        return self._write_stream(header.encode('ascii'), stream)
+
+    def add_page(
+        self,
+        image_ref: Optional[int] = None,
+        box: Optional[Tuple[float, float, float, float]] = None,
+        page_ref: Optional[int] = None,
+    ) -> int:
+        """Add a page with an image and return the page object number.
+
+        `box` is the (x, y, w, h) image position in mm from the top-left
+        corner, the image covers the whole page by default. A page without
+        an image is left empty. With `page_ref` an existing page object is
+        replaced and the page order is left unchanged.
+        """
+        page = (
+            f'<< /Type /Page /Parent {self.PAGES_REF} 0 R'
+            f' /MediaBox [0 0 {self.page_width:.2f} {self.page_height:.2f}]'
+        )
+        if image_ref is not None:
+            if box is None:
+                x, y, w, h = 0.0, 0.0, self.page_width, self.page_height
+            else:
+                x, w, h = box[0] * MM_TO_PT, box[2] * MM_TO_PT, box[3] * MM_TO_PT
+                y = self.page_height - box[1] * MM_TO_PT - h
+            content = f'q {w:.2f} 0 0 {h:.2f} {x:.2f} {y:.2f} cm /Im{image_ref} Do Q'.encode('ascii')
+            content_ref = self._write_stream(f'<< /Length {len(content)} >>'.encode('ascii'), content)
+            page += (
+                f' /Resources << /XObject << /Im{image_ref} {image_ref} 0 R >> >>'
+                f' /Contents {content_ref} 0 R'
+            )
+        ref = self._write_object((page + ' >>').encode('ascii'), page_ref)
+        if page_ref is None:
+            self._pages.append(ref)
+        return ref
+
+    def close_segment(self) -> PDFSegment:
+        """Close a segment file and describe its objects for merging"""
+        self._file.close()
+        return PDFSegment(path=self.output_path, offsets=self._offsets, pages=self._pages)
+
+    def append_segment(self, segment: PDFSegment):
+        """Copy a segment file into the output and register its objects and pages"""
+        base = self._file.tell()
+        with segment.path.open('rb') as f:
+            shutil.copyfileobj(f, self._file, 1024 * 1024)
+        for ref, offset in segment.offsets.items():
+            self._offsets[ref] = base + offset
+        self._pages.extend(segment.pages)
+        if segment.offsets:
+            self._next_ref = max(self._next_ref, max(segment.offsets) + 1)
+
+    def close(self):
+        """Write the page tree, catalog, info and xref, then close the file"""
+        if self._segment:
+            self._file.close()
+            return
+
+        kids = ' '.join(f'{ref} 0 R' for ref in self._pages)
+        self._write_object(
+            f'<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>'.encode('ascii'),
+            self.PAGES_REF
+        )
+        if self._prev_xref is None or self.metadata:
+            self._write_object(
+                f'<< /Type /Catalog /Pages {self.PAGES_REF} 0 R >>'.encode('ascii'),
+                self.CATALOG_REF
+            )
+            info = b' '.join(
+                b'/' + key.encode('ascii') + b' ' + pdf_string(value)
+                for key, value in self.metadata.items()
+            )
+            self._write_object(b'<< ' + info + b' >>', self.INFO_REF)
+
+        self.xref_offset = self._file.tell()
+        size = self._next_ref
+        if self._prev_xref is None:
+            lines = [f'xref\n0 {size}\n', '0000000000 65535 f \n']
+            # Номера, не занятые сегментами, отмечаются свободными
+            lines.extend(
+                f'{self._offsets[ref]:010d} 00000 n \n' if ref in self._offsets else '0000000000 65535 f \n'
+                for ref in range(1, size)
+            )
+            prev = ''
+        else:
+            lines = ['xref\n']
+            lines.extend(self._xref_subsections())
+            prev = f' /Prev {self._prev_xref}'
+        lines.append(
+            f'trailer\n<< /Size {size} /Root {self.CATALOG_REF} 0 R /Info {self.INFO_REF} 0 R{prev} >>\n'
+            f'startxref\n{self.xref_offset}\n%%EOF\n'
+        )
+        self._file.write(''.join(lines).encode('ascii'))
+        self._file.close()
+
+    def _xref_subsections(self) -> List[str]:
+        """Xref subsections listing only the objects written by an update"""
+        refs = sorted(self._offsets)
+        # Нулевая запись нужна части читателей для определения нумерации
+        lines: List[str] = ['0 1\n', '0000000000 65535 f \n']
+        start = 0
+        for i in range(1, len(refs) + 1):
+            if i == len(refs) or refs[i] != refs[i - 1] + 1:
+                run = refs[start:i]
+                lines.append(f'{run[0]} {len(run)}\n')
+                lines.extend(f'{self._offsets[ref]:010d} 00000 n \n' for ref in run)
+                start = i
+        return lines
+
+    def _allocate(self) -> int:
+        ref = self._next_ref
+        self._next_ref += 1
+        return ref
+
+    def _write_object(self, body: bytes, ref: Optional[int] = None) -> int:
+        ref = ref or self._allocate()
+        self._offsets[ref] = self._file.tell()
+        self._file.write(b'%d 0 obj\n' % ref + body + b'\nendobj\n')
+        return ref
+
+    def _write_stream(self, header: bytes, data) -> int:
+        ref = self._allocate()
+        self._offsets[ref] = self._file.tell()
+        self._file.write(b'%d 0 obj\n' % ref + header + b'\nstream\n')
+        self._file.write(data)
+        self._file.write(b'\nendstream\nendobj\n')
+        return ref
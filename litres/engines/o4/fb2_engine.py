@@ -1,52 +1,86 @@
+import io
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO
+from xml.sax.saxutils import escape
+
 from litres.config import logger
 from litres.constants import SOURCE_IMAGE_FOLDER
 from litres.engines.base import Engine, OutFormat
-from litres.engines.o4.processors.fb2_processor import FB2ContentProcessor
+from litres.engines.o4.image_index import ImageIndex
+from litres.engines.o4.image_registry import ImageRegistry
+from litres.engines.o4.processors.content_processor import ContentNode
+from litres.engines.o4.processors.fb2_processor import (EMPTY_BODY,
+                                                        FB2ContentProcessor)
+from litres.engines.o4.sink import FormatSink
 from litres.models.book import Book
 from litres.models.output_path_handler import OutputPathHandler
-from litres.utils import load_and_parse_content
+from litres.models.parts_manifest import PartsManifest
+from litres.utils import iter_content, list_parts
+
+# Буфер записи: текст уходит на диск крупными блоками
+WRITE_BUFFER = 1024 * 1024
+DEFAULT_ZIP_LEVEL = 6
 
 
 class FB2Engine(Engine):
     """Simplified FB2 engine using the new content processor"""
     
     SUPPORTED_OUT_FORMAT = OutFormat.FB2
+    MANIFEST_NAME = 'fb2.parts.json'
+
+    def __init__(
+        self,
+        quality: int = 75,
+        max_image_pixels: int = 0,
+        incremental: bool = False,
+        parallel_parse: bool = False,
+        zip_output: bool = False,
+        zip_level: int = DEFAULT_ZIP_LEVEL,
+    ):
+        self.quality = quality
+        self.parallel_parse = parallel_parse
+        self.zip_output = zip_output
+        self.zip_level = zip_level
+        self.max_image_pixels = max_image_pixels
+        self.incremental = incremental
     
     def execute(self, book: Book, path: OutputPathHandler):
+        sink = None
         try:
-            content = load_and_parse_content(path.source)
-            if not content:
-                logger.error("No valid content found")
+            sink = self.open_sink(book, path)
+            if sink is None:
                 return
-            
-            img_dir = path.source / SOURCE_IMAGE_FOLDER
-            processor = FB2ContentProcessor(img_dir)
-            
-            # Process content
-            body_content = processor.process_structure(content)
-            binaries = processor.generate_binaries()
-            
-            # Build complete FB2
-            fb2_content = self._build_fb2_document(book, body_content, binaries)
-            
-            # Save to file
-            output_path = path.output / (path.filename + '.fb2')
-            output_path.write_text(fb2_content, encoding='utf-8')
-            
-            logger.info(f"FB2 saved to: {output_path}")
-            
+            # Части читаются по одной по мере обработки
+            for item in iter_content(path.source, self.parallel_parse):
+                sink.feed(item)
+            sink.close()
         except Exception as e:
             logger.error(f"Failed to generate FB2: {e}")
+            if sink:
+                sink.abort()
+
+    def open_sink(self, book: Book, path: OutputPathHandler) -> Optional['FB2Sink']:
+        """Start an FB2 build, None if the existing FB2 is up to date"""
+        output_path = path.output / (path.filename + ('.fb2.zip' if self.zip_output else '.fb2'))
+        # FB2 пересобирается целиком при любом изменении частей
+        parts = list_parts(path.source)
+        manifest = PartsManifest(path.source / self.MANIFEST_NAME)
+        if self.incremental and manifest.is_current(output_path, parts, self._options()):
+            logger.info(f"FB2 is up to date: {output_path}")
+            return None
+        return FB2Sink(self, book, path.source / SOURCE_IMAGE_FOLDER, output_path,
+                       manifest if self.incremental else None, parts, path.filename + '.fb2')
     
-    def _build_fb2_document(self, book: Book, body_content: str, binaries: str) -> str:
-        """Build complete FB2 document"""
-        header = self._build_header(book)
-        footer = f'</body>\n{binaries}\n</FictionBook>'
-        return header + body_content + footer
-    
+    def _options(self) -> dict:
+        options = {'quality': self.quality, 'max_image_pixels': self.max_image_pixels}
+        if self.zip_output:
+            options['zip_level'] = self.zip_level
+        return options
+
     def _build_header(self, book: Book) -> str:
         """Build FB2 header"""
-        title = book.meta.title or "Untitled"
+        title = escape(book.meta.title or "Untitled")
         authors = self._build_authors_xml(book.meta.authors)
         
         return f'''<?xml version="1.0" encoding="utf-8"?>
@@ -69,12 +103,101 @@ class FB2Engine(Engine):
         
         xml_parts = []
         for author in authors:
-            parts = [f'<first-name>{author.first or "Unknown"}</first-name>']
+            parts = [f'<first-name>{escape(author.first or "Unknown")}</first-name>']
             if author.middle:
-                parts.append(f'<middle-name>{author.middle}</middle-name>')
+                parts.append(f'<middle-name>{escape(author.middle)}</middle-name>')
             if author.last:
-                parts.append(f'<last-name>{author.last}</last-name>')
+                parts.append(f'<last-name>{escape(author.last)}</last-name>')
             
             xml_parts.append(f'<author>{"".join(parts)}</author>')
         
-        return ''.join(xml_parts)
\ No newline at end of file
+        return ''.join(xml_parts)
+
+
+class FB2Sink(FormatSink):
+    """FB2 written to disk as it is built: the body as nodes are fed, the
+    binaries in base64 chunks at the end. Images are encoded in the
+    background meanwhile. The file gets its name only when complete.
+
+    For .fb2.zip the text is compressed on the fly into the single
+    archive entry `entry_name`, without an uncompressed copy on disk.
+    """
+
+    name = 'FB2'
+
+    def __init__(
+        self,
+        engine: FB2Engine,
+        book: Book,
+        img_dir: Path,
+        output_path: Path,
+        manifest: Optional[PartsManifest],
+        parts: List[Path],
+        entry_name: str = '',
+    ):
+        self.options = engine._options()
+        self.output_path = output_path
+        self.manifest = manifest
+        self.parts = parts
+        index = ImageIndex(img_dir)
+        self.processor = FB2ContentProcessor(img_dir, index)
+        self.images = ImageRegistry(
+            img_dir, quality=engine.quality, max_pixels=engine.max_image_pixels, jpeg_only=False, index=index
+        )
+        self.images.start()
+        self.tmp_path = output_path.with_name(output_path.name + '.part')
+        self.archive: Optional[zipfile.ZipFile] = None
+        if engine.zip_output:
+            self.archive = zipfile.ZipFile(
+                self.tmp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=engine.zip_level
+            )
+            # Запись по имени берёт сжатие и уровень из архива
+            entry = self.archive.open(entry_name or output_path.stem, 'w', force_zip64=True)
+            self.out: TextIO = io.TextIOWrapper(io.BufferedWriter(entry, WRITE_BUFFER), encoding='utf-8')
+        else:
+            self.out = open(self.tmp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER)
+        self.out.write(engine._build_header(book))
+        self.empty = True
+        self.has_body = False
+
+    def feed(self, item: Dict[str, Any]):
+        self.empty = False
+        processed = self.processor.process_node(ContentNode(item))
+        if processed:
+            self.has_body = True
+            self.out.write(self.processor.wrap_part(processed))
+
+    def close(self):
+        if self.empty:
+            logger.error("No valid content found")
+            self.abort()
+            return
+        try:
+            if not self.has_body:
+                self.out.write(EMPTY_BODY)
+            self.out.write('</body>\n')
+            self.processor.write_binaries(self.images, self.out)
+            self.out.write('\n</FictionBook>')
+            self.out.close()
+            if self.archive:
+                self.archive.close()
+            self.tmp_path.replace(self.output_path)
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self.images.close()
+        if self.manifest:
+            self.manifest.record(self.output_path, self.parts, self.options)
+        logger.info(f"FB2 saved to: {self.output_path}")
+
+    def abort(self):
+        self.images.close()
+        try:
+            self.out.close()
+            if self.archive:
+                self.archive.close()
+        except (OSError, ValueError):
+            # Недописанный архив всё равно удаляется
+            pass
+        self.tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,161 @@
+import hashlib
+import marshal
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import fpdf
+from fontTools import ttLib
+from fpdf import FPDF
+from fpdf.enums import FontDescriptorFlags, TextEmphasis
+from fpdf.fonts import PDFFontDescriptor, SubsetMap, TTFFont
+
+from litres.config import logger
+
+# Таблицы цветных шрифтов, для них fpdf2 строит дополнительные объекты
+COLOR_TABLES = ('CBDT', 'EBDT', 'COLR', 'SVG ', 'sbix')
+DESCRIPTOR_FIELDS = (
+    'ascent', 'descent', 'cap_height', 'flags', 'font_b_box',
+    'italic_angle', 'stem_v', 'missing_width',
+)
+# Поля, которые у каждого документа свои или собираются заново из метрик
+DOCUMENT_FIELDS = frozenset((
+    'i', 'fontkey', 'ttffile', 'ttfont', 'subset', 'emphasis', 'missing_glyphs', 'cw', 'desc',
+))
+PLAIN_TYPES = (type(None), bool, int, float, str, bytes, tuple, list, dict)
+
+
+def _font_slots() -> Tuple[str, ...]:
+    """Attribute slots of TTFFont in the installed fpdf2"""
+    return tuple(sorted(slot for cls in TTFFont.__mro__ for slot in getattr(cls, '__slots__', ())))
+
+
+class FontCache:
+    """Parsed TrueType font metrics shared between PDF documents.
+
+    fpdf2 parses the cmap and the horizontal metrics of every font for every
+    new FPDF, which costs about 25 ms per font. The cache keeps the result
+    per font file content, in memory for the process and, with `cache_dir`,
+    on disk for later runs. A document still gets its own lazily opened
+    fontTools font, because fpdf2 subsets it in place on output.
+
+    The cached state is whatever the installed fpdf2 sets on a TTFFont, with
+    the per-document objects rebuilt on load. Fonts the cache can't
+    reproduce exactly (color fonts, fonts without a .notdef glyph, fields of
+    unknown types, a TTFFont layout other than the cached one) are
+    registered through `FPDF.add_font` as usual.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = cache_dir
+        self._metrics: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._hashes: Dict[Tuple[Path, int, int], str] = {}
+
+    def add_font(self, pdf: FPDF, family: str, style: str, font_path: Path):
+        """Register a font in the document, reusing cached metrics"""
+        key = self._file_hash(font_path)
+        if key not in self._metrics:
+            self._metrics[key] = self._load(key) or self._parse(font_path, key)
+
+        metrics = self._metrics[key]
+        fontkey = f"{family.lower()}{style}"
+        if metrics is not None:
+            try:
+                pdf.fonts[fontkey] = self._make_font(pdf, font_path, fontkey, style, metrics)
+                return
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Font cache doesn't fit fpdf2 {fpdf.__version__}, parsing {font_path}: {e}")
+                self._metrics[key] = None
+        pdf.add_font(family=family, style=style, fname=font_path)
+
+    def _make_font(self, pdf: FPDF, font_path: Path, fontkey: str, style: str, metrics: Dict[str, Any]) -> TTFFont:
+        """Build a TTFFont from cached metrics, as TTFFont.__init__ would"""
+        if tuple(metrics['slots']) != _font_slots():
+            raise ValueError("TTFFont fields changed")
+        font = TTFFont.__new__(TTFFont)
+        for field, value in metrics['fields'].items():
+            setattr(font, field, value)
+        font.i = len(pdf.fonts) + 1
+        font.fontkey = fontkey
+        font.ttffile = font_path
+        font.ttfont = ttLib.TTFont(font_path, recalcTimestamp=False, lazy=True)
+
+        desc = dict(metrics['desc'])
+        desc['flags'] = FontDescriptorFlags(desc['flags'])
+        font.desc = PDFFontDescriptor(**desc)
+        missing_width = metrics['cw_default']
+        font.cw = defaultdict(lambda: missing_width, metrics['cw'])
+        font.missing_glyphs = []
+        font.emphasis = TextEmphasis.coerce(style)
+        font.subset = SubsetMap(font)
+        return font
+
+    def _parse(self, font_path: Path, key: str) -> Optional[Dict[str, Any]]:
+        """Parse a font with fpdf2 and extract its metrics"""
+        with ttLib.TTFont(font_path, lazy=True) as ttfont:
+            tables = set(ttfont.keys())
+            has_notdef = 'glyf' not in tables or '.notdef' in ttfont.getGlyphOrder()
+        if tables.intersection(COLOR_TABLES) or not has_notdef:
+            return None
+
+        font = TTFFont(FPDF(), font_path, 'cache', '')
+        try:
+            if getattr(font, 'is_cff', False) and getattr(font, 'is_cid_keyed', False):
+                # Такие шрифты требуют PDF 1.6, это выставляет только add_font
+                return None
+            fields = {}
+            for field in _font_slots():
+                if field in DOCUMENT_FIELDS or not hasattr(font, field):
+                    continue
+                value = getattr(font, field)
+                if not isinstance(value, PLAIN_TYPES):
+                    logger.debug(f"Not caching {font_path}: unsupported field {field}")
+                    return None
+                fields[field] = value
+            metrics = {
+                'slots': _font_slots(),
+                'fields': fields,
+                'desc': {field: getattr(font.desc, field) for field in DESCRIPTOR_FIELDS},
+                'cw': dict(font.cw),
+                'cw_default': font.cw.default_factory(),
+            }
+            metrics['desc']['flags'] = font.desc.flags.value
+        finally:
+            font.close()
+        self._save(key, metrics)
+        return metrics
+
+    def _file_hash(self, font_path: Path) -> str:
+        """Content hash of a font file, recomputed only when the file changes"""
+        stat = font_path.stat()
+        fingerprint = (font_path.resolve(), stat.st_size, stat.st_mtime_ns)
+        if fingerprint not in self._hashes:
+            digest = hashlib.blake2b(font_path.read_bytes(), digest_size=16).hexdigest()
+            # Формат метрик зависит от версии fpdf2
+            self._hashes[fingerprint] = f'{digest}-{fpdf.__version__}'
+        return self._hashes[fingerprint]
+
+    def _cache_file(self, key: str) -> Optional[Path]:
+        return self.cache_dir / f'{key}.marshal' if self.cache_dir else None
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        cache_file = self._cache_file(key)
+        if not cache_file or not cache_file.is_file():
+            return None
+        try:
+            return marshal.loads(cache_file.read_bytes())
+        except (OSError, ValueError, EOFError, TypeError) as e:
+            logger.warning(f"Ignoring broken font cache {cache_file}: {e}")
+            return None
+
+    def _save(self, key: str, metrics: Dict[str, Any]):
+        cache_file = self._cache_file(key)
+        if not cache_file:
+            return
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix('.tmp')
+            tmp_file.write_bytes(marshal.dumps(metrics))
+            tmp_file.replace(cache_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to save font cache {cache_file}: {e}")
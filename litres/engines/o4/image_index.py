@@ -0,0 +1,67 @@
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from litres.constants import SUPPORTED_IMAGE_EXTENSIONS
+
+DEFAULT_MIME_TYPE = 'application/octet-stream'
+
+
+def mime_type_of(path: Path) -> str:
+    """MIME type of an image by its extension"""
+    return SUPPORTED_IMAGE_EXTENSIONS.get(path.suffix.lower(), DEFAULT_MIME_TYPE)
+
+
+@dataclass(frozen=True, slots=True)
+class ImageFile:
+    """An image file as seen by the directory scan"""
+    path: Path
+
+    @property
+    def mime_type(self) -> str:
+        return mime_type_of(self.path)
+
+
+class ImageIndex:
+    """Files of the book's image folder, listed with a single scandir.
+
+    Lookups by file name are answered from memory instead of a stat per
+    image node, which matters on network filesystems. The folder is scanned
+    on first use; processors and the image registry of one build share the
+    same index.
+    """
+
+    def __init__(self, img_dir: Path):
+        self.img_dir = img_dir
+        self._files: Optional[Dict[str, ImageFile]] = None
+
+    @property
+    def files(self) -> Dict[str, ImageFile]:
+        if self._files is None:
+            self._files = self._scan()
+        return self._files
+
+    def _scan(self) -> Dict[str, ImageFile]:
+        files: Dict[str, ImageFile] = {}
+        try:
+            with os.scandir(self.img_dir) as entries:
+                for entry in entries:
+                    # Тип записи scandir знает без отдельного stat
+                    if entry.is_file():
+                        files[entry.name] = ImageFile(Path(entry.path))
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return files
+
+    def get(self, name: str) -> Optional[ImageFile]:
+        return self.files.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.files
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.files)
+
+    def __len__(self) -> int:
+        return len(self.files)
@@ -0,0 +1,155 @@
+import io
+import math
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+from PIL import Image
+
+from litres.config import logger
+from litres.engines.o4.image_index import ImageFile, ImageIndex, mime_type_of
+
+DEFAULT_QUALITY = 75
+
+
+@dataclass
+class StoredImage:
+    """Encoded image with its MIME type: bytes in memory, or the source
+    file when the image is embedded unchanged"""
+    content: Optional[bytes]
+    mime_type: str
+    path: Optional[Path] = None
+
+    @property
+    def data(self) -> bytes:
+        if self.content is None:
+            return self.path.read_bytes()
+        return self.content
+
+    def open(self) -> BinaryIO:
+        """Binary stream of the image, for writing it out in chunks"""
+        if self.content is None:
+            return open(self.path, 'rb')
+        return io.BytesIO(self.content)
+
+
+class ImageRegistry:
+    """Book images indexed by file name and encoded for embedding exactly once.
+
+    `start()` takes the files from the image index and encodes every image in a thread
+    pool, so encoding runs while the content is still being parsed and laid
+    out. `get()` returns the encoded image, waiting for it if it is not
+    ready yet. Repeated references get the very same bytes, which fpdf2
+    embeds as a single XObject.
+
+    Images wider than `max_width` or larger than `max_pixels` are
+    downsampled and re-encoded with `quality`, zero disables a limit. With
+    `jpeg_only` every image is converted to JPEG, otherwise images that need
+    no downsampling are stored unchanged.
+    """
+
+    def __init__(
+        self,
+        img_dir: Path,
+        quality: int = DEFAULT_QUALITY,
+        max_width: int = 0,
+        max_pixels: int = 0,
+        jpeg_only: bool = True,
+        max_workers: Optional[int] = None,
+        index: Optional[ImageIndex] = None,
+    ):
+        self.img_dir = img_dir
+        self.index = index or ImageIndex(img_dir)
+        self.quality = quality
+        self.max_width = max_width
+        self.max_pixels = max_pixels
+        self.jpeg_only = jpeg_only
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self._encoded: Dict[str, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __enter__(self) -> 'ImageRegistry':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def paths(self) -> Dict[str, Path]:
+        return {name: file.path for name, file in self.index.files.items()}
+
+    def start(self):
+        """Start encoding all indexed images"""
+        files = self.index.files
+        if not files:
+            return
+        # Pillow отпускает GIL при декодировании и сжатии, потоков достаточно
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        for name, file in files.items():
+            self._encoded[name] = self._executor.submit(self._encode_file, file)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def get(self, name: str) -> Optional[StoredImage]:
+        """Encoded image by file name, None if it is missing or broken"""
+        future = self._encoded.get(name)
+        if future is None:
+            logger.warning(f"Image not found: {self.img_dir / name}")
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"Failed to process image {self.img_dir / name}: {e}")
+            return None
+
+    def _encode_file(self, file: ImageFile) -> StoredImage:
+        return self.encode(file.path, file.mime_type)
+
+    def encode(self, path: Path, mime_type: Optional[str] = None) -> StoredImage:
+        """Downsample an image if needed and encode it for embedding"""
+        with Image.open(path) as img:
+            source_format = img.format
+            scale = self._scale(img.width, img.height)
+            if scale >= 1.0:
+                # Подходящий по размеру файл встраивается без повторного сжатия
+                # и не держится в памяти: байты читаются из файла при встраивании
+                if source_format == 'JPEG' and img.mode in ('RGB', 'L'):
+                    return StoredImage(None, 'image/jpeg', path)
+                if not self.jpeg_only:
+                    return StoredImage(None, mime_type or mime_type_of(path), path)
+            else:
+                new_size = (max(round(img.width * scale), 1), max(round(img.height * scale), 1))
+                # JPEG декодируется сразу в уменьшенном виде, если это возможно
+                img.draft(None, new_size)
+                if img.mode not in ('RGB', 'L', 'RGBA'):
+                    img = img.convert('RGBA' if self._has_alpha(img) else 'RGB')
+                img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+            buffer = io.BytesIO()
+            if not self.jpeg_only and source_format != 'JPEG':
+                # Прозрачность и чёткие контуры рисунков JPEG не сохранит
+                img.save(buffer, format='PNG')
+                return StoredImage(buffer.getvalue(), 'image/png')
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            img.save(buffer, format='JPEG', quality=self.quality, optimize=True)
+            return StoredImage(buffer.getvalue(), 'image/jpeg')
+
+    def _scale(self, width: int, height: int) -> float:
+        """Downsampling factor fitting the image into the limits"""
+        scale = 1.0
+        if self.max_width and width > self.max_width:
+            scale = self.max_width / width
+        if self.max_pixels and width * height * scale * scale > self.max_pixels:
+            scale = math.sqrt(self.max_pixels / (width * height))
+        return scale
+
+    @staticmethod
+    def _has_alpha(img: Image.Image) -> bool:
+        return 'A' in img.getbands() or 'transparency' in img.info
@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from tqdm import tqdm
+
+from litres.config import logger
+from litres.engines.base import Engine, OutFormat
+from litres.engines.o4.sink import FormatSink
+from litres.models.book import Book
+from litres.models.output_path_handler import OutputPathHandler
+from litres.utils import iter_content
+
+
+class MultiFormatEngine(Engine):
+    """Exports an o4 book to several formats from a single parse.
+
+    Every top-level node is read once and fed to the sinks of all engines
+    in turn, so parts are parsed (or loaded from the cache) only once. The
+    finished outputs are then written concurrently: PDF compression and
+    file writes release the GIL.
+    """
+
+    def __init__(self, engines: List[Engine], parallel_parse: bool = False):
+        self.engines = engines
+        self.parallel_parse = parallel_parse
+
+    def supports(self, out_formats: List[OutFormat]) -> bool:
+        return any(engine.supports(out_formats) for engine in self.engines)
+
+    def execute(self, book: Book, path: OutputPathHandler):
+        sinks: List[FormatSink] = []
+        for engine in self.engines:
+            try:
+                sink = engine.open_sink(book, path)
+            except Exception as e:
+                logger.error(f"Failed to start {engine.SUPPORTED_OUT_FORMAT.name}: {e}")
+                continue
+            if sink is not None:
+                sinks.append(sink)
+        if not sinks:
+            return
+
+        names = ', '.join(sink.name for sink in sinks)
+        try:
+            for item in tqdm(iter_content(path.source, self.parallel_parse), desc=f"Building {names}", colour='green'):
+                for sink in list(sinks):
+                    try:
+                        sink.feed(item)
+                    except Exception as e:
+                        # Ошибка одного формата не останавливает остальные
+                        logger.error(f"Failed to generate {sink.name}: {e}")
+                        sink.abort()
+                        sinks.remove(sink)
+        except BaseException:
+            # Разбор прерван (ошибка, Ctrl-C): потоки и .part-файлы всех форматов освобождаются
+            for sink in sinks:
+                try:
+                    sink.abort()
+                except Exception as e:
+                    logger.error(f"Failed to clean up {sink.name}: {e}")
+            raise
+
+        with ThreadPoolExecutor(max_workers=len(sinks) or 1) as executor:
+            futures = [(sink, executor.submit(sink.close)) for sink in sinks]
+            for sink, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Failed to generate {sink.name}: {e}")
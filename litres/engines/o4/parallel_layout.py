@@ -0,0 +1,175 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from fpdf.util import escape_parens
+
+from litres.engines.o4.processors.pdf_processor import Block, BlockType
+from litres.engines.o4.text_layout import (IMAGE_SPACE, IMAGE_WIDTH,
+                                           LINE_HEIGHT, RULE_INDENT,
+                                           RULE_SPACE, TEXT_STYLES,
+                                           GlyphWidths, TextStyle, break_lines)
+
+
+@dataclass
+class PageGeometry:
+    """Page size and margins of the target FPDF, in mm (`k` is points per mm)"""
+    width: float
+    height: float
+    k: float
+    l_margin: float
+    r_margin: float
+    t_margin: float
+    c_margin: float
+    page_break_trigger: float
+
+    @property
+    def epw(self) -> float:
+        return self.width - self.l_margin - self.r_margin
+
+
+@dataclass
+class FontSpec:
+    """A font as seen by workers: PDF resource number, widths and subset mapping.
+
+    `chars` is a str.translate table from code points to the character
+    codes fpdf2 assigned in the font subset. Characters missing from the
+    font map to None and are dropped, as fpdf2 does.
+    """
+    index: int
+    widths: GlyphWidths
+    chars: Dict[int, Optional[str]]
+
+    @property
+    def space(self) -> str:
+        return self.chars[ord(' ')] or ' '
+
+
+@dataclass
+class LayoutContext:
+    """Everything a worker needs to lay out chapters without an FPDF instance"""
+    geometry: PageGeometry
+    fonts: Dict[str, FontSpec]
+    image_sizes: Dict[str, Tuple[int, int]]
+
+
+@dataclass
+class PageContent:
+    """Content stream of a laid out page, its fonts and image placements"""
+    ops: List[str] = field(default_factory=list)
+    fonts: Set[int] = field(default_factory=set)
+    images: List[Tuple[str, float, float, float, float]] = field(default_factory=list)
+
+
+def split_chapters(blocks: List[Block]) -> List[List[Block]]:
+    """Split blocks before every heading that follows non-heading content"""
+    chapters: List[List[Block]] = [[]]
+    for block in blocks:
+        is_heading = block.type == BlockType.HEADING
+        current = chapters[-1]
+        if is_heading and current and current[-1].type != BlockType.HEADING:
+            chapters.append([])
+        chapters[-1].append(block)
+    return [chapter for chapter in chapters if chapter]
+
+
+_context: Optional[LayoutContext] = None
+
+
+def init_worker(context: LayoutContext):
+    """Process pool initializer: the context is sent to every worker once"""
+    global _context
+    _context = context
+
+
+def layout_chapter(blocks: List[Block]) -> List[PageContent]:
+    """Lay out a chapter from a new page, in a worker process"""
+    assert _context is not None, "init_worker() was not called"
+    return ChapterLayout(_context).run(blocks)
+
+
+class ChapterLayout:
+    """Pagination and content stream generation mirroring PDFBuilder.
+
+    Text is written with the same operators fpdf2 uses for justified TTF
+    text: the text is mapped to subset codes with str.translate and word
+    spacing is applied as TJ adjustments before each space.
+    """
+
+    def __init__(self, context: LayoutContext):
+        self.context = context
+        self.geometry = context.geometry
+        self.pages: List[PageContent] = []
+        self.page = self._new_page()
+
+    def run(self, blocks: List[Block]) -> List[PageContent]:
+        for block in blocks:
+            if block.type == BlockType.IMAGE:
+                self.add_image(block.text)
+            elif block.type == BlockType.RULE:
+                self.add_rule()
+            else:
+                self.add_text(block.text, TEXT_STYLES[block.type])
+        return self.pages
+
+    def _new_page(self) -> PageContent:
+        page = PageContent()
+        self.pages.append(page)
+        self.y = self.geometry.t_margin
+        return page
+
+    def _page_break_if_needed(self, h: float):
+        if self.y + h > self.geometry.page_break_trigger:
+            self.page = self._new_page()
+
+    def add_text(self, text: str, style: TextStyle):
+        g = self.geometry
+        font = self.context.fonts[style.font_style]
+        widths = font.widths
+        font_size = style.size / g.k
+        to_mm = font_size / 1000
+        line_height = min(style.height, font_size * LINE_HEIGHT)
+        width = g.epw - style.indent
+        first_indent = style.first_indent * widths.space
+        first = True
+        for line in break_lines(text, widths, (width - 2 * g.c_margin) / to_mm, first_indent):
+            shift = first_indent * to_mm if first else 0
+            first = False
+            self._page_break_if_needed(line_height)
+            x = g.l_margin + style.indent + shift + g.c_margin
+            y = (g.height - self.y - 0.5 * line_height - 0.3 * font_size) * g.k
+            mapped = line.text.translate(font.chars)
+            if style.justify and not line.last and line.spaces:
+                word_spacing = (width - shift - 2 * g.c_margin - line.width * to_mm) / line.spaces
+                adjust = f'{-(word_spacing * g.k) * 1000 / style.size:.3f}'
+                words = mapped.split(font.space)
+                space = _escape(font.space)
+                text_op = '[' + ' '.join(
+                    [f'({_escape(words[0])})'] + [f'{adjust}({space}{_escape(word)})' for word in words[1:]]
+                ) + '] TJ'
+            else:
+                text_op = f'({_escape(mapped)}) Tj'
+            self.page.ops.append(f'BT {x * g.k:.2f} {y:.2f} Td /F{font.index} {style.size:.2f} Tf {text_op} ET')
+            self.page.fonts.add(font.index)
+            self.y += line_height
+        self.y += style.space_after
+
+    def add_rule(self):
+        g = self.geometry
+        y = (g.height - self.y - 2) * g.k
+        x1 = (g.l_margin + RULE_INDENT) * g.k
+        x2 = (g.width - g.r_margin - RULE_INDENT) * g.k
+        self.page.ops.append(f'{x1:.2f} {y:.2f} m {x2:.2f} {y:.2f} l S')
+        self.y += RULE_SPACE
+
+    def add_image(self, name: str):
+        size = self.context.image_sizes.get(name)
+        if not size:
+            return
+        h = IMAGE_WIDTH * size[1] / size[0]
+        self._page_break_if_needed(h)
+        self.page.images.append((name, self.geometry.l_margin, self.y, IMAGE_WIDTH, h))
+        self.y += h + IMAGE_SPACE
+
+
+def _escape(text: str) -> str:
+    return escape_parens(text.encode('utf-16-be').decode('latin-1'))
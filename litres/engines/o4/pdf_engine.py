@@ -1,70 +1,168 @@
 import io
-import os
 from pathlib import Path
-from typing import List, Literal
+from typing import Any, Dict, Iterable, List, Literal, Optional, Set, Tuple
 
-from fpdf import FPDF
+from fpdf import FPDF, Align, XPos, YPos
+from fpdf.enums import PDFResourceType
+from fpdf.line_break import TextLine
 from PIL import Image
 from tqdm import tqdm
 
 from litres.config import logger
 from litres.constants import SOURCE_IMAGE_FOLDER
 from litres.engines.base import Engine, OutFormat
-from litres.engines.o4.processors.pdf_processor import PDFContentProcessor
+from litres.engines.o4.font_cache import FontCache
+from litres.engines.o4.image_index import ImageIndex
+from litres.engines.o4.image_registry import ImageRegistry
+from litres.engines.o4.parallel_layout import (FontSpec, LayoutContext,
+                                               PageContent, PageGeometry,
+                                               init_worker, layout_chapter,
+                                               split_chapters)
+from litres.engines.o4.processors.pdf_processor import (Block, BlockType,
+                                                        PDFContentProcessor)
+from litres.engines.o4.sink import FormatSink
+from litres.engines.o4.text_layout import (IMAGE_SPACE, IMAGE_WIDTH,
+                                           LINE_HEIGHT, RULE_INDENT,
+                                           RULE_SPACE, TEXT_STYLES,
+                                           GlyphWidths, TextStyle, break_lines)
 from litres.models.book import Book
 from litres.models.output_path_handler import OutputPathHandler
-from litres.utils import load_and_parse_content
+from litres.models.parts_manifest import PartsManifest
+from litres.utils import iter_content, list_parts, process_pool
+
+MM_PER_INCH = 25.4
 
 
 class PDFEngine(Engine):
     """Simplified PDF engine using the new content processor"""
     
     SUPPORTED_OUT_FORMAT = OutFormat.PDF
+    MANIFEST_NAME = 'pdf.parts.json'
+
+    def __init__(
+        self,
+        quality: int = 75,
+        dpi: int = 0,
+        incremental: bool = False,
+        font_cache_dir: Optional[Path] = None,
+        parallel: bool = False,
+        parallel_parse: bool = False,
+    ):
+        self.parallel = parallel
+        self.parallel_parse = parallel_parse
+        self.quality = quality
+        self.dpi = dpi
+        self.incremental = incremental
+        # Метрики шрифтов разбираются один раз на процесс (и на диск, если задан каталог)
+        self.fonts = FontCache(font_cache_dir)
     
     def execute(self, book: Book, path: OutputPathHandler):
+        sink = None
         try:
-            content = load_and_parse_content(path.source)
-            if not content:
-                logger.error("No valid content found")
+            sink = self.open_sink(book, path)
+            if sink is None:
                 return
-            
-            img_dir = path.source / SOURCE_IMAGE_FOLDER
-            # debug_image_nodes(content, img_dir)
-
-            processor = PDFContentProcessor(img_dir)
-            
-            # Process content
-            pdf_content = processor.process_structure(content)
-            images = processor.get_images()
-            
-            # Build PDF
-            pdf_builder = PDFBuilder(book)
-            lines = processor.parse_content_with_headings(pdf_content)
-            
-            for line_text, is_heading in tqdm(lines, desc="Building PDF", colour='green'):
-                if not line_text:
-                    continue
-                    
-                if line_text.startswith('[IMAGE: '):
-                    pdf_builder.add_image(line_text, images)
-                else:
-                    pdf_builder.add_text(line_text, heading=is_heading)
-            
-            # Save PDF
-            output_path = path.output / (path.filename + '.pdf')
-            pdf_builder.save(output_path)
-            
-            logger.info(f"PDF saved to: {output_path}")
-            
+            # Части читаются по одной по мере вёрстки
+            for item in tqdm(iter_content(path.source, self.parallel_parse), desc="Building PDF", colour='green'):
+                sink.feed(item)
+            sink.close()
         except Exception as e:
             logger.error(f"Failed to generate PDF: {e}")
+            if sink:
+                sink.abort()
+
+    def open_sink(self, book: Book, path: OutputPathHandler) -> Optional['PDFSink']:
+        """Start a PDF build, None if the existing PDF is up to date"""
+        output_path = path.output / (path.filename + '.pdf')
+        # Текст нельзя дописать в уже свёрстанный файл: при изменении частей
+        # книга собирается заново, без изменений сборка пропускается
+        parts = list_parts(path.source)
+        manifest = PartsManifest(path.source / self.MANIFEST_NAME)
+        if self.incremental and manifest.is_current(output_path, parts, self._options()):
+            logger.info(f"PDF is up to date: {output_path}")
+            return None
+        return PDFSink(self, book, path.source / SOURCE_IMAGE_FOLDER, output_path,
+                       manifest if self.incremental else None, parts)
+
+    def _max_image_width(self) -> int:
+        """Ширина иллюстрации в пикселях при заданном DPI, 0 — без ограничения"""
+        if self.dpi <= 0:
+            return 0
+        return round(IMAGE_WIDTH / MM_PER_INCH * self.dpi)
+
+    def _options(self) -> dict:
+        return {'quality': self.quality, 'dpi': self.dpi, 'parallel': self.parallel}
+
+class PDFSink(FormatSink):
+    """PDF build fed with top-level nodes: blocks are laid out as they are
+    completed, images are encoded in the background meanwhile"""
+
+    name = 'PDF'
+
+    def __init__(
+        self,
+        engine: PDFEngine,
+        book: Book,
+        img_dir: Path,
+        output_path: Path,
+        manifest: Optional[PartsManifest],
+        parts: List[Path],
+    ):
+        self.parallel = engine.parallel
+        self.options = engine._options()
+        self.output_path = output_path
+        self.manifest = manifest
+        self.parts = parts
+        index = ImageIndex(img_dir)
+        self.processor = PDFContentProcessor(img_dir, index)
+        self.images = ImageRegistry(
+            img_dir, quality=engine.quality, max_width=engine._max_image_width(), index=index
+        )
+        self.images.start()
+        self.builder = PDFBuilder(book, self.images, engine.fonts)
+        # Для вёрстки по главам в процессах блоки собираются целиком
+        self.blocks: List[Block] = []
+        self.empty = True
+
+    def feed(self, item: Dict[str, Any]):
+        self.empty = False
+        self._add(self.processor.feed(item))
+
+    def _add(self, blocks: Iterable[Block]):
+        if self.parallel:
+            self.blocks.extend(blocks)
+        else:
+            for block in blocks:
+                self.builder.add_block(block)
+
+    def close(self):
+        try:
+            if self.empty:
+                logger.error("No valid content found")
+                return
+            self._add(self.processor.finish())
+            if self.parallel:
+                self.builder.add_blocks_parallel(self.blocks)
+            self.builder.save(self.output_path)
+            if self.manifest:
+                self.manifest.record(self.output_path, self.parts, self.options)
+            logger.info(f"PDF saved to: {self.output_path}")
+        finally:
+            self.images.close()
+
+    def abort(self):
+        self.images.close()
+
 
 class PDFBuilder:
     """Handles PDF construction with proper font management"""
     
-    def __init__(self, book: Book):
+    def __init__(self, book: Book, images: ImageRegistry, fonts: Optional[FontCache] = None):
         self.pdf = FPDF()
         self.book = book
+        self.images = images
+        self.fonts = fonts or FontCache()
+        self._widths: Dict[str, GlyphWidths] = {}
         self.default_font = "NotoSans"
         self._setup()
     
@@ -85,64 +183,149 @@ class PDFBuilder:
         }
         
         for style, suffix in font_variants.items():
-            font_path = f"fonts/{self.default_font}-{suffix}.ttf"
-            if os.path.isfile(font_path):
-                self.pdf.add_font(
-                    family=self.default_font,
-                    style=style,
-                    fname=font_path,
-                    uni=True
-                )
+            font_path = Path(f"fonts/{self.default_font}-{suffix}.ttf")
+            if font_path.is_file():
+                self.fonts.add_font(self.pdf, self.default_font, style, font_path)
     
+    def add_block(self, block: Block):
+        """Lay out a single typed block"""
+        if block.type == BlockType.IMAGE:
+            self.add_image(block.text)
+        elif block.type == BlockType.RULE:
+            self.add_rule()
+        else:
+            self.add_styled_text(block.text, TEXT_STYLES[block.type])
+
     def add_text(self, text: str, heading: bool = False):
         """Add text to PDF with proper formatting"""
-        if heading:
-            self.pdf.set_font(self.default_font, 'B', 16)
-            self.pdf.multi_cell(
-                0, 7, text,
-                align='L', ln=True,
-                max_line_height=self.pdf.font_size * 1.15
+        self.add_styled_text(text, TEXT_STYLES[BlockType.HEADING if heading else BlockType.PARAGRAPH])
+    
+    def add_quote(self, text: str):
+        """Add an indented quotation paragraph"""
+        self.add_styled_text(text, TEXT_STYLES[BlockType.QUOTE])
+
+    def add_styled_text(self, text: str, style: TextStyle):
+        """Break a paragraph into lines with the glyph width table and print them.
+
+        fpdf2 gets ready lines with their widths, so it doesn't measure text.
+        """
+        pdf = self.pdf
+        pdf.set_font(self.default_font, style.font_style, style.size)
+        widths = self._glyph_widths()
+        to_mm = pdf.font_size / 1000
+        line_height = min(style.height, pdf.font_size * LINE_HEIGHT)
+        width = pdf.epw - style.indent
+        first_indent = style.first_indent * widths.space
+        first = True
+        for line in break_lines(text, widths, (width - 2 * pdf.c_margin) / to_mm, first_indent):
+            shift = first_indent * to_mm if first else 0
+            first = False
+            pdf.set_x(pdf.l_margin + style.indent + shift)
+            text_line = TextLine(
+                pdf._preload_font_styles(line.text, False),
+                text_width=line.width * to_mm,
+                number_of_spaces=line.spaces,
+                align=Align.J if style.justify and not line.last else Align.L,
+                height=line_height,
+                max_width=width - shift,
             )
-            self.pdf.ln(4)
-        else:
-            self.pdf.set_font(self.default_font, '', 12)
-            # Add paragraph indentation
-            indented_text = "    " + text
-            self.pdf.multi_cell(
-                0, 5, indented_text,
-                align='J', ln=True,
-                max_line_height=self.pdf.font_size * 1.15
+            pdf._render_styled_text_line(text_line, line_height, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.ln(style.space_after)
+
+    def _glyph_widths(self) -> GlyphWidths:
+        font = self.pdf.current_font
+        widths = self._widths.get(font.fontkey)
+        if widths is None:
+            widths = self._widths[font.fontkey] = GlyphWidths.from_font(font)
+        return widths
+
+    def add_rule(self):
+        """Add a horizontal separator line"""
+        y = self.pdf.get_y() + 2
+        self.pdf.line(self.pdf.l_margin + RULE_INDENT, y, self.pdf.w - self.pdf.r_margin - RULE_INDENT, y)
+        self.pdf.ln(RULE_SPACE)
+
+    def add_blocks_parallel(self, blocks: List[Block], max_workers: Optional[int] = None):
+        """Lay out chapters in worker processes and place their pages in order.
+
+        Every chapter starts on a new page, so chapters paginate
+        independently. The glyph subset is assigned here before layout, so
+        all workers encode text with the same character codes and the
+        document keeps a single subset per font.
+        """
+        chapters = split_chapters(blocks)
+        if len(chapters) < 2:
+            for block in tqdm(blocks, desc="Building PDF", colour='green'):
+                self.add_block(block)
+            return
+
+        context = self._layout_context(blocks)
+        first_page = True
+        # Потоки кодирования картинок уже работают, пул запускается без fork
+        with process_pool(max_workers, initializer=init_worker, initargs=(context,)) as executor:
+            for pages in tqdm(executor.map(layout_chapter, chapters), total=len(chapters),
+                              desc="Building PDF", colour='green'):
+                for page in pages:
+                    # Первая глава занимает уже созданную первую страницу
+                    if not first_page:
+                        self.pdf.add_page()
+                    first_page = False
+                    self._place_page(page)
+
+    def _layout_context(self, blocks: List[Block]) -> LayoutContext:
+        pdf = self.pdf
+        geometry = PageGeometry(
+            width=pdf.w, height=pdf.h, k=pdf.k,
+            l_margin=pdf.l_margin, r_margin=pdf.r_margin, t_margin=pdf.t_margin,
+            c_margin=pdf.c_margin, page_break_trigger=pdf.page_break_trigger,
+        )
+        chars: Dict[str, Set[str]] = {style.font_style: {' '} for style in TEXT_STYLES.values()}
+        image_sizes: Dict[str, Tuple[int, int]] = {}
+        for block in blocks:
+            if block.type == BlockType.IMAGE:
+                image = self.images.get(block.text)
+                if image is not None:
+                    with Image.open(io.BytesIO(image.data)) as img:
+                        image_sizes[block.text] = img.size
+            elif block.type in TEXT_STYLES:
+                chars[TEXT_STYLES[block.type].font_style].update(block.text)
+
+        fonts = {}
+        for font_style, used in chars.items():
+            pdf.set_font(self.default_font, font_style)
+            font = pdf.current_font
+            fonts[font_style] = FontSpec(
+                index=font.i,
+                widths=GlyphWidths.from_font(font),
+                chars={ord(char): self._subset_char(font, char) for char in sorted(used)},
             )
-            self.pdf.ln(3)
-    
-    def add_image(self, image_line: str, images: List[Path]):
+        return LayoutContext(geometry=geometry, fonts=fonts, image_sizes=image_sizes)
+
+    @staticmethod
+    def _subset_char(font, char: str) -> Optional[str]:
+        code = font.subset.pick(ord(char))
+        return chr(code) if code else None
+
+    def _place_page(self, page: PageContent):
+        pdf = self.pdf
+        for index in page.fonts:
+            pdf._resource_catalog.add(PDFResourceType.FONT, index, pdf.page)
+        if page.ops:
+            pdf._out('\n'.join(page.ops))
+        for name, x, y, w, h in page.images:
+            image = self.images.get(name)
+            if image is not None:
+                pdf.image(image.data, x=x, y=y, w=w, h=h)
+
+    def add_image(self, image_name: str):
         """Add image to PDF"""
-        # Extract image name from [IMAGE: filename] format
-        image_name = image_line[8:-1]
-        
-        # Find matching image
-        image_path = next((img for img in images if img.name == image_name), None)
-        if not image_path:
-            logger.warning(f"Image not found: {image_name}")
+        image = self.images.get(image_name)
+        if image is None:
             return
-        
-        try:
-            with Image.open(image_path) as img:
-                # Конвертация в RGB при необходимости
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Используем буфер в памяти вместо файла
-                img_byte_arr = io.BytesIO()
-                img.save(img_byte_arr, format='JPEG')
-                img_byte_arr.seek(0)  # Сбрасываем указатель в начало
-                
-                # Добавляем в PDF из памяти
-                self.pdf.image(img_byte_arr, x=10, w=180)
-                self.pdf.ln(10)
-        except Exception as e:
-            logger.error(f"Failed to process image {image_path}: {e}")
-    
+        # Одинаковые байты fpdf2 встраивает один раз и ссылается на них повторно
+        self.pdf.image(image.data, x=self.pdf.l_margin, w=IMAGE_WIDTH)
+        self.pdf.ln(IMAGE_SPACE)
+
     def save(self, output_path: Path):
         """Save PDF to file"""
         self.pdf.output(str(output_path))
\ No newline at end of file
@@ -1,30 +1,61 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from litres.engines.o4.image_index import ImageIndex
+
+SOFT_HYPHEN = '\u00ad'
+
+
+def node_text(content: Any) -> str:
+    """Text of a node's content: a string, or a list of strings joined
+    without soft hyphens. Content with child nodes has no own text"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list) and is_text_content(content):
+        return ''.join(content).replace(SOFT_HYPHEN, '')
+    return ''
+
+
+def is_text_content(content: List[Any]) -> bool:
+    for item in content:
+        if not isinstance(item, str):
+            return False
+    return True
 
 
 class ContentNode:
-    """Represents a structured content node with type, xpath, and content"""
-    
-    def __init__(self, data: Dict[str, Any]):
-        self.type: Optional[str] = data.get('t')
-        self.xpath: Optional[List[int]] = data.get('xp')
-        self.content: Union[str, List[Any]] = data.get('c', [])
+    """Represents a structured content node with type, xpath, and content.
 
+    A thin view over the raw dict: fields are read on access. Processors
+    walk the raw dicts and only wrap nodes they hand to subclass hooks.
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, data: Dict[str, Any]):
         self.data = data
-    
+
+    @property
+    def type(self) -> Optional[str]:
+        return self.data.get('t')
+
+    @property
+    def xpath(self) -> Optional[List[int]]:
+        return self.data.get('xp')
+
+    @property
+    def content(self) -> Union[str, List[Any]]:
+        return self.data.get('c', [])
+
     def is_text_node(self) -> bool:
         """Check if this node contains only text content"""
-        return isinstance(self.content, list) and all(isinstance(x, str) for x in self.content)
+        content = self.content
+        return isinstance(content, list) and is_text_content(content)
     
     def get_text(self) -> str:
         """Extract text content, handling soft hyphens"""
-        if isinstance(self.content, str):
-            return self.content
-        elif self.is_text_node():
-            # Join text fragments, removing soft hyphens
-            return ''.join(self.content).replace('­', '')
-        return ''
+        return node_text(self.content)
     
     def get_children(self) -> List['ContentNode']:
         """Get child nodes"""
@@ -51,10 +82,15 @@ class ContentNode:
         return None
 
 class BaseContentProcessor(ABC):
-    """Base class for processing content nodes into different formats"""
+    """Base class for processing content nodes into different formats.
+
+    Image lookups go to `image_index`; pass the index shared with the image
+    registry to scan the folder once per build.
+    """
     
-    def __init__(self, img_dir: Path):
+    def __init__(self, img_dir: Path, image_index: Optional[ImageIndex] = None):
         self.img_dir = img_dir
+        self.image_index = image_index or ImageIndex(img_dir)
         self.context = self._init_context()
     
     @abstractmethod
@@ -62,13 +98,12 @@ class BaseContentProcessor(ABC):
         """Initialize processor-specific context"""
         pass
     
-    def process_structure(self, structure: List[Dict[str, Any]]) -> str:
-        """Process the entire document structure"""
-        nodes = [ContentNode(item) for item in structure]
+    def process_structure(self, structure: Iterable[Dict[str, Any]]) -> str:
+        """Process the entire document structure, items may come from a generator"""
         content_parts = []
         
-        for node in nodes:
-            processed = self.process_node(node)
+        for item in structure:
+            processed = self._process_data(item)
             if processed:
                 content_parts.append(processed)
         
@@ -76,38 +111,55 @@ class BaseContentProcessor(ABC):
     
     def process_node(self, node: ContentNode) -> str:
         """Process a single content node"""
-        if not node.type:
-            return self._escape_text(node.get_text())
-        
-        if node.type == 'img':
-            return self._process_image(node)
-        
-        # Process children first
-        children_content = self._process_children(node)
-        
-        # Apply node-specific processing
-        return self._process_node_type(node, children_content)
-    
-    def _process_children(self, node: ContentNode) -> str:
-        """Process child nodes and text content"""
-        if node.is_text_node():
-            return self._escape_text(node.get_text())
-        
-        parts = []
-        if isinstance(node.content, list):
-            for item in node.content:
+        return self._process_data(node.data)
+
+    def _process_data(self, data: Dict[str, Any]) -> str:
+        """Process a raw node dict with an explicit stack instead of recursion.
+
+        A stack frame is the node type, an iterator over its remaining
+        content and the processed parts of its children so far.
+        """
+        escape = self._escape_text
+        result: List[str] = []
+        stack: List[Tuple[Optional[str], Iterator[Any], List[str]]] = []
+        self._enter(data, stack, result)
+        while stack:
+            node_type, items, parts = stack[-1]
+            for item in items:
                 if isinstance(item, str):
-                    parts.append(self._escape_text(item))
-                elif isinstance(item, dict):
-                    child_node = ContentNode(item)
-                    parts.append(self.process_node(child_node))
-        
-        return ''.join(parts)
+                    parts.append(escape(item))
+                elif isinstance(item, dict) and self._enter(item, stack, parts):
+                    break
+            else:
+                stack.pop()
+                content = ''.join(parts)
+                # Копии текста освобождаются сразу, как при возврате из рекурсии:
+                # части детей до обёртки узла, его содержимое после
+                del parts
+                (stack[-1][2] if stack else result).append(self._process_node_type(node_type, content))
+                del content
+        return ''.join(result)
+
+    def _enter(self, data: Dict[str, Any], stack: list, out: List[str]) -> bool:
+        """Process a leaf node into `out` right away, or push a frame for a
+        node with child nodes and return True"""
+        node_type = data.get('t')
+        content = data.get('c', [])
+        if not node_type:
+            out.append(self._escape_text(node_text(content)))
+        elif node_type == 'img':
+            out.append(self._process_image(ContentNode(data)))
+        elif isinstance(content, list) and not is_text_content(content):
+            stack.append((node_type, iter(content), []))
+            return True
+        else:
+            text = node_text(content) if isinstance(content, list) else ''
+            out.append(self._process_node_type(node_type, self._escape_text(text)))
+        return False
     
-    @abstractmethod
-    def _process_node_type(self, node: ContentNode, content: str) -> str:
-        """Process specific node types - implemented by subclasses"""
-        pass
+    def _process_node_type(self, node_type: Optional[str], content: str) -> str:
+        """Process specific node types, plain content by default"""
+        return content
     
     @abstractmethod
     def _process_image(self, node: ContentNode) -> str:
@@ -119,7 +171,6 @@ class BaseContentProcessor(ABC):
         """Escape text for the target format"""
         pass
     
-    @abstractmethod
     def _finalize_content(self, content_parts: List[str]) -> str:
         """Finalize the processed content"""
-        pass
\ No newline at end of file
+        return ''.join(content_parts)
\ No newline at end of file
@@ -1,12 +1,16 @@
 import base64
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, TextIO, Tuple
 from xml.sax.saxutils import escape
 
 from litres.config import logger
-from litres.constants import SUPPORTED_IMAGE_EXTENSIONS
+from litres.engines.o4.image_registry import ImageRegistry
 from litres.engines.o4.processors.content_processor import (
     BaseContentProcessor, ContentNode)
 
+# Кратно 3 байтам: куски кодируются в base64 без выравнивания посередине
+BASE64_CHUNK = 3 * 64 * 1024
+EMPTY_BODY = '<section><p></p></section>'
+
 
 class ImageIdGenerator:
     """Generates unique IDs for images"""
@@ -45,12 +49,12 @@ class FB2ContentProcessor(BaseContentProcessor):
             'images': []
         }
     
-    def _process_node_type(self, node: ContentNode, content: str) -> str:
+    def _process_node_type(self, node_type: Optional[str], content: str) -> str:
         """Process node types specific to FB2"""
-        if node.type in ('br', 'hr'):
+        if node_type in ('br', 'hr'):
             return '<empty-line/>'
         
-        if node.type and (fb2_tag := self.TAG_MAPPING.get(node.type)):
+        if node_type and (fb2_tag := self.TAG_MAPPING.get(node_type)):
             return f'<{fb2_tag}>{content}</{fb2_tag}>'
         
         return content
@@ -62,10 +66,8 @@ class FB2ContentProcessor(BaseContentProcessor):
             logger.warning(f"No image src found in node: {node.type}")
             return ''
         
-        # Check if image exists
-        image_path = self.img_dir / src
-        if not image_path.exists():
-            logger.warning(f"Image not found: {image_path}")
+        if src not in self.image_index:
+            logger.warning(f"Image not found: {self.img_dir / src}")
             return ''
         
         img_id = self.context['img_id_gen'].get_id(src)
@@ -83,43 +85,34 @@ class FB2ContentProcessor(BaseContentProcessor):
     def _finalize_content(self, content_parts: List[str]) -> str:
         """Finalize FB2 content"""
         if not content_parts:
-            return '<section><p></p></section>'
-        
-        # Wrap content in sections if needed
-        wrapped_parts = []
-        for part in content_parts:
-            if not part.strip():
-                continue
-            if not any(part.startswith(f'<{tag}') for tag in ['section', 'title', 'subtitle']):
-                wrapped_parts.append(f'<section>{part}</section>')
-            else:
-                wrapped_parts.append(part)
-        
-        return ''.join(wrapped_parts)
+            return EMPTY_BODY
+        return ''.join(self.wrap_part(part) for part in content_parts)
+
+    def wrap_part(self, part: str) -> str:
+        """Wrap a processed top-level node in a section if needed"""
+        if not part.strip():
+            return ''
+        if not part.startswith(('<section', '<title', '<subtitle')):
+            return f'<section>{part}</section>'
+        return part
     
-    def generate_binaries(self) -> str:
-        """Generate binary section for embedded images"""
-        binaries = []
+    def write_binaries(self, images: ImageRegistry, out: TextIO):
+        """Write binary sections for embedded images, one image at a time.
+
+        Images are base64-encoded in chunks read from the encoded bytes or
+        straight from the source file, so no image is held as a whole
+        base64 string.
+        """
+        first = True
         for src, img_id in self.context['img_id_gen'].items():
-            binary = self._create_binary_section(src, img_id)
-            if binary:
-                binaries.append(binary)
-        return '\n'.join(binaries)
-    
-    def _create_binary_section(self, src: str, img_id: str) -> Optional[str]:
-        """Create binary section for an image"""
-        try:
-            image_path = self.img_dir / src
-            if not image_path.exists():
-                logger.warning(f"Image not found: {image_path}")
-                return None
-            
-            data = image_path.read_bytes()
-            ext = image_path.suffix.lower()
-            mime_type = SUPPORTED_IMAGE_EXTENSIONS.get(ext, 'application/octet-stream')
-            b64_data = base64.b64encode(data).decode('ascii')
-            
-            return f'<binary id="{img_id}" content-type="{mime_type}">{b64_data}</binary>'
-        except Exception as e:
-            logger.error(f"Failed to process image {src}: {e}")
-            return None
\ No newline at end of file
+            image = images.get(src)
+            if image is None:
+                continue
+            if not first:
+                out.write('\n')
+            first = False
+            out.write(f'<binary id="{img_id}" content-type="{image.mime_type}">')
+            with image.open() as stream:
+                while chunk := stream.read(BASE64_CHUNK):
+                    out.write(base64.b64encode(chunk).decode('ascii'))
+            out.write('</binary>')
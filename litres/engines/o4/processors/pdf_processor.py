@@ -1,104 +1,189 @@
-import re
+from dataclasses import dataclass
+from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from litres.config import logger
+from litres.engines.o4.image_index import ImageIndex
 from litres.engines.o4.processors.content_processor import (
-    BaseContentProcessor, ContentNode)
+    BaseContentProcessor, ContentNode, is_text_content, node_text)
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'title')
+BLOCK_TAGS = ('p', 'div')
+
+
+class BlockType(Enum):
+    PARAGRAPH = "paragraph"
+    HEADING = "heading"
+    IMAGE = "image"
+    RULE = "rule"
+    QUOTE = "quote"
+
+
+@dataclass(slots=True)
+class Block:
+    """Typed layout block: a line of text, an image file name or a rule"""
+    type: BlockType
+    text: str = ''
 
 
 class PDFContentProcessor(BaseContentProcessor):
     """Processes content for PDF format"""
-    
+
+    def __init__(self, img_dir: Path, image_index: Optional[ImageIndex] = None):
+        super().__init__(img_dir, image_index)
+        self._builder = _BlockBuilder()
+
     def _init_context(self) -> Dict[str, Any]:
         return {
             'images': [],
             'headings': []
         }
-    
-    def _process_node_type(self, node: ContentNode, content: str) -> str:
-        """Process node types specific to PDF"""
-        if node.type in ('p', 'div'):
-            return f"\n{content}\n"
-        
-        if node.type in ('h1', 'h2', 'h3', 'title'):
-            self.context['headings'].append(content.strip())
-            return f"\n[HEADING]{content.strip()}[/HEADING]\n"
-        
-        if node.type == 'br':
-            return "\n"
-        
-        if node.type == 'hr':
-            return "\n" + "-" * 50 + "\n"
-        
-        if node.type == 'blockquote':
-            # Indent blockquote content
-            indented = '\n'.join(f"    {line}" for line in content.split('\n') if line.strip())
-            return f"\n{indented}\n"
-        
-        return content
-    
+
+    def iter_blocks(self, structure: Iterable[Dict[str, Any]]) -> Iterator[Block]:
+        """Yield layout blocks for the document structure as it is walked"""
+        builder = _BlockBuilder()
+        for item in structure:
+            yield from self._node_blocks(item, builder)
+        yield from builder.flush()
+
+    def feed(self, item: Dict[str, Any]) -> Iterator[Block]:
+        """Blocks completed by the next top-level node, when nodes are pushed
+        one by one instead of iterating a structure"""
+        return self._node_blocks(item, self._builder)
+
+    def finish(self) -> Iterator[Block]:
+        """The last block after all nodes were fed"""
+        return self._builder.flush()
+
+    def _node_blocks(self, data: Dict[str, Any], builder: '_BlockBuilder') -> Iterator[Block]:
+        """Walk a raw node dict, collecting inline text and yielding finished
+        blocks. Nested nodes go on an explicit stack of (type, content iterator)"""
+        stack: List[Tuple[str, Iterator[Any]]] = []
+        yield from self._enter(data, builder, stack)
+        while stack:
+            node_type, items = stack[-1]
+            for item in items:
+                if isinstance(item, str):
+                    yield from builder.add_text(item)
+                elif isinstance(item, dict):
+                    depth = len(stack)
+                    yield from self._enter(item, builder, stack)
+                    if len(stack) > depth:
+                        break
+            else:
+                stack.pop()
+                yield from self._exit(node_type, builder)
+
+    def _enter(self, data: Dict[str, Any], builder: '_BlockBuilder', stack: list) -> Iterator[Block]:
+        """Start a node: leaf nodes are handled completely, a node with
+        child nodes is pushed on the stack and finished by `_exit`"""
+        node_type = data.get('t')
+        content = data.get('c', [])
+        if not node_type:
+            yield from builder.add_text(node_text(content))
+            return
+
+        if node_type == 'img':
+            image_path = self._image_path(ContentNode(data))
+            if image_path:
+                yield from builder.flush()
+                yield Block(BlockType.IMAGE, image_path.name)
+            return
+
+        if node_type == 'br':
+            yield from builder.flush()
+            return
+
+        if node_type == 'hr':
+            yield from builder.flush()
+            yield Block(BlockType.RULE)
+            return
+
+        is_heading = node_type in HEADING_TAGS
+        if is_heading or node_type in BLOCK_TAGS or node_type == 'blockquote':
+            yield from builder.flush()
+        if is_heading:
+            builder.heading_depth += 1
+            builder.heading_parts = []
+        elif node_type == 'blockquote':
+            builder.quote_depth += 1
+
+        if isinstance(content, list) and not is_text_content(content):
+            stack.append((node_type, iter(content)))
+            return
+        if isinstance(content, list):
+            yield from builder.add_text(node_text(content))
+        yield from self._exit(node_type, builder)
+
+    def _exit(self, node_type: str, builder: '_BlockBuilder') -> Iterator[Block]:
+        is_heading = node_type in HEADING_TAGS
+        if is_heading or node_type in BLOCK_TAGS or node_type == 'blockquote':
+            yield from builder.flush()
+        if is_heading:
+            builder.heading_depth -= 1
+            if builder.heading_depth == 0 and builder.heading_parts:
+                self.context['headings'].append(' '.join(builder.heading_parts))
+        elif node_type == 'blockquote':
+            builder.quote_depth -= 1
+
     def _process_image(self, node: ContentNode) -> str:
         """Process image references for PDF"""
+        image_path = self._image_path(node)
+        return image_path.name if image_path else ''
+
+    def _image_path(self, node: ContentNode) -> Optional[Path]:
+        """Resolve and register an existing image file"""
         src = self._get_image_src(node)
         if not src:
-            return ''
-        
-        image_path = self.img_dir / src
-        if image_path.exists():
-            self.context['images'].append(image_path)
-            return f"\n[IMAGE: {image_path.name}]\n"
-        else:
-            logger.warning(f"Image not found: {image_path}")
-            return ''
-    
+            return None
+
+        image = self.image_index.get(src)
+        if image is None:
+            logger.warning(f"Image not found: {self.img_dir / src}")
+            return None
+        self.context['images'].append(image.path)
+        return image.path
+
     def _get_image_src(self, node: ContentNode) -> Optional[str]:
         """Extract image source from node"""
         return node.get_image_src()
-    
+
     def _escape_text(self, text: str) -> str:
         """No escaping needed for PDF"""
         return text
-    
-    def _finalize_content(self, content_parts: List[str]) -> str:
-        """Finalize PDF content"""
-        return ''.join(content_parts)
-    
+
     def get_images(self) -> List[Path]:
         """Get list of processed images"""
         return self.context['images']
-    
-    def parse_content_with_headings(self, content: str) -> List[Tuple[str, bool]]:
-        """Parse content and identify headings"""
-        lines = []
-        pattern = re.compile(r'\[HEADING\](.*?)\[/HEADING\]', re.DOTALL)
-        pos = 0
-        
-        for match in pattern.finditer(content):
-            # Regular text before heading
-            pre_text = content[pos:match.start()].strip()
-            if pre_text:
-                for line in pre_text.split('\n'):
-                    line = line.strip()
-                    if line:
-                        lines.append((line, False))
-            
-            # Heading text
-            heading_text = match.group(1).strip()
-            if heading_text:
-                for line in heading_text.split('\n'):
-                    line = line.strip()
-                    if line:
-                        lines.append((line, True))
-            
-            pos = match.end()
-        
-        # Text after last heading
-        rest = content[pos:].strip()
-        if rest:
-            for line in rest.split('\n'):
-                line = line.strip()
-                if line:
-                    lines.append((line, False))
-        
-        return lines
\ No newline at end of file
+
+
+class _BlockBuilder:
+    """Accumulates inline text until a block boundary"""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.heading_depth = 0
+        self.heading_parts: List[str] = []
+        self.quote_depth = 0
+
+    def add_text(self, text: str) -> Iterator[Block]:
+        # Перевод строки внутри текста тоже завершает блок
+        lines = text.split('\n')
+        for line in lines[:-1]:
+            self.parts.append(line)
+            yield from self.flush()
+        self.parts.append(lines[-1])
+
+    def flush(self) -> Iterator[Block]:
+        text = ''.join(self.parts).strip()
+        self.parts = []
+        if not text:
+            return
+        if self.heading_depth:
+            self.heading_parts.append(text)
+            yield Block(BlockType.HEADING, text)
+        elif self.quote_depth:
+            yield Block(BlockType.QUOTE, text)
+        else:
+            yield Block(BlockType.PARAGRAPH, text)
@@ -0,0 +1,24 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict
+
+
+class FormatSink(ABC):
+    """One output format of an o4 book, built from top-level content nodes.
+
+    An engine opens a sink, the caller feeds it the nodes in book order and
+    closes it to write the output. Several sinks can share a single parse
+    of the book (see MultiFormatEngine).
+    """
+
+    name: str = ''
+
+    @abstractmethod
+    def feed(self, item: Dict[str, Any]):
+        """Process the next top-level node"""
+
+    @abstractmethod
+    def close(self):
+        """Finish the output and write it to disk"""
+
+    def abort(self):
+        """Release resources of a sink that won't be closed"""
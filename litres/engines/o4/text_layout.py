@@ -0,0 +1,132 @@
+from typing import Dict, Iterator, List, Mapping, NamedTuple
+
+from fpdf.fonts import TTFFont
+
+from litres.engines.o4.processors.pdf_processor import BlockType
+
+# Ширины символов базовой плоскости Unicode хранятся списком
+BMP_SIZE = 0x10000
+# Слова длиннее не кешируются, они почти не повторяются
+MAX_CACHED_WORD = 32
+
+# Вёрстка страницы, размеры в мм
+LINE_HEIGHT = 1.15
+PARAGRAPH_INDENT = 4
+QUOTE_INDENT = 10
+RULE_INDENT = 40
+RULE_SPACE = 6
+IMAGE_WIDTH = 180
+IMAGE_SPACE = 10
+
+
+class TextStyle(NamedTuple):
+    """Font and spacing of a text block. `first_indent` is in spaces"""
+    font_style: str
+    size: int
+    height: float
+    space_after: float
+    indent: float = 0
+    first_indent: int = 0
+    justify: bool = True
+
+
+TEXT_STYLES: Dict[BlockType, TextStyle] = {
+    BlockType.HEADING: TextStyle('B', 16, 7, 4, justify=False),
+    BlockType.PARAGRAPH: TextStyle('', 12, 5, 3, first_indent=PARAGRAPH_INDENT),
+    BlockType.QUOTE: TextStyle('I', 12, 5, 3, indent=QUOTE_INDENT),
+}
+
+
+class GlyphWidths:
+    """Advance widths of a font in thousandths of the font size.
+
+    Widths of the Basic Multilingual Plane are kept in a flat list, so the
+    width of a word is summed in a single C-level pass. Word widths are
+    memoized: natural language text reuses a small vocabulary.
+    """
+
+    def __init__(self, cw: Mapping[int, int], missing_width: int):
+        self._missing_width = missing_width
+        self._table: List[int] = [missing_width] * BMP_SIZE
+        # Символы вне базовой плоскости редки, для них остаётся словарь
+        self._astral: Dict[int, int] = {}
+        for char, width in cw.items():
+            if char < BMP_SIZE:
+                self._table[char] = width
+            else:
+                self._astral[char] = width
+        self._words: Dict[str, int] = {}
+        self.space = self._table[ord(' ')]
+
+    @classmethod
+    def from_font(cls, font: TTFFont) -> 'GlyphWidths':
+        return cls(font.cw, font.desc.missing_width)
+
+    def char_width(self, char: str) -> int:
+        code = ord(char)
+        if code < BMP_SIZE:
+            return self._table[code]
+        return self._astral.get(code, self._missing_width)
+
+    def text_width(self, text: str) -> int:
+        width = self._words.get(text)
+        if width is None:
+            try:
+                width = sum(map(self._table.__getitem__, map(ord, text)))
+            except IndexError:
+                width = sum(map(self.char_width, text))
+            if len(text) <= MAX_CACHED_WORD:
+                self._words[text] = width
+        return width
+
+
+class Line(NamedTuple):
+    """A laid out line: text, its width in font units and number of spaces"""
+    text: str
+    width: int
+    spaces: int
+    last: bool
+
+
+def break_lines(text: str, widths: GlyphWidths, max_width: float, first_indent: float = 0) -> Iterator[Line]:
+    """Greedy line breaking of a paragraph.
+
+    Widths are in thousandths of the font size. Whitespace runs collapse to
+    a single space, words wider than a line are split by characters. The
+    first line is `first_indent` narrower than the rest.
+    """
+    space = widths.space
+    words: List[str] = []
+    width = 0
+    limit = max_width - first_indent
+
+    for word in text.split():
+        word_width = widths.text_width(word)
+        if words and width + space + word_width <= limit:
+            words.append(word)
+            width += space + word_width
+            continue
+        if words:
+            yield Line(' '.join(words), width, len(words) - 1, False)
+            limit = max_width
+        while word_width > limit:
+            head, word = _split_word(word, widths, limit)
+            yield Line(head, widths.text_width(head), 0, False)
+            limit = max_width
+            word_width = widths.text_width(word)
+        words = [word] if word else []
+        width = word_width
+
+    if words:
+        yield Line(' '.join(words), width, len(words) - 1, True)
+
+
+def _split_word(word: str, widths: GlyphWidths, limit: float):
+    """Longest prefix of a word that fits into the limit (at least one character)"""
+    width = 0
+    for i, char in enumerate(word):
+        width += widths.char_width(char)
+        if width > limit:
+            i = max(i, 1)
+            return word[:i], word[i:]
+    return word, ''
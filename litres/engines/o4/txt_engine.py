@@ -1,32 +1,99 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
 from litres.config import logger
+from litres.constants import SOURCE_IMAGE_FOLDER
 from litres.engines.base import Engine, OutFormat
+from litres.engines.o4.processors.content_processor import (SOFT_HYPHEN,
+                                                            ContentNode)
+from litres.engines.o4.processors.pdf_processor import (Block, BlockType,
+                                                        PDFContentProcessor)
+from litres.engines.o4.sink import FormatSink
+from litres.models.book import Book
 from litres.models.output_path_handler import OutputPathHandler
+from litres.utils import iter_content
+
+# Буфер записи: текст уходит на диск крупными блоками
+WRITE_BUFFER = 1024 * 1024
 
 
 class TXTEngine(Engine):
     SUPPORTED_OUT_FORMAT = OutFormat.TXT
 
-    @staticmethod
-    def _extract_text(data):
-        text = ""
-        if isinstance(data, str):
-            text = data
-        elif isinstance(data, list):
-            text = "".join(TXTEngine._extract_text(item) for item in data)
-        elif isinstance(data, dict):
-            if "c" in data and data["c"] is not None:
-                text = TXTEngine._extract_text(data["c"])
-        return text.replace("\u00ad", "")
-
-    def execute(self, book, path: OutputPathHandler):
-        # book.parts is expected to be the structure for text extraction
-        results = []
-        for text_block in book.parts:
-            if "c" in text_block:
-                results.append(self._extract_text(text_block["c"]))
-        result_text = '\n'.join(results)
-        filename = path.output / (path.filename + '.txt')
-        with open(filename, 'w', encoding='utf-8', buffering=1024*1024) as outfile:
-            outfile.write(result_text)
-        logger.info(f"Book text successfully saved to: {filename}") 
-        
\ No newline at end of file
+    def __init__(self, parallel_parse: bool = False):
+        self.parallel_parse = parallel_parse
+
+    def execute(self, book: Book, path: OutputPathHandler):
+        sink = None
+        try:
+            sink = self.open_sink(book, path)
+            # Части читаются по одной, текст сразу пишется в файл
+            for item in iter_content(path.source, self.parallel_parse):
+                sink.feed(item)
+            sink.close()
+        except Exception as e:
+            logger.error(f"Failed to generate TXT: {e}")
+            if sink:
+                sink.abort()
+
+    def open_sink(self, book: Book, path: OutputPathHandler) -> 'TXTSink':
+        return TXTSink(path.source / SOURCE_IMAGE_FOLDER, path.output / (path.filename + '.txt'))
+
+
+class TextBlocks(PDFContentProcessor):
+    """Layout blocks of the PDF walker without image lookups"""
+
+    def _image_path(self, node: ContentNode) -> Optional[Path]:
+        return None
+
+
+class TXTSink(FormatSink):
+    """Plain text written to disk as nodes are fed: a line per paragraph,
+    headings set off by blank lines. Only the current block is held in
+    memory; the file gets its name when complete"""
+
+    name = 'TXT'
+
+    def __init__(self, img_dir: Path, filename: Path):
+        self.filename = filename
+        self.processor = TextBlocks(img_dir)
+        self.tmp_path = filename.with_name(filename.name + '.part')
+        self.out = open(self.tmp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER)
+        self.started = False
+        self.in_heading = False
+
+    def feed(self, item: Dict[str, Any]):
+        self._write(self.processor.feed(item))
+
+    def _write(self, blocks: Iterable[Block]):
+        write = self.out.write
+        for block in blocks:
+            if block.type is BlockType.HEADING:
+                # Пустая строка перед заголовком и после него
+                if self.started and not self.in_heading:
+                    write('\n')
+                self.in_heading = True
+            else:
+                if self.in_heading:
+                    write('\n')
+                    self.in_heading = False
+                if block.type is BlockType.RULE:
+                    write('\n')
+                    continue
+            write(block.text.replace(SOFT_HYPHEN, ''))
+            write('\n')
+            self.started = True
+
+    def close(self):
+        try:
+            self._write(self.processor.finish())
+            self.out.close()
+            self.tmp_path.replace(self.filename)
+        except BaseException:
+            self.abort()
+            raise
+        logger.info(f"Book text successfully saved to: {self.filename}")
+
+    def abort(self):
+        self.out.close()
+        self.tmp_path.unlink(missing_ok=True)
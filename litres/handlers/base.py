@@ -37,10 +37,14 @@ class BaseUrlHandler(ABC):
         pass
 
     def save(self, out_format_priority: List[OutFormat]):
-        engine = self._select_engine(out_format_priority)
-        logger.debug(f'Using engine: {engine}')
-        
-        engine.execute(self.book, self.path_handler)
+        if app_settings.export_all_formats:
+            engines = self._combine_engines(self._select_engines(out_format_priority))
+        else:
+            engines = [self._select_engine(out_format_priority)]
+
+        for engine in engines:
+            logger.debug(f'Using engine: {engine}')
+            engine.execute(self.book, self.path_handler)
         logger.info(f'File: {self.path_handler.filename} saved')
 
     def _select_engine(self, out_format_priority: List[OutFormat]):
@@ -50,3 +54,18 @@ class BaseUrlHandler(ABC):
                     logger.debug(f'Found engine for preferred format: {preferred_format}')
                     return engine
         raise BookProcessingError("No available engine found for any of the preferred formats")
+
+    def _select_engines(self, out_format_priority: List[OutFormat]) -> List[Engine]:
+        """Engines for every preferred format, in priority order"""
+        engines = []
+        for preferred_format in out_format_priority:
+            for engine in self.engines:
+                if engine.supports([preferred_format]) and engine not in engines:
+                    engines.append(engine)
+        if not engines:
+            raise BookProcessingError("No available engine found for any of the preferred formats")
+        return engines
+
+    def _combine_engines(self, engines: List[Engine]) -> List[Engine]:
+        """Engines to run for a multi-format export, by default one after another"""
+        return engines
@@ -1,5 +1,5 @@
 from litres.commands.extract_audiobook import ExtractAudiobookCommand
-from litres.config import logger
+from litres.config import app_settings, logger
 from litres.engines.audio_merge import AudioMergeEngine
 from litres.handlers.base import BaseUrlHandler
 from litres.loaders.audio_loader import AudioLoaderCommand
@@ -7,7 +7,12 @@ from litres.models.book import BookRequest
 
 
 class HandlerUrlAudiobook(BaseUrlHandler):
-    engines = [AudioMergeEngine()]
+    engines = [
+        AudioMergeEngine(
+            playlist=app_settings.audio_playlist,
+            frame_accurate=app_settings.audio_frame_merge,
+        )
+    ]
 
     def supports(self, bq: BookRequest) -> bool:
         return '/audiobook/' in bq.url
@@ -15,4 +20,10 @@ class HandlerUrlAudiobook(BaseUrlHandler):
     def load(self, bq: BookRequest):
         self.book = ExtractAudiobookCommand(self._session).get(bq.url)
         logger.info(f"Fetched audiobook meta. Title: {self.book.meta.title}")
-        AudioLoaderCommand(self._session).download_parts(self.book, self.path_handler) 
\ No newline at end of file
+        loader = AudioLoaderCommand(self._session)
+        # Плейлисту и склейке по кадрам нужны отдельные части
+        separate_parts = app_settings.audio_playlist or app_settings.audio_frame_merge
+        if app_settings.audio_direct_download and not separate_parts:
+            if loader.download_merged(self.book, self.path_handler):
+                return
+        loader.download_parts(self.book, self.path_handler) 
\ No newline at end of file
@@ -11,6 +11,14 @@ class HandlerUrlO3(BaseUrlHandler):
         IMG2PDFEngine(
             quality=app_settings.quality, 
             dpi=app_settings.dpi,
+            bitonal=app_settings.bitonal,
+            native_writer=app_settings.native_pdf_writer,
+            dedupe=app_settings.dedupe_pages,
+            trim_margins=app_settings.trim_margins,
+            skip_blank=app_settings.skip_blank_pages,
+            parallel=app_settings.parallel_pdf,
+            volume_pages=app_settings.volume_pages,
+            incremental=app_settings.incremental_output,
         )
     ]
 
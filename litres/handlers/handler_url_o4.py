@@ -1,6 +1,10 @@
+from typing import List
+
 from litres.commands.extract_o4_book import ExtractO4BookCommand
-from litres.config import logger
+from litres.config import app_settings, logger
+from litres.engines.base import Engine
 from litres.engines.o4.fb2_engine import FB2Engine
+from litres.engines.o4.multi_engine import MultiFormatEngine
 from litres.engines.o4.pdf_engine import PDFEngine
 from litres.engines.o4.txt_engine import TXTEngine
 from litres.handlers.base import BaseUrlHandler
@@ -10,9 +14,23 @@ from litres.models.book import BookRequest
 
 class HandlerUrlO4(BaseUrlHandler):
     engines = [
-        PDFEngine(),
-        FB2Engine(),
-        TXTEngine(),
+        PDFEngine(
+            quality=app_settings.quality,
+            dpi=app_settings.pdf_image_dpi,
+            incremental=app_settings.incremental_output,
+            font_cache_dir=app_settings.font_cache_dir,
+            parallel=app_settings.parallel_pdf,
+            parallel_parse=app_settings.parallel_parse,
+        ),
+        FB2Engine(
+            quality=app_settings.quality,
+            max_image_pixels=app_settings.fb2_max_image_pixels,
+            incremental=app_settings.incremental_output,
+            parallel_parse=app_settings.parallel_parse,
+            zip_output=app_settings.fb2_zip,
+            zip_level=app_settings.fb2_zip_level,
+        ),
+        TXTEngine(parallel_parse=app_settings.parallel_parse),
     ]
 
     def supports(self, bq: BookRequest) -> bool:
@@ -21,6 +39,12 @@ class HandlerUrlO4(BaseUrlHandler):
             'baseurl=' in bq.url
         )
 
+    def _combine_engines(self, engines: List[Engine]) -> List[Engine]:
+        """All formats are built from a single parse of the parts"""
+        if len(engines) < 2:
+            return engines
+        return [MultiFormatEngine(engines, parallel_parse=app_settings.parallel_parse)]
+
     def load(self, bq: BookRequest):
         self.book = ExtractO4BookCommand(self._session).get(bq)
         logger.info(f"Fetched book meta. Title:{self.book.meta.title}")
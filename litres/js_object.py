@@ -0,0 +1,158 @@
+"""Разбор JS-объектов LitRes (toc.js и части o4).
+
+Это почти JSON: ключи без кавычек, строки в одинарных кавычках, запятые
+перед закрывающей скобкой и литералы Python (True/False/None). Строгий
+JSON целиком разбирает `json.loads`, остальное — один проход по тексту
+без переписывания регулярками, строки и массивы из одного JSON внутри
+него разбирает C-сканер модуля json.
+"""
+import json
+import re
+from json.decoder import JSONDecodeError, scanstring
+from typing import Any, Dict, List, Tuple
+
+WHITESPACE = re.compile(r'(?:\s+|//[^\n]*|/\*.*?\*/)*', re.DOTALL)
+# Ключ объекта вместе с двоеточием и пробелами до значения
+KEY = re.compile(r'(?:([A-Za-z_$][\w$]*)|"([^"\\]*)"|(\d+))\s*:\s*')
+NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+IDENTIFIER = re.compile(r'[A-Za-z_$][\w$]*')
+SINGLE_QUOTED = re.compile(r"'((?:[^'\\]|\\.)*)'", re.DOTALL)
+SINGLE_QUOTED_ESCAPE = re.compile(r'\\(.)|"', re.DOTALL)
+SPACE_CHARS = ' \t\n\r/'
+# Версия разбора: увеличивается при любом изменении дерева, которое выдаёт
+# loads, тогда записи кеша разобранных частей собираются заново
+PARSER_VERSION = 1
+
+LITERALS: Dict[str, Any] = {
+    'true': True, 'false': False, 'null': None, 'undefined': None,
+    'True': True, 'False': False, 'None': None,
+    'NaN': float('nan'), 'Infinity': float('inf'),
+}
+
+_raw_decode = json.JSONDecoder().raw_decode
+
+
+def loads(text: str) -> Any:
+    """Parse a LitRes JS object, raising JSONDecodeError on malformed input"""
+    try:
+        return json.loads(text)
+    except JSONDecodeError:
+        pass
+    end = _skip(text, 0)
+    value, end = _value(text, end)
+    end = _skip(text, end)
+    if end != len(text):
+        raise JSONDecodeError("Extra data", text, end)
+    return value
+
+
+def _skip(text: str, pos: int) -> int:
+    return WHITESPACE.match(text, pos).end()
+
+
+def _value(text: str, pos: int) -> Tuple[Any, int]:
+    char = text[pos:pos + 1]
+    if char == '"':
+        return scanstring(text, pos + 1)
+    if char == '{':
+        return _object(text, pos)
+    if char == '[':
+        return _array(text, pos)
+    if char == "'":
+        return _single_quoted(text, pos)
+    match = NUMBER.match(text, pos)
+    if match:
+        number = match.group()
+        if number.isdigit():
+            return int(number), match.end()
+        try:
+            return json.loads(number.lstrip('+')), match.end()
+        except JSONDecodeError:
+            return float(number), match.end()
+    match = IDENTIFIER.match(text, pos)
+    if match and match.group() in LITERALS:
+        return LITERALS[match.group()], match.end()
+    raise JSONDecodeError("Expecting value", text, pos)
+
+
+def _object(text: str, pos: int) -> Tuple[Dict[str, Any], int]:
+    result: Dict[str, Any] = {}
+    pos += 1
+    if text[pos:pos + 1] in SPACE_CHARS:
+        pos = _skip(text, pos)
+    while text[pos:pos + 1] != '}':
+        match = KEY.match(text, pos)
+        if match:
+            key = match.group(1) or match.group(2) or match.group(3) or ''
+            pos = match.end()
+        else:
+            key, pos = _quoted_key(text, pos)
+        result[key], pos = _value(text, pos)
+        pos = _separator(text, pos, '}')
+    return result, pos + 1
+
+
+def _quoted_key(text: str, pos: int) -> Tuple[str, int]:
+    """Key with escapes or in single quotes, the rare case KEY doesn't match"""
+    char = text[pos:pos + 1]
+    if char == '"':
+        key, pos = scanstring(text, pos + 1)
+    elif char == "'":
+        key, pos = _single_quoted(text, pos)
+    else:
+        raise JSONDecodeError("Expecting property name", text, pos)
+    pos = _skip(text, pos)
+    if text[pos:pos + 1] != ':':
+        raise JSONDecodeError("Expecting ':' delimiter", text, pos)
+    return key, _skip(text, pos + 1)
+
+
+def _array(text: str, pos: int) -> Tuple[List[Any], int]:
+    # Массивы без объектов внутри (xp, текст абзацев) обычно строгий JSON
+    try:
+        return _raw_decode(text, pos)
+    except JSONDecodeError:
+        pass
+    result: List[Any] = []
+    pos += 1
+    if text[pos:pos + 1] in SPACE_CHARS:
+        pos = _skip(text, pos)
+    while text[pos:pos + 1] != ']':
+        value, pos = _value(text, pos)
+        result.append(value)
+        pos = _separator(text, pos, ']')
+    return result, pos + 1
+
+
+def _separator(text: str, pos: int, closing: str) -> int:
+    """Skip a comma between items, a trailing comma is allowed"""
+    char = text[pos:pos + 1]
+    if char and char in SPACE_CHARS:
+        pos = _skip(text, pos)
+        char = text[pos:pos + 1]
+    if char == ',':
+        pos += 1
+        if text[pos:pos + 1] in SPACE_CHARS:
+            pos = _skip(text, pos)
+        return pos
+    if char != closing:
+        raise JSONDecodeError(f"Expecting ',' or '{closing}' delimiter", text, pos)
+    return pos
+
+
+def _single_quoted(text: str, pos: int) -> Tuple[str, int]:
+    match = SINGLE_QUOTED.match(text, pos)
+    if not match:
+        raise JSONDecodeError("Unterminated string", text, pos)
+    body = SINGLE_QUOTED_ESCAPE.sub(_requote, match.group(1))
+    return scanstring(f'{body}"', 0)[0], match.end()
+
+
+def _requote(match: 're.Match[str]') -> str:
+    """Escapes of a single quoted string as they must be in a double quoted one"""
+    escaped = match.group(1)
+    if escaped is None:
+        return '\\"'
+    if escaped == "'":
+        return "'"
+    return match.group()
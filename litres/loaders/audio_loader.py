@@ -1,20 +1,34 @@
+import errno
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import List, Optional
+
+from tqdm import tqdm
 
 from litres.config import logger
-from litres.loaders.base_loader import BaseLoaderCommand
+from litres.exceptions import BookProcessingError
+from litres.loaders.base_loader import MAX_WORKERS, BaseLoaderCommand
 from litres.models.book import AudioBook
+from litres.models.download_state import DownloadState
+from litres.models.output_path_handler import OutputPathHandler
+from litres.utils import timing
 
 URL_TEMPLATE ="https://www.litres.ru/download_book_subscr/{art_id}/{file_id}/{filename}"
+CHUNK_SIZE = 1024 * 1024
 
 
 class AudioLoaderCommand(BaseLoaderCommand[AudioBook]):
-    def _download_part(self, part_num: int, book: AudioBook, source_dir: Path) -> bool:
+    def _part_url(self, part_num: int, book: AudioBook) -> str:
         part = book.parts[part_num]
-        url = URL_TEMPLATE.format(
+        return URL_TEMPLATE.format(
             art_id=book.art_id,
             file_id=part["file_id"],
             filename=part["filename"],
         )
+
+    def _download_part(self, part_num: int, book: AudioBook, source_dir: Path) -> bool:
+        url = self._part_url(part_num, book)
         filepath = source_dir / f"{part_num}.mp3"
 
         try:
@@ -25,4 +39,120 @@ class AudioLoaderCommand(BaseLoaderCommand[AudioBook]):
             return True
         except Exception as e:
             logger.error(f"Failed to download {part_num}: {e}")
-            return False 
\ No newline at end of file
+            return False
+
+    @timing
+    def download_merged(self, book: AudioBook, path: OutputPathHandler) -> bool:
+        """Download all parts straight into the merged output file.
+
+        Part sizes are taken from HEAD requests, the file is preallocated
+        and every worker writes its part at its own offset, so the parts are
+        never stored and copied separately. Written ranges are recorded in a
+        sidecar for resuming. Returns False, leaving the separate download
+        to the caller, when the sizes are unknown or parts were already
+        downloaded separately.
+        """
+        output_file = path.output / (path.filename + '.mp3')
+        tmp_file = output_file.with_name(output_file.name + '.part')
+        state = DownloadState(tmp_file.with_name(tmp_file.name + '.json'))
+        if output_file.is_file() and not tmp_file.exists():
+            logger.info("Audiobook is already downloaded.")
+            return True
+        if self.look_for_loaded_content(path.source):
+            return False
+
+        urls = [self._part_url(part_num, book) for part_num in range(book.total_parts)]
+        if not state.sizes or not tmp_file.is_file():
+            sizes = self._part_sizes(urls)
+            if sizes is None:
+                logger.warning("Part sizes are unknown, downloading parts separately")
+                return False
+            state.reset(sizes)
+        elif len(state.sizes) != len(urls):
+            raise BookProcessingError(f"Download state {state.path} does not match the book, remove it to start over")
+
+        offsets = state.offsets()
+        parts_to_download = [n for n in range(len(urls)) if n not in state.done]
+        failed: List[int] = []
+
+        fd = os.open(tmp_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _preallocate(fd, state.total_size)
+            with tqdm(
+                total=len(parts_to_download),
+                unit='part',
+                desc="Downloading",
+                ncols=100,
+                colour='green'
+            ) as pbar, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+
+                futures = {
+                    executor.submit(self._download_range, urls[n], fd, offsets[n], state.sizes[n], tmp_file): n
+                    for n in parts_to_download
+                }
+
+                for future in as_completed(futures):
+                    part_num = futures[future]
+                    try:
+                        future.result()
+                        state.mark_done(part_num)
+                    except Exception as e:
+                        failed.append(part_num)
+                        logger.error(f"Failed to download {part_num}: {e}")
+                    finally:
+                        pbar.update(1)
+        finally:
+            os.close(fd)
+
+        if failed:
+            raise BookProcessingError(f"Missing or corrupted parts after download: {sorted(failed)}")
+
+        tmp_file.replace(output_file)
+        state.remove()
+        logger.info(f"Audiobook successfully saved to: {output_file}")
+        return True
+
+    def _part_sizes(self, urls: List[str]) -> Optional[List[int]]:
+        """Content-Length of every part, None if any is unknown"""
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            sizes = list(executor.map(self._content_length, urls))
+        if any(size is None for size in sizes):
+            return None
+        return sizes
+
+    def _content_length(self, url: str) -> Optional[int]:
+        try:
+            response = self._session.head(url, allow_redirects=True, timeout=30)
+            response.raise_for_status()
+            return int(response.headers['Content-Length'])
+        except Exception as e:
+            logger.debug(f"No size for {url}: {e}")
+            return None
+
+    def _download_range(self, url: str, fd: int, offset: int, size: int, filepath: Path):
+        """Stream one part into its range of the output with positional writes"""
+        response = self._fetch_with_retry(url, filepath)
+        written = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if written + len(chunk) > size:
+                raise BookProcessingError(f"Part is larger than {size} bytes: {url}")
+            view = memoryview(chunk)
+            while view:
+                n = os.pwrite(fd, view, offset + written)
+                written += n
+                view = view[n:]
+        if written != size:
+            raise BookProcessingError(f"Got {written} of {size} bytes: {url}")
+
+
+def _preallocate(fd: int, size: int):
+    """Reserve the space of the whole file up front: no fragmentation and
+    no running out of disk halfway"""
+    if os.fstat(fd).st_size >= size:
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError) as e:
+        if isinstance(e, OSError) and e.errno not in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+            raise
+        os.ftruncate(fd, size)
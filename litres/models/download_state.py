@@ -0,0 +1,69 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from litres.config import logger
+
+
+class DownloadState:
+    """Sidecar file of a download written straight into one preallocated file.
+
+    Records the byte size of every part (and so the offsets of their
+    ranges) and which parts are completely written. An interrupted download
+    resumes with the missing ranges as long as the sizes are unchanged.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data: Dict[str, Any] = self._load()
+
+    @property
+    def sizes(self) -> List[int]:
+        return self.data.get('sizes', [])
+
+    @property
+    def done(self) -> Set[int]:
+        return set(self.data.get('done', []))
+
+    def offsets(self) -> List[int]:
+        """Start of every part's range in the file"""
+        offsets, position = [], 0
+        for size in self.sizes:
+            offsets.append(position)
+            position += size
+        return offsets
+
+    @property
+    def total_size(self) -> int:
+        return sum(self.sizes)
+
+    def reset(self, sizes: List[int]):
+        """Start over with new part sizes, nothing written yet"""
+        self.data = {'sizes': sizes, 'done': []}
+        self._save()
+
+    def mark_done(self, part_num: int):
+        """Record a completely written part"""
+        self.data['done'] = sorted(self.done | {part_num})
+        self._save()
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+        self.data = {}
+
+    def _save(self):
+        try:
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            tmp_path.write_text(json.dumps(self.data), encoding='utf-8')
+            tmp_path.replace(self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save download state {self.path}: {e}")
+
+    def _load(self) -> Dict[str, Any]:
+        if not self.path.is_file():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring broken download state {self.path}: {e}")
+            return {}
@@ -0,0 +1,87 @@
+import marshal
+import mmap
+import struct
+import sys
+from pathlib import Path
+from typing import Any, List, Optional
+
+from litres.config import logger
+from litres.js_object import PARSER_VERSION
+
+# Сигнатура, версии marshal и парсера, размер и время изменения исходной части
+HEADER = struct.Struct('<4sBHQQ')
+MAGIC = b'LPC2'
+
+
+class ParsedPartsCache:
+    """Parsed o4 parts stored next to the sources in marshal format.
+
+    A cached part is valid while the size and modification time of its
+    source and the parser version match the header, so re-running an
+    engine or converting the book to another format skips parsing. Cache files are memory-mapped and
+    unmarshalled in place.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+
+    def _cache_file(self, part: Path) -> Path:
+        return self.cache_dir / f'{part.stem}.marshal'
+
+    def _header(self, part: Path) -> bytes:
+        stat = part.stat()
+        return HEADER.pack(MAGIC, marshal.version, PARSER_VERSION, stat.st_size, stat.st_mtime_ns)
+
+    def is_current(self, part: Path) -> bool:
+        """Check the cache entry header without loading the nodes"""
+        try:
+            with open(self._cache_file(part), 'rb') as f:
+                return f.read(HEADER.size) == self._header(part)
+        except OSError:
+            return False
+
+    def load(self, part: Path) -> Optional[List[Any]]:
+        """Cached nodes of a part, None if there is no valid cache entry"""
+        cache_file = self._cache_file(part)
+        try:
+            header = self._header(part)
+            with open(cache_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm[:HEADER.size] != header:
+                    return None
+                with memoryview(mm) as view, view[HEADER.size:] as payload:
+                    return marshal.loads(payload)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, TypeError) as e:
+            logger.warning(f"Ignoring broken parsed cache {cache_file}: {e}")
+            return None
+
+    def save(self, part: Path, nodes: List[Any]) -> bool:
+        """Store parsed nodes of a part, False if they could not be saved"""
+        cache_file = self._cache_file(part)
+        try:
+            _intern_tags(nodes)
+            header = self._header(part)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix('.tmp')
+            tmp_file.write_bytes(header + marshal.dumps(nodes))
+            tmp_file.replace(cache_file)
+            return True
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to save parsed cache {cache_file}: {e}")
+            return False
+
+
+def _intern_tags(nodes: List[Any]):
+    """Intern node types: marshal then stores each tag once per part and
+    loaded nodes share the tag strings"""
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            tag = node.get('t')
+            if isinstance(tag, str):
+                node['t'] = sys.intern(tag)
+            content = node.get('c')
+            if isinstance(content, list):
+                stack.extend(content)
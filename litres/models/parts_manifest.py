@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from litres.config import logger
+
+
+def fingerprint(file: Path) -> List[int]:
+    """Size and modification time of a file"""
+    stat = file.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class PartsManifest:
+    """Sidecar file recording which source parts an output already includes.
+
+    Besides the parts it keeps the output fingerprint and the engine options
+    the output was built with, so an output changed outside of the
+    application or built with other settings is never reused.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data: Dict[str, Any] = self._load()
+
+    @property
+    def parts(self) -> Dict[str, List[int]]:
+        return self.data.get('parts', {})
+
+    def matches(self, output: Path, options: Optional[Dict[str, Any]] = None) -> bool:
+        """Check that the output is the one recorded and was built with the same options"""
+        if not self.data or not output.is_file():
+            return False
+        return (
+            self.data.get('output') == fingerprint(output)
+            and self.data.get('options') == (options or {})
+        )
+
+    def diff(self, files: Iterable[Path]) -> Tuple[List[Path], List[Path], List[str]]:
+        """Split source parts into new and changed ones, and list removed part names"""
+        new, changed = [], []
+        names = set()
+        for file in files:
+            names.add(file.name)
+            recorded = self.parts.get(file.name)
+            if recorded is None:
+                new.append(file)
+            elif recorded != fingerprint(file):
+                changed.append(file)
+        removed = sorted(set(self.parts) - names)
+        return new, changed, removed
+
+    def is_current(self, output: Path, files: Iterable[Path], options: Optional[Dict[str, Any]] = None) -> bool:
+        """Check whether the output already includes exactly these parts"""
+        if not self.matches(output, options):
+            return False
+        new, changed, removed = self.diff(files)
+        return not (new or changed or removed)
+
+    def record(self, output: Path, files: Iterable[Path], options: Optional[Dict[str, Any]] = None, **extra):
+        """Save the state of a freshly written output"""
+        self.data = {
+            'output': fingerprint(output),
+            'options': options or {},
+            'parts': {file.name: fingerprint(file) for file in files},
+            **extra,
+        }
+        try:
+            self.path.write_text(json.dumps(self.data), encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"Failed to save parts manifest {self.path}: {e}")
+
+    def _load(self) -> Dict[str, Any]:
+        if not self.path.is_file():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring broken parts manifest {self.path}: {e}")
+            return {}
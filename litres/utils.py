@@ -1,15 +1,20 @@
 import json
+import multiprocessing
 import re
 import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from functools import wraps
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from litres import js_object
 from litres.config import logger
+from litres.constants import PARSED_CACHE_FOLDER
+from litres.models.parsed_parts import ParsedPartsCache
 
-# Глобальные скомпилированные регулярки для парсинга JS-like JSON
-key_re = re.compile(r'([{,]\s*)(\w+)(\s*:)')
-comma_re = re.compile(r',\s*([}\]])')
+# Модули обработчиков: сервер forkserver импортирует их один раз для всех
+FORKSERVER_PRELOAD = ['litres.utils', 'litres.engines.o4.parallel_layout']
 
 def timing(func):
     @wraps(func)
@@ -51,34 +56,91 @@ def extract_initial_state(html: str):
 
     return state_json
 
-def load_and_parse_content(source_dir: Path) -> List[dict]:
-    """Загрузка и парсинг контента из текстовых файлов"""
-    content = []
-    for file in sorted(source_dir.glob("*.txt")):
-        try:
-            file_content = file.read_text(encoding='utf-8').strip()
-            if not file_content:
-                continue
-            
+def _part_key(file: Path) -> Tuple[int, int, str]:
+    """Части называются по номеру: 2.txt идёт раньше 10.txt"""
+    if file.stem.isdigit():
+        return 0, int(file.stem), file.name
+    return 1, 0, file.name
+
+def list_parts(source_dir: Path, pattern: str = "*.txt") -> List[Path]:
+    """Файлы частей книги в порядке их номеров"""
+    return sorted(source_dir.glob(pattern), key=_part_key)
+
+def parse_part(file: Path) -> List[dict]:
+    """Парсинг одной части, пустой список для пустого файла"""
+    file_content = file.read_text(encoding='utf-8').strip()
+    if not file_content:
+        return []
+
+    return js_object.loads(file_content) or []
+
+def _parse_to_cache(file: Path, cache_dir: Path) -> Optional[List[dict]]:
+    """Разбор части в процессе-обработчике. Дерево остаётся в кеше на
+    диске, обратно передаётся только если его не удалось сохранить"""
+    parsed = parse_part(file)
+    if ParsedPartsCache(cache_dir).save(file, parsed):
+        return None
+    return parsed
+
+def process_pool(max_workers: Optional[int] = None, **kwargs) -> ProcessPoolExecutor:
+    """Пул процессов, запущенных без fork: к этому моменту в процессе уже
+    работают потоки (кодирование картинок), и fork многопоточного процесса
+    может оставить в обработчике захваченные блокировки"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    else:
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context, **kwargs)
+
+def iter_parts(source_dir: Path, parallel: bool = False, max_workers: Optional[int] = None) -> Iterator[List[dict]]:
+    """Блоки книги по частям: следующая часть читается, только когда
+    предыдущая обработана, так что в памяти держится одна часть.
+    Разобранные части кешируются в PARSED_CACHE_FOLDER.
+
+    С `parallel` части без кеша разбираются в пуле процессов, которые
+    пишут результат в кеш, а отдаются части по-прежнему по порядку."""
+    cache = ParsedPartsCache(source_dir / PARSED_CACHE_FOLDER)
+    files = list_parts(source_dir)
+    pending: Dict[Path, Future] = {}
+    executor = None
+    if parallel:
+        stale = [file for file in files if not cache.is_current(file)]
+        if len(stale) > 1:
+            executor = process_pool(max_workers)
+            pending = {file: executor.submit(_parse_to_cache, file, cache.cache_dir) for file in stale}
+
+    try:
+        for file in files:
             try:
-                parsed = json.loads(file_content)
-            except json.JSONDecodeError:
-                fixed = JSONFixer.fix_json_string(file_content)
-                parsed = json.loads(fixed)
-            
+                parsed = None
+                future = pending.pop(file, None)
+                if future:
+                    try:
+                        parsed = future.result()
+                    except BrokenProcessPool as e:
+                        # Пул погиб: часть разбирается здесь же. Ошибка разбора
+                        # самой части не повторяется, а сразу уходит ниже
+                        logger.debug(f"Parse worker died on {file}: {e}")
+                if parsed is None:
+                    parsed = cache.load(file)
+                if parsed is None:
+                    parsed = parse_part(file)
+                    cache.save(file, parsed)
+            except Exception as e:
+                logger.error(f"Failed to process file {file}: {str(e)}")
+                continue
             if parsed:
-                content.extend(parsed)
-        except Exception as e:
-            logger.error(f"Failed to process file {file}: {str(e)}")
-    return content
+                yield parsed
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
 
+def iter_content(source_dir: Path, parallel: bool = False) -> Iterator[dict]:
+    """Блоки всех частей книги подряд, в порядке частей"""
+    for part in iter_parts(source_dir, parallel):
+        yield from part
 
-class JSONFixer:
-    """Helper class for fixing common JSON issues."""
-    
-    @staticmethod
-    def fix_json_string(json_str: str) -> str:
-        """Attempt to fix common JSON issues in the input string."""
-        fixed = re.sub(r"(?<!\\)'", '"', json_str)
-        fixed = re.sub(r'([{,]\s*)([a-zA-Z_][a-zA-Z0-9_]*)\s*:', r'\1"\2":', fixed)
-        return fixed.replace('True', 'true').replace('False', 'false').replace('None', 'null')
+def load_and_parse_content(source_dir: Path, parallel: bool = False) -> List[dict]:
+    """Загрузка и парсинг контента из текстовых файлов"""
+    return list(iter_content(source_dir, parallel))
@@ -1,3 +1,4 @@
+import multiprocessing
 import sys
 from enum import IntEnum
 
@@ -61,4 +62,6 @@ def main() -> None:
     sys.exit(run_app())
 
 if __name__ == "__main__":
+    # Обработчики пулов запускаются без fork, собранному exe это нужно
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
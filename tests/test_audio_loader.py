@@ -0,0 +1,68 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from litres.exceptions import BookProcessingError
+from litres.loaders.audio_loader import AudioLoaderCommand
+from litres.models.book import AudioBook, BookMeta
+from litres.models.download_state import DownloadState
+from litres.models.output_path_handler import OutputPathHandler
+
+PARTS = [bytes([n]) * (3000 + n) for n in range(5)]
+
+
+class FakeLoader(AudioLoaderCommand):
+    def __init__(self, broken=()):
+        super().__init__(MagicMock())
+        self._session.head.side_effect = self._head
+        self.broken = set(broken)
+        self.fetched = []
+
+    def _part(self, url):
+        return int(url.rsplit('/', 1)[1].split('.')[0])
+
+    def _head(self, url, **kwargs):
+        return MagicMock(headers={'Content-Length': str(len(PARTS[self._part(url)]))})
+
+    def fetch(self, url, delay=0):
+        num = self._part(url)
+        self.fetched.append(num)
+        data = PARTS[num][:100] if num in self.broken else PARTS[num]
+        return MagicMock(iter_content=lambda size: [data[i:i + 1000] for i in range(0, len(data), 1000)])
+
+
+def _setup(tmp_path):
+    parts = [{"file_id": n, "filename": f"{n}.mp3"} for n in range(len(PARTS))]
+    book = AudioBook(meta=BookMeta(authors=[], title="T", version=1.0, uuid="audiobook"), parts=parts, art_id="1")
+    return book, OutputPathHandler("book", tmp_path / "src", tmp_path / "out")
+
+
+def test_parts_written_into_merged_file(tmp_path):
+    book, path = _setup(tmp_path)
+    assert FakeLoader().download_merged(book, path)
+    assert [p.name for p in path.output.iterdir()] == ["book.mp3"]
+    assert (path.output / "book.mp3").read_bytes() == b"".join(PARTS)
+    assert list(path.source.iterdir()) == []
+
+
+def test_interrupted_download_resumes_missing_ranges(tmp_path):
+    book, path = _setup(tmp_path)
+    with pytest.raises(BookProcessingError):
+        FakeLoader(broken={1, 3}).download_merged(book, path)
+    state = DownloadState(path.output / "book.mp3.part.json")
+    assert state.done == {0, 2, 4}
+
+    loader = FakeLoader()
+    assert loader.download_merged(book, path)
+    assert sorted(loader.fetched) == [1, 3]
+    assert [p.name for p in path.output.iterdir()] == ["book.mp3"]
+    assert (path.output / "book.mp3").read_bytes() == b"".join(PARTS)
+
+
+def test_unknown_sizes_fall_back_to_parts(tmp_path):
+    book, path = _setup(tmp_path)
+    loader = FakeLoader()
+    loader._session.head.side_effect = None
+    loader._session.head.return_value = MagicMock(headers={})
+    assert not loader.download_merged(book, path)
+    assert loader.fetched == []
@@ -0,0 +1,76 @@
+import errno
+import os
+
+from litres.engines import audio_merge
+from litres.engines.audio_merge import AudioMergeEngine
+from litres.models.book import AudioBook, BookMeta
+from litres.models.output_path_handler import OutputPathHandler
+
+
+def _setup(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    for num in (0, 1, 2, 10):
+        (source / f"{num}.mp3").write_bytes(bytes([num]) * (1000 + num))
+    book = AudioBook(meta=BookMeta(authors=[], title="Книга", version=1.0, uuid="audiobook"),
+                     parts=[], art_id="1")
+    return book, source, OutputPathHandler("book", source, tmp_path / "out")
+
+
+def _expected(source):
+    return b"".join((source / f"{num}.mp3").read_bytes() for num in (0, 1, 2, 10))
+
+
+def test_parts_merged_in_numeric_order(tmp_path):
+    book, source, path = _setup(tmp_path)
+    AudioMergeEngine().execute(book, path)
+    assert [p.name for p in path.output.iterdir()] == ["book.mp3"]
+    assert (path.output / "book.mp3").read_bytes() == _expected(source)
+
+
+def test_falls_back_to_buffered_copy(tmp_path, monkeypatch):
+    book, source, path = _setup(tmp_path)
+
+    def unsupported(*args):
+        raise OSError(errno.EXDEV, "cross-device")
+
+    monkeypatch.setattr(os, "copy_file_range", unsupported)
+    monkeypatch.setattr(os, "sendfile", unsupported)
+    monkeypatch.setattr(audio_merge, "COPY_BUFFER", 100)
+    AudioMergeEngine().execute(book, path)
+    assert (path.output / "book.mp3").read_bytes() == _expected(source)
+
+
+def test_zero_length_copies_fall_back(tmp_path, monkeypatch):
+    book, source, path = _setup(tmp_path)
+    # Часть ФС отвечает "скопировано 0 байт" вместо ошибки
+    monkeypatch.setattr(os, "copy_file_range", lambda *args: 0)
+    monkeypatch.setattr(os, "sendfile", lambda *args: 0)
+    monkeypatch.setattr(audio_merge, "COPY_BUFFER", 100)
+    AudioMergeEngine().execute(book, path)
+    assert (path.output / "book.mp3").read_bytes() == _expected(source)
+
+
+def test_short_copy_continues_with_next_method(tmp_path, monkeypatch):
+    book, source, path = _setup(tmp_path)
+    copy_file_range = os.copy_file_range
+
+    def stops_early(src, dst, count):
+        # Первые 300 байт части, потом "конец файла"
+        if os.lseek(src, 0, os.SEEK_CUR) >= 300:
+            return 0
+        return copy_file_range(src, dst, min(count, 300))
+
+    monkeypatch.setattr(os, "copy_file_range", stops_early)
+    AudioMergeEngine().execute(book, path)
+    assert (path.output / "book.mp3").read_bytes() == _expected(source)
+
+
+def test_playlist_instead_of_merge(tmp_path):
+    book, source, path = _setup(tmp_path)
+    AudioMergeEngine(playlist=True).execute(book, path)
+    assert [p.name for p in path.output.iterdir()] == ["book.m3u8"]
+    lines = (path.output / "book.m3u8").read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "#EXTM3U"
+    assert lines[1] == "#EXTINF:-1,Книга - 1"
+    assert lines[2::2] == [f"../src/{num}.mp3" for num in (0, 1, 2, 10)]
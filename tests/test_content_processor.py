@@ -0,0 +1,24 @@
+from litres.engines.o4.processors.content_processor import ContentNode
+from litres.engines.o4.processors.fb2_processor import FB2ContentProcessor
+from litres.engines.o4.processors.pdf_processor import (Block, BlockType,
+                                                        PDFContentProcessor)
+
+
+def _chain(depth):
+    node = {"t": "p", "c": ["дно­"]}
+    for _ in range(depth):
+        node = {"t": "div", "c": [node, " "]}
+    return [node]
+
+
+def test_deep_nesting_does_not_recurse(tmp_path):
+    document = _chain(5000)
+    body = FB2ContentProcessor(tmp_path).process_structure(document)
+    assert body.startswith("<section>" * 5000 + "<p>дно</p> ")
+    assert list(PDFContentProcessor(tmp_path).iter_blocks(document)) == [Block(BlockType.PARAGRAPH, "дно")]
+
+
+def test_content_node_is_a_view_over_the_dict():
+    node = ContentNode({"t": "p", "xp": [1], "c": ["a­", "b"]})
+    assert (node.type, node.xpath, node.get_text()) == ("p", [1], "ab")
+    assert not hasattr(node, "__dict__")
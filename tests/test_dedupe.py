@@ -0,0 +1,35 @@
+from PIL import Image, ImageDraw
+
+from litres.engines.o3.dedupe import PageDeduplicator, make_thumbnail
+from litres.engines.o3.pdf_writer import EncodedImage
+
+
+def _page(data: bytes, img: Image.Image) -> EncodedImage:
+    return EncodedImage(data=data, width=img.width, height=img.height, thumbnail=make_thumbnail(img))
+
+
+def test_exact_duplicate_found():
+    img = Image.new('L', (600, 800), 255)
+    dedup = PageDeduplicator()
+    dedup.add(_page(b'same', img), 7)
+    assert dedup.find(_page(b'same', img)) == 7
+    assert dedup.duplicates == 1
+
+
+def test_near_duplicate_found():
+    blank = Image.new('L', (600, 800), 250)
+    noisy = blank.copy()
+    noisy.putpixel((10, 10), 200)
+    dedup = PageDeduplicator()
+    dedup.add(_page(b'a', blank), 1)
+    assert dedup.find(_page(b'b', noisy)) == 1
+
+
+def test_different_page_numbers_kept_apart():
+    first = Image.new('L', (600, 800), 255)
+    second = first.copy()
+    ImageDraw.Draw(first).text((280, 740), "12", fill=0, font_size=30)
+    ImageDraw.Draw(second).text((280, 740), "13", fill=0, font_size=30)
+    dedup = PageDeduplicator()
+    dedup.add(_page(b'a', first), 1)
+    assert dedup.find(_page(b'b', second)) is None
@@ -0,0 +1,87 @@
+import base64
+import io
+import xml.etree.ElementTree as ET
+import zipfile
+
+from PIL import Image
+
+from litres.engines.o4 import fb2_engine
+from litres.engines.o4.fb2_engine import FB2Engine
+from litres.engines.o4.processors import fb2_processor
+from litres.models.book import Author, BookMeta, TextBook
+from litres.models.output_path_handler import OutputPathHandler
+
+NS = {"fb": "http://www.gribuser.ru/xml/fictionbook/2.0"}
+
+
+def test_fb2_is_streamed_to_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(fb2_processor, "BASE64_CHUNK", 3 * 5)
+    source = tmp_path / "src"
+    (source / "images").mkdir(parents=True)
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), "red").save(buffer, format="PNG")
+    (source / "images" / "i_1.png").write_bytes(buffer.getvalue())
+    (source / "0.txt").write_text("[{t: 'p', c: ['Текст']}, {t: 'img', s: 'i_1.png'},]", encoding="utf-8")
+    book = TextBook(meta=BookMeta(authors=[Author(first="A & B")], title="Книга <1>", version=1.0, uuid="u"),
+                    parts=[], base_url="/")
+    path = OutputPathHandler("book", source, tmp_path / "out")
+
+    FB2Engine().execute(book, path)
+
+    assert [p.name for p in path.output.iterdir()] == ["book.fb2"]
+    root = ET.parse(path.output / "book.fb2").getroot()
+    assert root.find(".//fb:book-title", NS).text == "Книга <1>"
+    assert root.find(".//fb:first-name", NS).text == "A & B"
+    binary = root.find("fb:binary", NS)
+    assert binary.get("content-type") == "image/png"
+    assert base64.b64decode(binary.text) == buffer.getvalue()
+
+
+def test_failed_fb2_leaves_no_partial_file(tmp_path, monkeypatch):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "0.txt").write_text("[{t: 'p', c: ['x']}]", encoding="utf-8")
+    book = TextBook(meta=BookMeta(authors=[], title="T", version=1.0, uuid="u"), parts=[], base_url="/")
+    path = OutputPathHandler("book", source, tmp_path / "out")
+
+    def broken(self, images, out):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(fb2_engine.FB2ContentProcessor, "write_binaries", broken)
+    FB2Engine().execute(book, path)
+    assert list(path.output.iterdir()) == []
+
+
+def test_fb2_zip_holds_the_same_document(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "0.txt").write_text("[{t: 'p', c: ['Текст']}]", encoding="utf-8")
+    book = TextBook(meta=BookMeta(authors=[], title="T", version=1.0, uuid="u"), parts=[], base_url="/")
+    plain = OutputPathHandler("book", source, tmp_path / "plain")
+    zipped = OutputPathHandler("book", source, tmp_path / "zipped")
+
+    FB2Engine().execute(book, plain)
+    FB2Engine(zip_output=True, zip_level=9).execute(book, zipped)
+
+    assert [p.name for p in zipped.output.iterdir()] == ["book.fb2.zip"]
+    with zipfile.ZipFile(zipped.output / "book.fb2.zip") as archive:
+        assert archive.namelist() == ["book.fb2"]
+        assert archive.getinfo("book.fb2").compress_type == zipfile.ZIP_DEFLATED
+        assert archive.read("book.fb2") == (plain.output / "book.fb2").read_bytes()
+
+
+def test_fb2_zip_uses_the_zip_level(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    words = ["слово", "текст", "книга", "глава", "абзац"]
+    paragraphs = (" ".join(words[(i * 7 + j) % 5] for j in range(i % 13 + 5)) for i in range(2000))
+    (source / "0.txt").write_text("[" + ",".join(f"{{t: 'p', c: ['{p}']}}" for p in paragraphs) + "]", encoding="utf-8")
+    book = TextBook(meta=BookMeta(authors=[], title="T", version=1.0, uuid="u"), parts=[], base_url="/")
+
+    sizes = {}
+    for level in (1, 9):
+        path = OutputPathHandler("book", source, tmp_path / str(level))
+        FB2Engine(zip_output=True, zip_level=level).execute(book, path)
+        with zipfile.ZipFile(path.output / "book.fb2.zip") as archive:
+            sizes[level] = archive.getinfo("book.fb2").compress_size
+    assert sizes[9] < sizes[1]
@@ -0,0 +1,52 @@
+import datetime
+from pathlib import Path
+
+from fpdf import FPDF
+
+from litres.engines.o4.font_cache import FontCache
+
+FONT = Path('fonts/NotoSans-Regular.ttf')
+TEXT = 'Съешь же ещё этих мягких французских булок — «да выпей чаю»'
+
+
+def _render(register) -> bytes:
+    pdf = FPDF()
+    pdf.set_creation_date(datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+    register(pdf)
+    pdf.add_page()
+    pdf.set_font('NotoSans', size=12)
+    pdf.multi_cell(0, 5, TEXT * 5, align='J')
+    return bytes(pdf.output())
+
+
+def test_cached_font_matches_add_font(tmp_path):
+    expected = _render(lambda pdf: pdf.add_font('NotoSans', '', FONT))
+
+    cache = FontCache(tmp_path)
+    assert _render(lambda pdf: cache.add_font(pdf, 'NotoSans', '', FONT)) == expected
+    # Повторная регистрация берёт метрики из памяти
+    assert _render(lambda pdf: cache.add_font(pdf, 'NotoSans', '', FONT)) == expected
+
+    assert len(list(tmp_path.glob('*.marshal'))) == 1
+    restored = FontCache(tmp_path)
+    assert restored._load(restored._file_hash(FONT)) is not None
+    assert _render(lambda pdf: restored.add_font(pdf, 'NotoSans', '', FONT)) == expected
+
+
+def test_broken_cache_file_ignored(tmp_path):
+    cache = FontCache(tmp_path)
+    (tmp_path / f'{cache._file_hash(FONT)}.marshal').write_bytes(b'garbage')
+    pdf = FPDF()
+    cache.add_font(pdf, 'NotoSans', '', FONT)
+    assert 'notosans' in pdf.fonts
+
+
+def test_cache_of_other_fpdf2_layout_falls_back_to_add_font(tmp_path):
+    expected = _render(lambda pdf: pdf.add_font('NotoSans', '', FONT))
+    cache = FontCache(tmp_path)
+    key = cache._file_hash(FONT)
+    metrics = cache._parse(FONT, key)
+    cache._metrics[key] = dict(metrics, slots=('is_cff',) + tuple(metrics['slots']))
+
+    assert _render(lambda pdf: cache.add_font(pdf, 'NotoSans', '', FONT)) == expected
+    assert cache._metrics[key] is None
@@ -0,0 +1,42 @@
+import os
+from pathlib import Path
+
+from litres.engines.o4 import image_index
+from litres.engines.o4.image_index import ImageIndex
+from litres.engines.o4.image_registry import ImageRegistry
+from litres.engines.o4.processors.fb2_processor import FB2ContentProcessor
+from litres.engines.o4.processors.pdf_processor import PDFContentProcessor
+
+
+def test_folder_is_scanned_once(tmp_path, monkeypatch):
+    (tmp_path / 'a.PNG').write_bytes(b'12345')
+    (tmp_path / 'sub').mkdir()
+    scans = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        scans.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(image_index.os, 'scandir', counting_scandir)
+    monkeypatch.setattr(Path, 'exists', lambda self: (_ for _ in ()).throw(AssertionError('stat per image')))
+
+    index = ImageIndex(tmp_path)
+    fb2 = FB2ContentProcessor(tmp_path, index)
+    pdf = PDFContentProcessor(tmp_path, index)
+    nodes = [{'t': 'img', 's': 'a.PNG'}, {'t': 'img', 's': 'missing.png'}, {'t': 'img', 's': 'a.PNG'}]
+    assert fb2.process_structure(nodes).count('<image') == 2
+    assert [block.text for block in pdf.iter_blocks(nodes)] == ['a.PNG', 'a.PNG']
+    with ImageRegistry(tmp_path, index=index) as images:
+        assert images.paths == {'a.PNG': tmp_path / 'a.PNG'}
+
+    assert len(scans) == 1
+    file = index.get('a.PNG')
+    assert (file.path, file.mime_type) == (tmp_path / 'a.PNG', 'image/png')
+    assert 'sub' not in index
+
+
+def test_missing_folder_is_empty(tmp_path):
+    index = ImageIndex(tmp_path / 'images')
+    assert len(index) == 0
+    assert index.get('a.png') is None
@@ -0,0 +1,57 @@
+import io
+
+from fpdf import FPDF
+from PIL import Image
+
+from litres.engines.o4.image_registry import ImageRegistry
+
+
+def test_images_encoded_once_and_shared(tmp_path):
+    Image.new('RGBA', (40, 30), (255, 0, 0, 128)).save(tmp_path / 'a.png')
+    Image.new('RGB', (40, 30), 'blue').save(tmp_path / 'b.jpg')
+
+    with ImageRegistry(tmp_path) as images:
+        first = images.get('a.png')
+        assert first is images.get('a.png')
+        assert first.mime_type == 'image/jpeg'
+        assert first.data.startswith(b'\xff\xd8')
+        assert images.get('b.jpg').data == (tmp_path / 'b.jpg').read_bytes()
+        assert images.get('missing.png') is None
+
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.image(first.data, w=20)
+        pdf.image(images.get('a.png').data, w=20)
+        assert len(pdf.image_cache.images) == 1
+
+
+def test_missing_folder(tmp_path):
+    with ImageRegistry(tmp_path / 'images') as images:
+        assert images.paths == {}
+        assert images.get('a.png') is None
+
+
+def test_downsampled_to_width(tmp_path):
+    Image.new('RGB', (1000, 500), 'green').save(tmp_path / 'big.jpg')
+    Image.new('RGB', (100, 50), 'green').save(tmp_path / 'small.jpg')
+
+    with ImageRegistry(tmp_path, quality=60, max_width=400) as images:
+        with Image.open(io.BytesIO(images.get('big.jpg').data)) as img:
+            assert img.size == (400, 200)
+        assert images.get('small.jpg').data == (tmp_path / 'small.jpg').read_bytes()
+
+
+def test_pixel_budget_keeps_format(tmp_path):
+    Image.new('RGBA', (400, 400), (0, 0, 255, 100)).save(tmp_path / 'alpha.png')
+    Image.new('P', (300, 300)).save(tmp_path / 'small.png')
+
+    with ImageRegistry(tmp_path, max_pixels=40_000, jpeg_only=False) as images:
+        image = images.get('alpha.png')
+        assert image.mime_type == 'image/png'
+        with Image.open(io.BytesIO(image.data)) as img:
+            assert img.size == (200, 200)
+            assert img.mode == 'RGBA'
+        image = images.get('small.png')
+        assert image.mime_type == 'image/png'
+        with Image.open(io.BytesIO(image.data)) as img:
+            assert img.width * img.height <= 40_000
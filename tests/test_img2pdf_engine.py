@@ -0,0 +1,310 @@
+import io
+import os
+import re
+import struct
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw, features
+
+from litres.engines.o3 import pdf_engine
+from litres.engines.o3.pdf_engine import (BITONAL_THRESHOLD, IMG2PDFEngine,
+                                          fpdf_embeds_g4)
+from litres.engines.o3.pdf_writer import (BLANK_PAGE, EncodedImage,
+                                          ImagePDFWriter)
+from litres.models.book import Author, Book, BookMeta
+from litres.models.output_path_handler import OutputPathHandler
+
+needs_libtiff = pytest.mark.skipif(not features.check('libtiff'), reason="Pillow is built without libtiff")
+
+# Фотометрия TIFF: 0 - WhiteIsZero (как в факсе), 1 - BlackIsZero
+WHITE_IS_ZERO, BLACK_IS_ZERO = 0, 1
+
+
+def _text_page() -> Image.Image:
+    img = Image.new('L', (400, 300), 255)
+    draw = ImageDraw.Draw(img)
+    for row in range(4):
+        draw.text((20, 20 + row * 60), "Lorem ipsum dolor", fill=0, font_size=36)
+    return img
+
+
+def _tiff_strip(data: bytes) -> tuple[int, int]:
+    """StripOffsets and StripByteCounts read straight from the first IFD"""
+    assert data[:4] == b'II*\x00'
+    (ifd,) = struct.unpack_from('<I', data, 4)
+    (count,) = struct.unpack_from('<H', data, ifd)
+    tags = {}
+    for i in range(count):
+        tag, kind, _, value = struct.unpack_from('<HHII', data, ifd + 2 + 12 * i)
+        tags[tag] = value & 0xFFFF if kind == 3 else value
+    return tags[273], tags[279]
+
+
+def _decode_strip(strip: bytes, width: int, height: int, photometric: int) -> Image.Image:
+    """Decode a raw G4 strip by wrapping it into a minimal TIFF"""
+    entries = [
+        (256, 4, width), (257, 4, height), (258, 3, 1), (259, 3, 4), (262, 3, photometric),
+        (273, 4, 8 + 2 + 12 * 9 + 4), (277, 3, 1), (278, 4, height), (279, 4, len(strip)),
+    ]
+    ifd = struct.pack('<H', len(entries)) + b''.join(
+        struct.pack('<HHII', tag, kind, 1, value) if kind == 4 else struct.pack('<HHIHH', tag, kind, 1, value, 0)
+        for tag, kind, value in entries
+    ) + struct.pack('<I', 0)
+    img = Image.open(io.BytesIO(b'II*\x00' + struct.pack('<I', 8) + ifd + strip))
+    img.load()
+    return img
+
+
+def _image_object(data: bytes) -> tuple[bytes, bytes]:
+    """Dictionary and stream of the only image XObject of a PDF"""
+    match = re.search(rb'<<((?:(?!>>\s*stream).)*?/Subtype\s*/Image.*?)>>\s*stream\r?\n', data, re.S)
+    length = int(re.search(rb'/Length (\d+)', match.group(1)).group(1))
+    return match.group(1), data[match.end():match.end() + length]
+
+
+def test_text_page_is_bitonal():
+    assert IMG2PDFEngine()._is_bitonal(_text_page())
+
+
+def test_picture_page_is_not_bitonal():
+    engine = IMG2PDFEngine()
+    gradient = Image.linear_gradient('L').resize((400, 300))
+    assert not engine._is_bitonal(gradient)
+    # Цветная иллюстрация без полутонов в сером канале
+    colour = _text_page().convert('RGB')
+    ImageDraw.Draw(colour).rectangle((50, 50, 350, 250), fill=(200, 30, 30))
+    assert not engine._is_bitonal(colour)
+
+
+@needs_libtiff
+def test_g4_strip_is_whole_page():
+    page = _text_page()
+    encoded = IMG2PDFEngine(bitonal=True)._encode_g4(page)
+
+    assert (encoded.offset, encoded.length) == _tiff_strip(encoded.data)
+    assert encoded.offset + encoded.length <= len(encoded.data)
+    decoded = _decode_strip(bytes(encoded.stream), encoded.width, encoded.height, BLACK_IS_ZERO)
+    expected = page.point(lambda v: 255 if v >= BITONAL_THRESHOLD else 0, mode='1')
+    assert decoded.tobytes() == expected.tobytes()
+
+
+@needs_libtiff
+def test_g4_decode_parms_in_native_writer(tmp_path):
+    encoded = IMG2PDFEngine(bitonal=True)._encode_g4(_text_page())
+    output = tmp_path / "book.pdf"
+    with ImagePDFWriter(output, (210, 297)) as writer:
+        writer.add_page(writer.add_image(encoded))
+
+    header, stream = _image_object(output.read_bytes())
+    assert b'/Filter /CCITTFaxDecode' in header
+    assert b'/DecodeParms << /K -1 /Columns 400 /Rows 300 /BlackIs1 true >>' in header
+    assert stream == bytes(encoded.stream)
+    # Бумага закодирована "чёрными" сериями факса, поэтому BlackIs1 true
+    # делает её белой: без флага страница вышла бы негативом
+    fax = _decode_strip(stream, 400, 300, WHITE_IS_ZERO)
+    assert fax.getpixel((0, 0)) == 0
+
+
+@needs_libtiff
+def test_bitonal_fpdf2_path_needs_g4_passthrough():
+    assert IMG2PDFEngine(bitonal=True).bitonal == fpdf_embeds_g4()
+    assert IMG2PDFEngine(bitonal=True, native_writer=True).bitonal
+
+
+@pytest.mark.skipif(not features.check('libtiff') or not fpdf_embeds_g4(), reason="fpdf2 re-encodes G4 pages")
+def test_g4_decode_parms_in_fpdf2_path(tmp_path):
+    engine = IMG2PDFEngine(bitonal=True)
+    encoded = engine._encode_g4(_text_page())
+    output = tmp_path / "book.pdf"
+    meta = BookMeta(authors=[], title="T", version=1.0, uuid="u")
+    engine._create_pdf(meta, {Path("1.jpg"): encoded}, output)
+
+    header, stream = _image_object(output.read_bytes())
+    assert b'/Filter /CCITTFaxDecode' in header
+    parms = re.search(rb'/DecodeParms\s*<<(.*?)>>', header).group(1)
+    assert b'/K -1' in parms
+    assert b'/Columns 400' in parms
+    assert b'/Rows 300' in parms
+    assert b'/BlackIs1 true' in parms
+    assert stream == bytes(encoded.stream)
+
+
+def test_duplicate_page_placed_like_first_page(tmp_path):
+    engine = IMG2PDFEngine(native_writer=True, dedupe=True)
+    # Одинаковые данные, но при обрезке полей у страниц разные рамки
+    first = EncodedImage(data=b'\xff\xd8same\xff\xd9', width=10, height=20, crop=(0.1, 0.1, 0.9, 0.9))
+    second = EncodedImage(data=b'\xff\xd8same\xff\xd9', width=10, height=20, crop=(0.2, 0.3, 0.8, 0.7))
+    output = tmp_path / "book.pdf"
+    with ImagePDFWriter(output, (210, 297)) as writer:
+        engine._write_pages(writer, [(Path("1.jpg"), first), (Path("2.jpg"), second)])
+
+    data = output.read_bytes()
+    assert data.count(b'/Subtype /Image') == 1
+    placements = re.findall(rb'q ([\d. ]+) cm', data)
+    assert len(placements) == 2
+    assert placements[0] == placements[1]
+
+
+def _page_with_block(box=(300, 400, 699, 899)) -> Image.Image:
+    img = Image.new('L', (1000, 1400), 255)
+    ImageDraw.Draw(img).rectangle(box, fill=0)
+    return img
+
+
+def _save(img: Image.Image, tmp_path: Path, name: str = "1.png") -> Path:
+    path = tmp_path / name
+    img.save(path)
+    return path
+
+
+def test_content_box_trims_margins_with_padding():
+    box = IMG2PDFEngine(trim_margins=True)._content_box(_page_with_block())
+    # Поля по 2% ширины и высоты страницы вокруг содержимого
+    assert box == (300 - 20, 400 - 28, 700 + 20, 900 + 28)
+
+
+def test_content_box_padding_stays_inside_page():
+    box = IMG2PDFEngine(trim_margins=True)._content_box(_page_with_block((0, 0, 99, 1399)))
+    assert box == (0, 0, 120, 1400)
+
+
+def test_page_number_only_is_not_blank(tmp_path):
+    img = Image.new('L', (1000, 1400), 255)
+    ImageDraw.Draw(img).text((490, 1340), "12", fill=0, font_size=30)
+    engine = IMG2PDFEngine(skip_blank=True)
+
+    assert engine._content_box(img) is not None
+    assert engine._process_image(_save(img, tmp_path)) is not BLANK_PAGE
+
+
+def test_blank_page_with_specks_is_blank(tmp_path):
+    img = Image.new('L', (1000, 1400), 250)
+    for xy in ((100, 100), (500, 700), (900, 1300)):
+        img.putpixel(xy, 0)
+
+    assert IMG2PDFEngine(skip_blank=True)._process_image(_save(img, tmp_path)) is BLANK_PAGE
+    # Без skip_blank пустая страница остаётся целой
+    assert IMG2PDFEngine(trim_margins=True)._content_box(img) == (0, 0, 1000, 1400)
+
+
+def test_trimmed_page_placed_at_original_position(tmp_path):
+    engine = IMG2PDFEngine(trim_margins=True)
+    encoded = engine._process_image(_save(_page_with_block(), tmp_path))
+
+    assert (encoded.width, encoded.height) == (440, 556)
+    x, y, w, h = engine._placement(encoded)
+    assert x == pytest.approx(280 / 1000 * 210)
+    assert y == pytest.approx(372 / 1400 * 297)
+    assert w == pytest.approx(440 / 1000 * 210)
+    assert h == pytest.approx(556 / 1400 * 297)
+    assert IMG2PDFEngine()._placement(replace(encoded, crop=None)) == (0, 0, 210, 297)
+
+
+def _gray_pages(source: Path, count: int, first: int = 1):
+    """Pages numbered from `first`, page N is a solid gray of level 20 * N"""
+    source.mkdir(exist_ok=True)
+    for number in range(first, first + count):
+        Image.new('L', (60, 80), 20 * number).save(source / f"{number}.jpg", quality=95)
+
+
+def _read_pages(pdf: Path) -> list[int]:
+    """Gray level of the image on every page in page tree order.
+
+    Objects are looked up through the xref chain from the last section
+    back along /Prev, as a viewer does, so incremental updates count.
+    """
+    data = pdf.read_bytes()
+    offsets: dict[int, int] = {}
+    xref = int(re.findall(rb'startxref\n(\d+)', data)[-1])
+    while xref is not None:
+        pos = xref + len(b'xref\n')
+        while subsection := re.match(rb'(\d+) (\d+)\n', data[pos:pos + 32]):
+            start, count = int(subsection[1]), int(subsection[2])
+            pos += subsection.end()
+            for ref in range(start, start + count):
+                if data[pos + 17:pos + 18] == b'n':
+                    offsets.setdefault(ref, int(data[pos:pos + 10]))
+                pos += 20
+        prev = re.match(rb'trailer\n<<[^>]*?/Prev (\d+)', data[pos:])
+        xref = int(prev[1]) if prev else None
+
+    def body(ref: int) -> bytes:
+        start = offsets[ref]
+        assert data.startswith(b'%d 0 obj' % ref, start)
+        # Словарь объекта: до начала потока или до конца объекта
+        return data[start:min(i for i in (data.find(b'stream\n', start), data.index(b'endobj', start)) if i >= 0)]
+
+    kids = re.search(rb'/Kids \[([^\]]*)\]', body(ImagePDFWriter.PAGES_REF))[1]
+    levels = []
+    for page_ref in re.findall(rb'(\d+) 0 R', kids):
+        image_ref = int(re.search(rb'/XObject << /Im\d+ (\d+) 0 R', body(int(page_ref)))[1])
+        header = body(image_ref)
+        start = offsets[image_ref] + len(header) + len(b'stream\n')
+        length = int(re.search(rb'/Length (\d+)', header)[1])
+        with Image.open(io.BytesIO(data[start:start + length])) as img:
+            levels.append(round(img.convert('L').getpixel((30, 40)) / 20))
+    return levels
+
+
+def _run(engine: IMG2PDFEngine, source: Path, output: Path) -> OutputPathHandler:
+    book = Book(meta=BookMeta(authors=[Author(first='Test')], title='T', version=1.0, uuid='u'), parts=[])
+    path = OutputPathHandler("book", source, output)
+    engine.execute(book, path)
+    return path
+
+
+def test_parallel_build_keeps_page_order(tmp_path, monkeypatch):
+    # Несколько сегментов даже на одном процессоре
+    monkeypatch.setattr(pdf_engine, "MIN_SEGMENT_PAGES", 2)
+    _gray_pages(tmp_path / "src", 7)
+    path = _run(IMG2PDFEngine(parallel=True), tmp_path / "src", tmp_path / "out")
+
+    assert _read_pages(path.output / "book.pdf") == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_parallel_volumes_split_pages_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_engine, "MIN_SEGMENT_PAGES", 2)
+    _gray_pages(tmp_path / "src", 7)
+    path = _run(IMG2PDFEngine(parallel=True, volume_pages=3), tmp_path / "src", tmp_path / "out")
+
+    assert sorted(p.name for p in path.output.iterdir()) == ["book - 1.pdf", "book - 2.pdf", "book - 3.pdf"]
+    assert [_read_pages(path.output / f"book - {n}.pdf") for n in (1, 2, 3)] == [[1, 2, 3], [4, 5, 6], [7]]
+
+
+def _replace_page(image: Path, level: int):
+    """Rewrite a page; its mtime moves forward even on coarse timestamps"""
+    mtime = image.stat().st_mtime_ns
+    Image.new('L', (60, 80), 20 * level).save(image, quality=95)
+    os.utime(image, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def test_incremental_update_appends_and_replaces_pages(tmp_path):
+    source = tmp_path / "src"
+    _gray_pages(source, 5)
+    engine = IMG2PDFEngine(incremental=True)
+    path = _run(engine, source, tmp_path / "out")
+    output = path.output / "book.pdf"
+    original = output.read_bytes()
+    assert _read_pages(output) == [1, 2, 3, 4, 5]
+
+    # Новая часть и заменённая: страница 3 теперь уровня 9
+    _gray_pages(source, 1, first=6)
+    _replace_page(source / "3.jpg", 9)
+    _run(engine, source, tmp_path / "out")
+
+    updated = output.read_bytes()
+    assert updated.startswith(original)
+    assert len(re.findall(rb'/Prev \d+', updated)) == 1
+    assert _read_pages(output) == [1, 2, 9, 4, 5, 6]
+
+    # Без изменений файл остаётся как есть
+    _run(engine, source, tmp_path / "out")
+    assert output.read_bytes() == updated
+
+    # Второе обновление ссылается на первое
+    _replace_page(source / "1.jpg", 10)
+    _run(engine, source, tmp_path / "out")
+    assert len(re.findall(rb'/Prev \d+', output.read_bytes())) == 2
+    assert _read_pages(output) == [10, 2, 9, 4, 5, 6]
@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+from litres import js_object
+
+
+def test_strict_json_is_parsed_as_is():
+    assert js_object.loads('[{"t": "p", "c": ["a"]}]') == [{"t": "p", "c": ["a"]}]
+
+
+def test_litres_js_object_syntax():
+    text = """[{t: "p", xp: [1, 0], c: ["Глава\\u00ad 1", {t: 'em', c: ['it\\'s "so"']},]},
+               {'t': "img", s: "i_001.jpg", w: 1.5e2, n: -3, f: True, g: None,},]"""
+    assert js_object.loads(text) == [
+        {"t": "p", "xp": [1, 0], "c": ["Глава­ 1", {"t": "em", "c": ['it\'s "so"']}]},
+        {"t": "img", "s": "i_001.jpg", "w": 150.0, "n": -3, "f": True, "g": None},
+    ]
+
+
+def test_literal_words_inside_strings_are_kept():
+    assert js_object.loads('{a: "None, True or False",}') == {"a": "None, True or False"}
+
+
+@pytest.mark.parametrize("text", ['[1, 2', '{a 1}', '[1,, 2]', '{a: nope}', '[1] 2'])
+def test_malformed_input_raises(text):
+    with pytest.raises(json.JSONDecodeError):
+        js_object.loads(text)
@@ -0,0 +1,91 @@
+import os
+import struct
+
+from litres.engines import mp3_frames
+from litres.engines.audio_merge import AudioMergeEngine
+from litres.engines.mp3_frames import XING_TOC, audio_range, parse_header
+from litres.models.output_path_handler import OutputPathHandler
+
+# MPEG-1 Layer III, 44.1 кГц, joint stereo, без CRC; битрейт в байте 2
+HEADER_128K = 0xFFFB9040
+HEADER_64K = 0xFFFB5040
+
+
+def frame(value, fill=None):
+    header = parse_header(value)
+    body = os.urandom(header.length - 4) if fill is None else fill * (header.length - 4)
+    return value.to_bytes(4, 'big') + body
+
+
+def info_frame():
+    data = bytearray(frame(HEADER_128K, b'\0'))
+    data[36:40] = b'Info'
+    return bytes(data)
+
+
+def id3v2(size=300):
+    return b'ID3\x03\x00\x00' + bytes([0, 0, size >> 7, size & 0x7F]) + b'\0' * size
+
+
+def frames(part):
+    """Frames of a part, in order"""
+    return [frame(HEADER_64K if (part + n) % 3 else HEADER_128K) for n in range(40)]
+
+
+def test_parts_joined_with_one_xing_frame(tmp_path, monkeypatch):
+    # 160 кадров: хранится каждое 16-е смещение
+    monkeypatch.setattr(mp3_frames, "MAX_OFFSETS", 16)
+    source = tmp_path / "src"
+    source.mkdir()
+    audio = []
+    for part in (0, 1, 2, 10):
+        part_frames = frames(part)
+        audio += part_frames
+        # Теги, info-кадр LAME и мусор между кадрами не попадают в результат
+        (source / f"{part}.mp3").write_bytes(
+            id3v2() + info_frame() + b''.join(part_frames[:20]) + b'\0junk' + b''.join(part_frames[20:])
+            + b'TAG' + b'\0' * 125
+        )
+    path = OutputPathHandler("book", source, tmp_path / "out")
+
+    AudioMergeEngine(frame_accurate=True).execute(None, path)
+
+    merged = (path.output / "book.mp3").read_bytes()
+    xing = parse_header(int.from_bytes(merged[:4], 'big'))
+    assert merged[xing.length:] == b''.join(audio)
+    assert merged[36:40] == b'Xing'
+    flags, count, size = struct.unpack_from('>III', merged, 40)
+    assert flags & XING_TOC
+    assert (count, size) == (len(audio), len(merged))
+    toc = merged[52:152]
+    assert toc[0] == xing.length * 256 // len(merged)
+    assert list(toc) == sorted(toc)
+    # Кадр на середине длительности
+    middle = xing.length + sum(len(f) for f in audio[:len(audio) // 2])
+    assert toc[50] == middle * 256 // len(merged)
+
+
+def test_audio_range_skips_tags(tmp_path):
+    part = tmp_path / "0.mp3"
+    ape = b'APETAGEX' + struct.pack('<IIII', 2000, 64, 0, 0) + b'\0' * 8
+    part.write_bytes(id3v2(100) + frame(HEADER_128K) + b'x' * 32 + ape + b'TAG' + b'\0' * 125)
+    with part.open('rb') as f:
+        assert audio_range(f) == (110, 110 + 417)
+
+
+def test_not_mp3_falls_back_to_byte_merge(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "0.mp3").write_bytes(b'not an mp3')
+    (source / "1.mp3").write_bytes(frame(HEADER_128K))
+    path = OutputPathHandler("book", source, tmp_path / "out")
+
+    AudioMergeEngine(frame_accurate=True).execute(None, path)
+    assert (path.output / "book.mp3").read_bytes() == b'not an mp3' + (source / "1.mp3").read_bytes()
+
+
+def test_header_cache_stays_bounded():
+    # Случайные байты при поиске синхрослова не копятся в кеше
+    for value in range(0xFFE00000, 0xFFE00000 + 3 * mp3_frames.HEADER_CACHE_SIZE):
+        parse_header(value)
+    assert parse_header.cache_info().currsize <= mp3_frames.HEADER_CACHE_SIZE
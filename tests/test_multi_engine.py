@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from litres.engines.base import Engine, OutFormat
+from litres.engines.o4 import multi_engine
+from litres.engines.o4.fb2_engine import FB2Engine
+from litres.engines.o4.multi_engine import MultiFormatEngine
+from litres.engines.o4.pdf_engine import PDFEngine
+from litres.engines.o4.sink import FormatSink
+from litres.engines.o4.txt_engine import TXTEngine
+from litres.models.book import Author, BookMeta, TextBook
+from litres.models.output_path_handler import OutputPathHandler
+
+
+class BrokenEngine(Engine):
+    SUPPORTED_OUT_FORMAT = OutFormat.PDF
+
+    def open_sink(self, book, path):
+        class BrokenSink(FormatSink):
+            name = 'PDF'
+
+            def feed(self, item):
+                raise ValueError("broken")
+
+            def close(self):
+                raise AssertionError("a failed sink must not be closed")
+
+        return BrokenSink()
+
+
+def _setup(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "0.txt").write_text("[{t: 'title', c: [{t: 'p', c: ['Глава']}]},]", encoding="utf-8")
+    (source / "1.txt").write_text("[{t: 'p', c: ['Текст & ещё']},]", encoding="utf-8")
+    book = TextBook(meta=BookMeta(authors=[Author(first="A")], title="T", version=1.0, uuid="u"),
+                    parts=[], base_url="/")
+    return book, source
+
+
+def test_single_parse_matches_separate_engines(tmp_path):
+    book, source = _setup(tmp_path)
+    separate = OutputPathHandler("book", source, tmp_path / "separate")
+    multi = OutputPathHandler("book", source, tmp_path / "multi")
+    for engine in (FB2Engine(), TXTEngine()):
+        engine.execute(book, separate)
+
+    MultiFormatEngine([BrokenEngine(), FB2Engine(), TXTEngine()]).execute(book, multi)
+
+    for name in ("book.fb2", "book.txt"):
+        assert (multi.output / name).read_bytes() == (separate.output / name).read_bytes()
+    assert (multi.output / "book.txt").read_text(encoding="utf-8") == "Глава\n\nТекст & ещё\n"
+
+
+def test_failed_parse_aborts_every_sink(tmp_path, monkeypatch):
+    book, source = _setup(tmp_path)
+    path = OutputPathHandler("book", source, tmp_path / "out")
+
+    def broken_parse(source_dir, parallel=False):
+        yield {"t": "p", "c": ["Текст"]}
+        raise ValueError("broken part")
+
+    monkeypatch.setattr(multi_engine, "iter_content", broken_parse)
+    threads = threading.active_count()
+    with pytest.raises(ValueError):
+        MultiFormatEngine([PDFEngine(), FB2Engine(), TXTEngine()]).execute(book, path)
+
+    assert list(path.output.iterdir()) == []
+    assert threading.active_count() == threads
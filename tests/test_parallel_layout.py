@@ -0,0 +1,66 @@
+import re
+
+from litres.engines.o4.parallel_layout import ChapterLayout, split_chapters
+from litres.engines.o4.pdf_engine import PDFBuilder
+from litres.engines.o4.processors.pdf_processor import Block, BlockType
+from litres.models.book import Author, Book, BookMeta
+
+
+def _builder() -> PDFBuilder:
+    book = Book(meta=BookMeta(authors=[Author(first='Test')], title='T', version=1.0, uuid='u'), parts=[])
+    return PDFBuilder(book, images=None)
+
+
+def _chapter(title: str, paragraphs: int) -> list[Block]:
+    text = 'съешь же ещё этих мягких французских булок да выпей чаю ' * 8
+    return (
+        [Block(BlockType.HEADING, title), Block(BlockType.HEADING, 'подзаголовок')]
+        + [Block(BlockType.PARAGRAPH, text) for _ in range(paragraphs)]
+        + [Block(BlockType.RULE), Block(BlockType.QUOTE, text)]
+    )
+
+
+def test_split_chapters_keeps_heading_runs():
+    blocks = [Block(BlockType.PARAGRAPH, 'вступление')] + _chapter('1', 2) + _chapter('2', 1)
+    chapters = split_chapters(blocks)
+    assert [len(chapter) for chapter in chapters] == [1, 6, 5]
+    assert chapters[1][0] == Block(BlockType.HEADING, '1')
+    assert split_chapters([]) == []
+
+
+def test_chapter_layout_paginates_like_builder():
+    blocks = _chapter('Глава', 60)
+    sequential = _builder()
+    for block in blocks:
+        sequential.add_block(block)
+
+    builder = _builder()
+    pages = ChapterLayout(builder._layout_context(blocks)).run(blocks)
+    assert len(pages) == sequential.pdf.page_no() > 1
+    assert all(page.fonts for page in pages)
+    assert any(op.endswith(' l S') for page in pages for op in page.ops)
+
+
+def test_parallel_build_places_every_chapter_on_new_pages(tmp_path):
+    blocks = _chapter('Первая', 3) + _chapter('Вторая', 3) + _chapter('Третья', 3)
+    builder = _builder()
+    builder.add_blocks_parallel(blocks, max_workers=1)
+    assert builder.pdf.page_no() == 3
+    builder.save(tmp_path / 'book.pdf')
+    assert (tmp_path / 'book.pdf').read_bytes().startswith(b'%PDF')
+
+
+def test_placed_pages_list_their_fonts():
+    """Fonts of a placed page are registered through fpdf2's resource
+    catalog, every page must reference them"""
+    blocks = _chapter('Первая', 3) + _chapter('Вторая', 3)
+    builder = _builder()
+    builder.pdf.set_compression(False)
+    builder.add_blocks_parallel(blocks, max_workers=1)
+    data = bytes(builder.pdf.output())
+
+    resources = re.findall(rb'/Resources (\d+) 0 R\n/Type /Page\b', data)
+    assert len(resources) == 2
+    for ref in resources:
+        body = re.search(rb'\n%s 0 obj\n(.*?)endobj' % ref, data, re.S).group(1)
+        assert re.search(rb'/Font <</F1 \d+ 0 R', body)
@@ -0,0 +1,101 @@
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from litres import utils
+from litres.models import parsed_parts
+from litres.models.parsed_parts import ParsedPartsCache
+from litres.utils import iter_parts
+
+NODES = [{"t": "p", "xp": [1, 0], "c": ["text", {"t": "em", "c": ["it"]}]}]
+
+
+def test_roundtrip_and_invalidation(tmp_path):
+    part = tmp_path / "0.txt"
+    part.write_text("[]", encoding="utf-8")
+    cache = ParsedPartsCache(tmp_path / ".parsed")
+    assert cache.load(part) is None
+
+    cache.save(part, NODES)
+    assert cache.load(part) == NODES
+
+    part.write_text("[1]", encoding="utf-8")
+    assert cache.load(part) is None
+
+
+def test_broken_cache_is_ignored(tmp_path):
+    part = tmp_path / "0.txt"
+    part.write_text("[]", encoding="utf-8")
+    cache = ParsedPartsCache(tmp_path / ".parsed")
+    cache.save(part, NODES)
+    cache_file = tmp_path / ".parsed" / "0.marshal"
+    cache_file.write_bytes(cache_file.read_bytes()[:30])
+    assert cache.load(part) is None
+
+
+def test_new_parser_version_rebuilds_cache(tmp_path, monkeypatch):
+    part = tmp_path / "0.txt"
+    part.write_text("[]", encoding="utf-8")
+    cache = ParsedPartsCache(tmp_path / ".parsed")
+    cache.save(part, NODES)
+    assert cache.is_current(part)
+
+    monkeypatch.setattr(parsed_parts, "PARSER_VERSION", parsed_parts.PARSER_VERSION + 1)
+    assert not cache.is_current(part)
+    assert cache.load(part) is None
+
+
+def test_iter_parts_reuses_cache(tmp_path, mocker):
+    part = tmp_path / "0.txt"
+    part.write_text("[{t: 'p', c: ['a']},]", encoding="utf-8")
+    assert list(iter_parts(tmp_path)) == [[{"t": "p", "c": ["a"]}]]
+
+    parse = mocker.patch("litres.utils.parse_part")
+    assert list(iter_parts(tmp_path)) == [[{"t": "p", "c": ["a"]}]]
+    parse.assert_not_called()
+
+    stat = part.stat()
+    os.utime(part, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    parse.return_value = [{"t": "p", "c": ["b"]}]
+    assert list(iter_parts(tmp_path)) == [[{"t": "p", "c": ["b"]}]]
+
+
+def test_parallel_parsing_keeps_part_order(tmp_path):
+    for i in range(12):
+        (tmp_path / f"{i}.txt").write_text(f"[{{t: 'p', xp: [{i}], c: ['part {i}']}},]", encoding="utf-8")
+    (tmp_path / "5.txt").write_text("[{broken", encoding="utf-8")
+
+    parts = list(iter_parts(tmp_path, parallel=True, max_workers=2))
+    assert [part[0]["xp"] for part in parts] == [[i] for i in range(12) if i != 5]
+    assert (tmp_path / ".parsed" / "11.marshal").is_file()
+    assert list(iter_parts(tmp_path)) == parts
+
+
+def test_malformed_part_is_not_parsed_again(tmp_path, mocker):
+    for i in range(3):
+        (tmp_path / f"{i}.txt").write_text(f"[{{t: 'p', c: ['part {i}']}},]", encoding="utf-8")
+    (tmp_path / "1.txt").write_text("[{broken", encoding="utf-8")
+    parse = mocker.spy(utils, "parse_part")
+
+    parts = list(iter_parts(tmp_path, parallel=True, max_workers=1))
+    assert [part[0]["c"] for part in parts] == [["part 0"], ["part 2"]]
+    # Разбор шёл в обработчиках, их ошибка не повторяется в основном процессе
+    parse.assert_not_called()
+
+
+def test_broken_pool_parses_in_process(tmp_path, monkeypatch):
+    for i in range(3):
+        (tmp_path / f"{i}.txt").write_text(f"[{{t: 'p', c: ['part {i}']}},]", encoding="utf-8")
+
+    class DeadPool:
+        def submit(self, *args):
+            future = Future()
+            future.set_exception(BrokenProcessPool("worker died"))
+            return future
+
+        def shutdown(self, cancel_futures=False):
+            pass
+
+    monkeypatch.setattr(utils, "process_pool", lambda max_workers=None: DeadPool())
+    parts = list(iter_parts(tmp_path, parallel=True))
+    assert [part[0]["c"] for part in parts] == [["part 0"], ["part 1"], ["part 2"]]
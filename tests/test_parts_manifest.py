@@ -0,0 +1,44 @@
+import os
+
+from litres.models.parts_manifest import PartsManifest
+
+
+def _touch(path, data=b"x"):
+    path.write_bytes(data)
+    return path
+
+
+def test_manifest_tracks_new_changed_and_removed(tmp_path):
+    output = _touch(tmp_path / "book.pdf")
+    first, second = _touch(tmp_path / "0.jpg"), _touch(tmp_path / "1.jpg")
+    manifest = PartsManifest(tmp_path / "pdf.parts.json")
+    manifest.record(output, [first, second], {"dpi": 150}, pages={"0.jpg": 5})
+
+    reloaded = PartsManifest(tmp_path / "pdf.parts.json")
+    assert reloaded.matches(output, {"dpi": 150})
+    assert not reloaded.matches(output, {"dpi": 300})
+    assert reloaded.is_current(output, [first, second], {"dpi": 150})
+    assert reloaded.data["pages"] == {"0.jpg": 5}
+
+    third = _touch(tmp_path / "2.jpg")
+    _touch(second, b"changed")
+    new, changed, removed = reloaded.diff([second, third])
+    assert new == [third]
+    assert changed == [second]
+    assert removed == ["0.jpg"]
+
+
+def test_manifest_rejects_modified_output(tmp_path):
+    output = _touch(tmp_path / "book.fb2")
+    part = _touch(tmp_path / "0.txt")
+    manifest = PartsManifest(tmp_path / "fb2.parts.json")
+    manifest.record(output, [part])
+    _touch(output, b"edited elsewhere")
+    os.utime(output, ns=(1, 1))
+    assert not manifest.is_current(output, [part])
+
+
+def test_broken_manifest_is_ignored(tmp_path):
+    (tmp_path / "pdf.parts.json").write_text("{broken", encoding="utf-8")
+    manifest = PartsManifest(tmp_path / "pdf.parts.json")
+    assert manifest.data == {}
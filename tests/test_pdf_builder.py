@@ -0,0 +1,46 @@
+import re
+
+import pytest
+
+from litres.engines.o4.pdf_engine import PDFBuilder
+from litres.engines.o4.processors.pdf_processor import BlockType
+from litres.engines.o4.text_layout import LINE_HEIGHT, TEXT_STYLES, break_lines
+from litres.models.book import Author, Book, BookMeta
+
+# Строка текста в потоке страницы: позиция и оператор вывода
+TEXT_LINE = re.compile(rb'BT ([\d.]+) ([\d.]+) Td .*? (TJ|Tj) ET', re.S)
+
+
+def _builder() -> PDFBuilder:
+    book = Book(meta=BookMeta(authors=[Author(first='Test')], title='T', version=1.0, uuid='u'), parts=[])
+    builder = PDFBuilder(book, images=None)
+    builder.pdf.set_compression(False)
+    return builder
+
+
+def test_styled_text_prints_every_broken_line():
+    """Lines go to fpdf2 through its private line renderer, so a change
+    of those internals must show up here"""
+    builder = _builder()
+    pdf = builder.pdf
+    style = TEXT_STYLES[BlockType.PARAGRAPH]
+    text = 'съешь же ещё этих мягких французских булок да выпей чаю ' * 3
+    top = pdf.get_y()
+    builder.add_styled_text(text, style)
+
+    widths = builder._glyph_widths()
+    to_mm = pdf.font_size / 1000
+    lines = list(break_lines(text, widths, (pdf.epw - 2 * pdf.c_margin) / to_mm, style.first_indent * widths.space))
+    rows = TEXT_LINE.findall(bytes(pdf.output()))
+    assert len(rows) == len(lines) > 1
+
+    # Первая строка с красной строкой, остальные от поля
+    xs = [float(x) for x, _, _ in rows]
+    assert xs[0] == pytest.approx((pdf.l_margin + pdf.c_margin + style.first_indent * widths.space * to_mm) * pdf.k, abs=0.01)
+    assert xs[1:] == [pytest.approx((pdf.l_margin + pdf.c_margin) * pdf.k, abs=0.01)] * (len(rows) - 1)
+    line_height = min(style.height, pdf.font_size * LINE_HEIGHT)
+    ys = [float(y) for _, y, _ in rows]
+    assert [a - b for a, b in zip(ys, ys[1:])] == [pytest.approx(line_height * pdf.k, abs=0.01)] * (len(rows) - 1)
+    # Выключка по ширине раздвигает пробелы, последняя строка без неё
+    assert [op for _, _, op in rows] == [b'TJ'] * (len(rows) - 1) + [b'Tj']
+    assert pdf.get_y() == pytest.approx(top + len(lines) * line_height + style.space_after)
@@ -0,0 +1,26 @@
+from litres.engines.o4.processors.pdf_processor import (Block, BlockType,
+                                                        PDFContentProcessor)
+
+
+def test_iter_blocks_types(tmp_path):
+    (tmp_path / 'pic.png').write_bytes(b'')
+    structure = [
+        {'t': 'title', 'c': [{'t': 'p', 'c': ['Глава 1']}]},
+        {'t': 'p', 'c': ['Первая ', {'t': 'strong', 'c': ['стро\xadка']}, '\nвторая']},
+        {'t': 'hr'},
+        {'t': 'blockquote', 'c': [{'t': 'p', 'c': ['Цитата']}]},
+        {'t': 'img', 's': 'pic.png'},
+        {'t': 'img', 's': 'missing.png'},
+    ]
+    processor = PDFContentProcessor(tmp_path)
+    blocks = list(processor.iter_blocks(structure))
+    assert blocks == [
+        Block(BlockType.HEADING, 'Глава 1'),
+        Block(BlockType.PARAGRAPH, 'Первая строка'),
+        Block(BlockType.PARAGRAPH, 'вторая'),
+        Block(BlockType.RULE),
+        Block(BlockType.QUOTE, 'Цитата'),
+        Block(BlockType.IMAGE, 'pic.png'),
+    ]
+    assert processor.context['headings'] == ['Глава 1']
+    assert [p.name for p in processor.get_images()] == ['pic.png']
@@ -0,0 +1,61 @@
+import re
+
+from litres.engines.o3.pdf_writer import (EncodedImage, ImagePDFWriter,
+                                          pdf_string)
+
+
+def _xref_offsets(data: bytes) -> dict[int, int]:
+    start = int(re.search(rb'startxref\n(\d+)', data).group(1))
+    lines = data[start:].split(b'\n')
+    size = int(lines[1].split()[1])
+    return {ref: int(lines[2 + ref][:10]) for ref in range(1, size)}
+
+
+def test_pdf_string():
+    assert pdf_string("Book (1)") == b'(Book \\(1\\))'
+    assert pdf_string("Кн") == b'<FEFF041A043D>'
+
+
+def test_writer_xref_points_to_objects(tmp_path):
+    output = tmp_path / "book.pdf"
+    image = EncodedImage(data=b'\xff\xd8jpeg\xff\xd9', width=10, height=20)
+    with ImagePDFWriter(output, (210, 297)) as writer:
+        writer.set_metadata("Title", "Author", "Creator", "Subject")
+        ref = writer.add_image(image)
+        writer.add_page(ref)
+        writer.add_page(ref)
+
+    data = output.read_bytes()
+    assert data.startswith(b'%PDF-1.4')
+    assert data.endswith(b'%%EOF\n')
+    for ref, offset in _xref_offsets(data).items():
+        assert data[offset:].startswith(b'%d 0 obj' % ref)
+    assert b'/Count 2' in data
+    assert data.count(b'/Subtype /Image') == 1
+
+
+def test_encoded_image_stream_slice():
+    image = EncodedImage(data=b'headerPAYLOADtail', width=1, height=1, offset=6, length=7)
+    assert bytes(image.stream) == b'PAYLOAD'
+
+
+def test_segments_merged_in_order(tmp_path):
+    image = EncodedImage(data=b'\xff\xd8jpeg\xff\xd9', width=10, height=20)
+    segments = []
+    for number, first_ref in enumerate((10, 20)):
+        writer = ImagePDFWriter(tmp_path / f"{number}.seg", (210, 297), first_ref=first_ref)
+        writer.add_page(writer.add_image(image))
+        writer.add_page()
+        segments.append(writer.close_segment())
+
+    output = tmp_path / "book.pdf"
+    with ImagePDFWriter(output, (210, 297)) as writer:
+        for segment in segments:
+            writer.append_segment(segment)
+
+    data = output.read_bytes()
+    offsets = _xref_offsets(data)
+    for ref in (1, 2, 3, 10, 11, 12, 13, 20, 21, 22, 23):
+        assert data[offsets[ref]:].startswith(b'%d 0 obj' % ref)
+    assert b'/Kids [12 0 R 13 0 R 22 0 R 23 0 R]' in data
+    assert b'0000000000 65535 f \n' * 2 in data
@@ -0,0 +1,51 @@
+import pytest
+from fpdf import FPDF
+
+from litres.engines.o4.text_layout import GlyphWidths, break_lines
+
+
+def _widths() -> GlyphWidths:
+    pdf = FPDF()
+    pdf.add_font('NotoSans', '', 'fonts/NotoSans-Regular.ttf')
+    return GlyphWidths.from_font(pdf.fonts['notosans'])
+
+
+def test_widths_match_fpdf():
+    pdf = FPDF()
+    pdf.add_font('NotoSans', '', 'fonts/NotoSans-Regular.ttf')
+    pdf.set_font('NotoSans', size=10)
+    widths = GlyphWidths.from_font(pdf.current_font)
+    text = 'Съешь же ещё этих булок 𝔸'
+    assert widths.text_width(text) * pdf.font_size / 1000 == pytest.approx(pdf.get_string_width(text))
+
+
+def test_lines_fit_and_keep_words():
+    widths = _widths()
+    text = ' '.join(['мягких французских булок'] * 20)
+    limit = 20 * widths.text_width('булок')
+    lines = list(break_lines(text, widths, limit, first_indent=4 * widths.space))
+
+    assert ' '.join(line.text for line in lines) == text
+    assert [line.last for line in lines] == [False] * (len(lines) - 1) + [True]
+    assert lines[0].width <= limit - 4 * widths.space
+    for line in lines:
+        assert line.width <= limit
+        assert line.width == widths.text_width(line.text)
+        assert line.spaces == line.text.count(' ')
+    # Жадный перенос: следующее слово не помещалось в строку
+    for line, following in zip(lines[1:], lines[2:]):
+        next_word = following.text.split()[0]
+        assert line.width + widths.space + widths.text_width(next_word) > limit
+
+
+def test_long_word_split():
+    widths = _widths()
+    word = 'а' * 50
+    limit = 10 * widths.text_width('а')
+    lines = list(break_lines('да ' + word, widths, limit))
+    assert [line.text for line in lines] == ['да', 'а' * 10, 'а' * 10, 'а' * 10, 'а' * 10, 'а' * 10]
+    assert lines[-1].last
+
+
+def test_empty_text():
+    assert list(break_lines('  \n ', _widths(), 1000)) == []
@@ -0,0 +1,45 @@
+from litres.engines.o4 import txt_engine
+from litres.engines.o4.txt_engine import TXTEngine
+from litres.models.book import BookMeta, TextBook
+from litres.models.output_path_handler import OutputPathHandler
+
+
+def _book():
+    return TextBook(meta=BookMeta(authors=[], title="T", version=1.0, uuid="u"), parts=[], base_url="/")
+
+
+def test_txt_streams_parts_in_order(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "0.txt").write_text(
+        "[{t: 'title', c: [{t: 'p', c: ['Часть']}, {t: 'p', c: ['Глава 1']}]},"
+        " {t: 'div', c: [{t: 'p', c: ['Пер\\u00adвый ', {t: 'em', c: ['абзац']}]}, {t: 'p', c: ['Второй']}]},"
+        " {t: 'img', s: 'i_1.png'}, {t: 'hr'}]",
+        encoding="utf-8",
+    )
+    # Части читаются в числовом порядке: 2 раньше 10
+    (source / "10.txt").write_text("[{t: 'p', c: ['Конец']}]", encoding="utf-8")
+    (source / "2.txt").write_text("[{t: 'h2', c: ['Глава 2']}, {t: 'p', c: ['Текст']}]", encoding="utf-8")
+    path = OutputPathHandler("book", source, tmp_path / "out")
+
+    TXTEngine().execute(_book(), path)
+
+    assert [p.name for p in path.output.iterdir()] == ["book.txt"]
+    assert (path.output / "book.txt").read_text(encoding="utf-8") == (
+        "Часть\nГлава 1\n\nПервый абзац\nВторой\n\n\nГлава 2\n\nТекст\nКонец\n"
+    )
+
+
+def test_failed_txt_leaves_no_partial_file(tmp_path, monkeypatch):
+    source = tmp_path / "src"
+    source.mkdir()
+    (source / "0.txt").write_text("[{t: 'p', c: ['x']}]", encoding="utf-8")
+    path = OutputPathHandler("book", source, tmp_path / "out")
+
+    def broken(self, blocks):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(txt_engine.TXTSink, "_write", broken)
+
+    TXTEngine().execute(_book(), path)
+    assert list(path.output.iterdir()) == []
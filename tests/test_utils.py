@@ -1,6 +1,10 @@
+import threading
+import warnings
+
 import pytest
 
-from litres.utils import sanitize_filename, timing
+from litres.utils import (iter_parts, list_parts, load_and_parse_content,
+                          process_pool, sanitize_filename, timing)
 
 
 @pytest.mark.parametrize("name,expected", [
@@ -20,4 +24,34 @@ def test_timing_decorator(mocker):
     result = foo(3)
     assert result == 6
     assert mock_logger.debug.call_count == 1
-    assert "executed in" in mock_logger.debug.call_args[0][0] 
\ No newline at end of file
+    assert "executed in" in mock_logger.debug.call_args[0][0] 
+
+def test_parts_are_listed_in_numeric_order(tmp_path):
+    for name in ("10.txt", "2.txt", "1.txt", "notes.txt"):
+        (tmp_path / name).write_text("[]", encoding="utf-8")
+    assert [p.name for p in list_parts(tmp_path)] == ["1.txt", "2.txt", "10.txt", "notes.txt"]
+
+
+def test_iter_parts_yields_each_part_lazily(tmp_path):
+    (tmp_path / "10.txt").write_text('[{"c": "ten"}]', encoding="utf-8")
+    (tmp_path / "2.txt").write_text("[{c: 'two'}]", encoding="utf-8")
+    (tmp_path / "3.txt").write_text("", encoding="utf-8")
+    parts = iter_parts(tmp_path)
+    assert next(parts) == [{"c": "two"}]
+    assert next(parts) == [{"c": "ten"}]
+    assert next(parts, None) is None
+    assert load_and_parse_content(tmp_path) == [{"c": "two"}, {"c": "ten"}]
+
+
+def test_process_pool_does_not_fork_threaded_process():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            with process_pool(1) as executor:
+                assert executor.submit(sanitize_filename, "a:b").result() == "a_b"
+    finally:
+        stop.set()
+        thread.join()